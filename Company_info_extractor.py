@@ -11,6 +11,15 @@ from openai import OpenAI
 import os
 import json
 
+from modules.llm_client import chat_completion
+from modules.prompt_budget import trim_to_budget
+
+COMPANY_TEXT_TOKENS = 8000
+COMPANY_FIELDS_QUERY = (
+    "company about services industries values objectives licenses certifications locations contact "
+    "الشركة نبذة الخدمات المجالات القيم الأهداف التراخيص الشهادات الفروع المواقع التواصل"
+)
+
 
 def fetch_html(url: str) -> str:
     """
@@ -109,6 +118,8 @@ def ask_llm_freeform(full_text: str, client: OpenAI):
     Returns:
         str: JSON response من GPT
     """
+    company_text = trim_to_budget(full_text, COMPANY_TEXT_TOKENS, query=COMPANY_FIELDS_QUERY)
+
     prompt = f"""
 أنت محلل مواقع شركات.
 
@@ -142,13 +153,15 @@ def ask_llm_freeform(full_text: str, client: OpenAI):
 
 النص:
 -----------------------------------
-{full_text[:16000]}
+{company_text}
 -----------------------------------
 
 
     """.strip()
 
-    response = client.chat.completions.create(
+    response = chat_completion(
+        "company_profile",
+        client=client,
         model="gpt-4o-mini",
         messages=[{"role": "user", "content": prompt}],
         max_tokens=1500,
@@ -6,8 +6,12 @@ Multi-page application for RFP processing and proposal generation
 import streamlit as st
 import os
 import json
+import uuid
 from datetime import datetime
 
+from modules.llm_client import invoke_chat_model, deadline_scope
+from modules.llm_metrics import METER, metering_context
+
 # ============================================
 # Setup
 # ============================================
@@ -310,12 +314,20 @@ st.markdown("""
 # Setup API Key
 os.environ["OPENAI_API_KEY"] = st.secrets["OPENAI_API_KEY"]
 
+# Time budgets (seconds) for each UI action; propagated down to every LLM call
+PROCESS_DEADLINE_SECONDS = 600
+CHAT_DEADLINE_SECONDS = 60
+PROPOSAL_DEADLINE_SECONDS = 240
+
 # ============================================
 # Session State Initialization
 # ============================================
 if 'page' not in st.session_state:
     st.session_state.page = 1
 
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:12]
+
 if 'rfp_uploaded' not in st.session_state:
     st.session_state.rfp_uploaded = False
 
@@ -644,7 +656,7 @@ def get_ai_response(user_message, model, conversation_history):
     
     # Get AI response
     messages = [{"role": msg["role"], "content": msg["content"]} for msg in conversation_history]
-    response = model.invoke(messages)
+    response = invoke_chat_model("chat", model, messages, tags={"session": st.session_state.session_id})
     ai_message = response.content
     
     # Add AI response to history
@@ -673,34 +685,40 @@ def process_files():
     """Process uploaded files and extract questions"""
     try:
         from modules.rfp_extractor import extract_and_weight_rfp_criteria
-        from modules.company_extractor import extract_company_info_with_advertools
+        from modules.company_extractor import get_company_profile
         from modules.gap_analyzer import perform_full_gap_analysis
         import json
         
-        # Step 1: Extract RFP
-        rfp_result = extract_and_weight_rfp_criteria(
-            pdf_path=st.session_state.rfp_path,
-            output_file="data/outputs/criteria_with_weights.json"
-        )
+        with metering_context(
+            session=st.session_state.session_id,
+            document=os.path.basename(st.session_state.rfp_path)
+        ), deadline_scope(PROCESS_DEADLINE_SECONDS):
+            # Step 1: Extract RFP
+            rfp_result = extract_and_weight_rfp_criteria(
+                pdf_path=st.session_state.rfp_path,
+                output_file="data/outputs/criteria_with_weights.json"
+            )
         
-        # Step 2: Extract Company Profile from Website
-        company_result = extract_company_info_with_advertools(
-            root_url=st.session_state.company_url,
-            max_pages=25
-        )
+            # Step 2: Extract Company Profile from Website (per-domain store with TTL)
+            company_result = get_company_profile(
+                root_url=st.session_state.company_url,
+                max_pages=25
+            )
         
-        # Save company profile to file
-        os.makedirs("data/outputs", exist_ok=True)
-        with open("data/outputs/company_profile.json", 'w', encoding='utf-8') as f:
-            json.dump(company_result, f, ensure_ascii=False, indent=2)
+            # Save company profile to file
+            os.makedirs("data/outputs", exist_ok=True)
+            with open("data/outputs/company_profile.json", 'w', encoding='utf-8') as f:
+                json.dump(company_result, f, ensure_ascii=False, indent=2)
         
-        # Step 3: Gap Analysis
-        gap_result = perform_full_gap_analysis(
-            rfp_criteria_file="data/outputs/criteria_with_weights.json",
-            company_profile_file="data/outputs/company_profile.json",
-            output_file="data/outputs/gap_analysis.json"
-        )
+            # Step 3: Gap Analysis
+            gap_result = perform_full_gap_analysis(
+                rfp_criteria_file="data/outputs/criteria_with_weights.json",
+                company_profile_file="data/outputs/company_profile.json",
+                output_file="data/outputs/gap_analysis.json"
+            )
         
+        write_usage_report()
+
         # Load questions
         st.session_state.questions = gap_result.get('clarification_questions', [])
         st.session_state.processing_done = True
@@ -716,6 +734,49 @@ def process_files():
         return False
 
 
+# ============================================
+# LLM Usage Report
+# ============================================
+def write_usage_report():
+    """Save this session's LLM usage report next to data/outputs/*.json"""
+    METER.write_report(
+        "data/outputs/llm_usage_report.json",
+        session=st.session_state.session_id
+    )
+
+
+def render_usage_sidebar():
+    """Rolling token / cost / latency summary for the current session"""
+    records = [r for r in METER.snapshot() if r.get("session") == st.session_state.session_id]
+    if not records:
+        return
+
+    summary = METER.summary(records)
+    totals = summary["totals"]
+    slowest = sorted(summary["stages"].items(), key=lambda kv: kv[1]["total_latency"], reverse=True)[:3]
+    stages_html = "".join(
+        f"<p style='color: rgba(255,255,255,0.7); margin: 0; font-size: 0.8rem;'>"
+        f"{name}: {s['calls']} × {s['avg_latency']:.1f}s · ${s['cost_usd']:.4f}</p>"
+        for name, s in slowest
+    )
+
+    st.markdown(f"""
+    <div style='background: rgba(255,255,255,0.1); padding: 0.8rem;
+                border-radius: 10px; margin-top: 1rem; direction: ltr;'>
+        <p style='color: white; font-weight: 600; margin: 0 0 0.4rem 0; font-size: 0.9rem;'>
+            LLM usage
+        </p>
+        <p style='color: rgba(255,255,255,0.85); margin: 0; font-size: 0.85rem;'>
+            {totals['calls']} calls · {totals['prompt_tokens'] + totals['completion_tokens']:,} tokens
+        </p>
+        <p style='color: rgba(255,255,255,0.85); margin: 0 0 0.4rem 0; font-size: 0.85rem;'>
+            ${totals['cost_usd']:.4f} · {totals['total_latency']:.1f}s · {totals['cache_hits']} cache hits
+        </p>
+        {stages_html}
+    </div>
+    """, unsafe_allow_html=True)
+
+
 # ============================================
 # PAGE 2: Chatbot (ChatGPT Style)
 # ============================================
@@ -927,7 +988,13 @@ def page_chatbot():
                     {"role": msg["role"], "content": msg["content"]} 
                     for msg in st.session_state.conversation_history
                 ]
-                response = st.session_state.conversation_model.invoke(messages)
+                with deadline_scope(CHAT_DEADLINE_SECONDS):
+                    response = invoke_chat_model(
+                        "chat",
+                        st.session_state.conversation_model,
+                        messages,
+                        tags={"session": st.session_state.session_id}
+                    )
                 ai_message = response.content
                 
                 st.session_state.conversation_history.append({
@@ -957,6 +1024,15 @@ def page_chatbot():
                             'answer': user_messages[-1],  # Last user message
                             'full_conversation': st.session_state.conversation_history.copy()
                         }
+                        # إعادة تقييم متطلبات هذا السؤال فقط في الخلفية
+                        from modules.gap_incremental import reevaluate_in_background
+                        with metering_context(session=st.session_state.session_id):
+                            reevaluate_in_background(
+                                "data/outputs/gap_analysis.json",
+                                current_index,
+                                st.session_state.questions[current_index],
+                                user_messages[-1]
+                            )
                     
                     # Reset for next question
                     st.session_state.current_question_index += 1
@@ -1102,15 +1178,22 @@ def generate_proposal_workflow():
             status_text = st.empty()
             
             from modules.proposal_generator import generate_proposal
+            from modules.gap_incremental import wait_for_reevaluations
             
-            proposal = generate_proposal(
-                rfp_criteria_file="data/outputs/criteria_with_weights.json",
-                company_profile_file="data/outputs/company_profile.json",
-                gap_analysis_file="data/outputs/gap_analysis.json",
-                chat_history_file="data/outputs/chat_history.json",
-                output_file="data/outputs/proposal.md",
-                generate_word=True
-            )
+            # التقرير المحدّث بإجابات الشات بوت قبل قراءته
+            wait_for_reevaluations()
+            
+            with metering_context(session=st.session_state.session_id):
+                proposal = generate_proposal(
+                    rfp_criteria_file="data/outputs/criteria_with_weights.json",
+                    company_profile_file="data/outputs/company_profile.json",
+                    gap_analysis_file="data/outputs/gap_analysis.json",
+                    chat_history_file="data/outputs/chat_history.json",
+                    output_file="data/outputs/proposal.md",
+                    generate_word=True,
+                    deadline_seconds=PROPOSAL_DEADLINE_SECONDS
+                )
+            write_usage_report()
             
             progress_bar.progress(100)
             
@@ -1481,6 +1564,8 @@ def main():
                 </p>
             </div>
             """, unsafe_allow_html=True)
+
+        render_usage_sidebar()
     
     # Route to correct page
     if st.session_state.page == 1:
@@ -0,0 +1,224 @@
+"""
+Company Extractors Benchmark - Offline HTML Corpus
+يشغل دوال الاستخراج على صفحات محفوظة في data/fixtures/company_pages ويقيس
+لكل دالة: الزمن، الذاكرة (tracemalloc)، وانحراف المخرجات عن expected.json
+
+Usage:
+    python bench_company_extractors.py                      # قياس + مقارنة بالمخرجات المحفوظة
+    python bench_company_extractors.py --repeat 10 --json bench.json
+    python bench_company_extractors.py --update-expected    # بعد تغيير مقصود في المخرجات
+    python bench_company_extractors.py --record https://example.sa/about/ --name about_example
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from datetime import datetime, timezone
+from statistics import median
+
+from modules.parsed_page import ParsedPage
+from modules.company_extractor import (
+    visible_text,
+    get_contacts_from_html,
+    extract_partners_from_html,
+    extract_branch_locations,
+    extract_why_us_from_html,
+    extract_consultations_from_html,
+    extract_previous_projects,
+)
+
+CORPUS_DIR = os.getenv("COMPANY_CORPUS_DIR", "data/fixtures/company_pages")
+MANIFEST_FILE = os.path.join(CORPUS_DIR, "manifest.json")
+EXPECTED_FILE = os.path.join(CORPUS_DIR, "expected.json")
+
+# name -> fn(page, url); كل دالة تستقبل ParsedPage جديدة تشارك نفس الـ soup
+EXTRACTORS = {
+    "visible_text": lambda page, url: visible_text(page),
+    "contacts": lambda page, url: get_contacts_from_html(page),
+    "partners": lambda page, url: extract_partners_from_html(page, url),
+    "branches": lambda page, url: extract_branch_locations(page),
+    "why_us": lambda page, url: extract_why_us_from_html(page),
+    "consultations": lambda page, url: extract_consultations_from_html(page),
+    "projects": lambda page, url: extract_previous_projects(page),
+}
+
+
+# ============================================
+# Corpus
+# ============================================
+def load_manifest() -> dict:
+    with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_json(path: str, data) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def load_pages() -> list:
+    """[(name, url, html)] بترتيب الـ manifest"""
+    pages = []
+    for item in load_manifest()["pages"]:
+        with open(os.path.join(CORPUS_DIR, item["file"]), "r", encoding="utf-8") as f:
+            pages.append((os.path.splitext(item["file"])[0], item["url"], f.read()))
+    return pages
+
+
+def record_page(url: str, name: str, description: str = "") -> None:
+    """جلب صفحة حقيقية وإضافتها للمجموعة (المخرجات المتوقعة تُحدّث بـ --update-expected)"""
+    from modules.web_fetcher import fetch_html
+
+    html = fetch_html(url)
+    filename = f"{name}.html"
+    with open(os.path.join(CORPUS_DIR, filename), "w", encoding="utf-8") as f:
+        f.write(html)
+
+    manifest = load_manifest()
+    manifest["pages"] = [p for p in manifest["pages"] if p["file"] != filename]
+    manifest["pages"].append({
+        "file": filename,
+        "url": url,
+        "source": "recorded",
+        "recorded_at": datetime.now(timezone.utc).strftime("%Y-%m-%d"),
+        "description": description,
+    })
+    save_json(MANIFEST_FILE, manifest)
+    print(f"💾 Recorded {url} -> {filename} ({len(html) / 1024:.0f} KB)")
+
+
+# ============================================
+# Measurement
+# ============================================
+def normalize(output):
+    """مخرجات قابلة للمقارنة والحفظ في JSON (tuple/set -> list)"""
+    if isinstance(output, (list, tuple)):
+        return [normalize(x) for x in output]
+    if isinstance(output, set):
+        return sorted(output)
+    return output
+
+
+def run_extractor(fn, html: str, url: str, soup, repeat: int) -> dict:
+    times = []
+    output = None
+    for _ in range(repeat):
+        page = ParsedPage(html, url=url, soup=soup)
+        t = time.perf_counter()
+        output = fn(page, url)
+        times.append(time.perf_counter() - t)
+
+    # تشغيل منفصل للذاكرة: tracemalloc يبطئ التنفيذ فلا يدخل في الزمن
+    page = ParsedPage(html, url=url, soup=soup)
+    tracemalloc.start()
+    fn(page, url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"ms": median(times) * 1000, "peak_kb": peak / 1024, "output": normalize(output)}
+
+
+def drift(expected, actual) -> tuple:
+    """(missing, extra) على مستوى العناصر؛ النص الكامل يُقارن كسطور"""
+    if isinstance(expected, str) and isinstance(actual, str):
+        expected, actual = expected.splitlines(), actual.splitlines()
+    if expected and isinstance(expected[0], list):  # contacts: (phones, emails, socials)
+        expected = [x for group in expected for x in group]
+        actual = [x for group in actual for x in group]
+    missing = [x for x in expected if x not in actual]
+    extra = [x for x in actual if x not in expected]
+    return missing, extra
+
+
+def run(repeat: int, update_expected: bool, json_out: str = None) -> int:
+    pages = load_pages()
+    expected = {}
+    if os.path.exists(EXPECTED_FILE) and not update_expected:
+        with open(EXPECTED_FILE, "r", encoding="utf-8") as f:
+            expected = json.load(f)
+
+    results = {}
+    drifted = 0
+    totals = {name: 0.0 for name in EXTRACTORS}
+
+    print("=" * 84)
+    print(f"📦 Company extractors on {len(pages)} offline pages (median of {repeat} runs)")
+    print("=" * 84)
+
+    for page_name, url, html in pages:
+        t = time.perf_counter()
+        soup = ParsedPage(html, url=url).soup
+        parse_ms = (time.perf_counter() - t) * 1000
+        print(f"\n📄 {page_name}  {len(html) / 1024:.0f} KB  parse {parse_ms:.1f} ms")
+        print(f"  {'extractor':<16}{'ms':>10}{'peak KB':>10}{'items':>8}  drift")
+
+        results[page_name] = {"parse_ms": parse_ms, "extractors": {}}
+        for name, fn in EXTRACTORS.items():
+            r = run_extractor(fn, html, url, soup, repeat)
+            results[page_name]["extractors"][name] = r
+            totals[name] += r["ms"]
+
+            out = r["output"]
+            items = len(out.splitlines()) if isinstance(out, str) else sum(
+                len(x) if isinstance(x, list) else 1 for x in out)
+
+            status = "-"
+            want = expected.get(page_name, {}).get(name)
+            if want is not None:
+                missing, extra = drift(want, out)
+                if missing or extra:
+                    drifted += 1
+                    status = f"⚠️ -{len(missing)} +{len(extra)}"
+                else:
+                    status = "✅"
+            print(f"  {name:<16}{r['ms']:>10.2f}{r['peak_kb']:>10.0f}{items:>8}  {status}")
+            if want is not None and status.startswith("⚠️"):
+                for x in missing[:3]:
+                    print(f"      - {str(x)[:90]}")
+                for x in extra[:3]:
+                    print(f"      + {str(x)[:90]}")
+
+    print("\n" + "=" * 84)
+    print("⏱️ Total per extractor (ms, all pages)")
+    for name, ms in sorted(totals.items(), key=lambda kv: -kv[1]):
+        print(f"  {name:<16}{ms:>10.2f}")
+
+    if update_expected:
+        save_json(EXPECTED_FILE, {
+            page: {name: r["output"] for name, r in res["extractors"].items()}
+            for page, res in results.items()
+        })
+        print(f"\n💾 Expected outputs written to {EXPECTED_FILE}")
+    elif expected:
+        print(f"\n{'⚠️' if drifted else '✅'} {drifted} extractor outputs drifted from {EXPECTED_FILE}")
+
+    if json_out:
+        save_json(json_out, {"repeat": repeat, "totals_ms": totals, "pages": results})
+        print(f"💾 Results written to {json_out}")
+
+    return 1 if drifted else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark company extractors on the offline HTML corpus")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", dest="json_out", help="write timings and outputs to this file")
+    parser.add_argument("--update-expected", action="store_true", help="overwrite expected.json with current outputs")
+    parser.add_argument("--record", metavar="URL", help="fetch a live page into the corpus")
+    parser.add_argument("--name", help="fixture name for --record")
+    parser.add_argument("--description", default="")
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.name:
+            parser.error("--record requires --name")
+        record_page(args.record, args.name, args.description)
+        sys.exit(0)
+
+    sys.exit(run(max(1, args.repeat), args.update_expected, args.json_out))
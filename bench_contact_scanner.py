@@ -0,0 +1,95 @@
+"""
+Contact Scanner Benchmark - Pathological Inputs
+يقيس زمن استخراج الإيميلات على مدخلات متزايدة الحجم للتأكد من أن الزمن خطي
+
+Usage:
+    python bench_contact_scanner.py
+"""
+
+import re
+import time
+
+from modules.contact_scanner import scan_emails, scan_contacts
+from modules.parsed_page import ParsedPage
+
+# النمط القديم (قبل contact_scanner) للمقارنة فقط
+LEGACY_FUZZY_EMAIL = re.compile(
+    r"([A-Z0-9._%+\-\u200e\u200f\u202A-\u202E\u2066-\u2069\u00A0\s]{1,64})"
+    r"@"
+    r"([A-Z0-9.\-\u200e\u200f\u202A-\u202E\u2066-\u2069\u00A0\s]{1,255})",
+    re.I
+)
+
+SIZES = [25_000, 50_000, 100_000, 200_000]
+
+# ============================================
+# Pathological inputs
+# ============================================
+CASES = {
+    # مسافات وحروف طويلة بدون '@': كل موضع بداية يجرب حتى 64 محرفاً
+    "letters+spaces, no @": lambda n: ("abc " * (n // 4 + 1))[:n],
+    # '@' كثيرة بين كتل مسافات (Elementor يولد مسافات كثيرة)
+    "spaced @ runs": lambda n: ((" " * 60 + "a@" + " " * 200) * (n // 262 + 1))[:n],
+    # نطاقات طويلة بلا TLD
+    "long domains": lambda n: (("x" * 60 + "@" + "y-" * 120 + " ") * (n // 302 + 1))[:n],
+    # نص عادي مع إيميلات صحيحة
+    "normal text": lambda n: (("تواصل معنا info@example.com " + "lorem ipsum " * 20) * (n // 280 + 1))[:n],
+}
+
+
+def _time(fn, arg, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def legacy_scan(text: str) -> int:
+    return sum(1 for _ in LEGACY_FUZZY_EMAIL.finditer(text))
+
+
+def run():
+    print("=" * 72)
+    print("📏 Email scanning time by input size (ms)")
+    print("=" * 72)
+    header = f"{'case':<24}{'scanner':<8}" + "".join(f"{n:>10,}" for n in SIZES) + f"{'growth':>10}"
+    print(header)
+
+    for name, make in CASES.items():
+        texts = [make(n) for n in SIZES]
+        for label, fn in (("new", scan_emails), ("legacy", legacy_scan)):
+            times = [_time(fn, t) for t in texts]
+            # growth = زمن أكبر حجم / زمن أصغر حجم؛ الخطي ≈ SIZES[-1] / SIZES[0]
+            growth = times[-1] / max(times[0], 1e-9)
+            cells = "".join(f"{t * 1000:>10.1f}" for t in times)
+            print(f"{name:<24}{label:<8}{cells}{growth:>9.1f}x")
+
+    print(f"\nLinear growth would be {SIZES[-1] / SIZES[0]:.1f}x")
+
+    # صفحة Elementor كبيرة كاملة (DOM + raw HTML)
+    block = (
+        '<div class="elementor-widget" data-settings="{&quot;x&quot;: 1}">'
+        '<span class="elementor-icon-list-text">info @ example . com</span>'
+        '<a href="tel:0551234567">اتصل</a><a href="https://instagram.com/company">ig</a>'
+        + "&nbsp; " * 40 + "</div>\n"
+    )
+    print("\n" + "=" * 72)
+    print("📄 Full page scan (scan_contacts)")
+    print("=" * 72)
+    for blocks in (500, 1000, 2000, 4000):
+        html = "<html><body>" + block * blocks + "</body></html>"
+        page = ParsedPage(html)
+        t = time.perf_counter()
+        page.soup  # التحليل خارج القياس: مشترك مع باقي دوال الاستخراج
+        parsed = time.perf_counter() - t
+        t = time.perf_counter()
+        phones, emails, socials = scan_contacts(page)
+        elapsed = time.perf_counter() - t
+        print(f"  {len(html) / 1024:>8.0f} KB  parse {parsed * 1000:>8.1f} ms  scan {elapsed * 1000:>8.1f} ms  "
+              f"phones={len(phones)} emails={len(emails)} socials={len(socials)}")
+
+
+if __name__ == "__main__":
+    run()
@@ -7,7 +7,10 @@ from pdf_handler import HandlePDF
 from chunker import Chunker
 from summarize_chunk import SummarizeChunk
 from company_info_extractor_original import process_company
+from modules.llm_metrics import METER
+from modules.llm_scheduler import set_process_priority, PRIORITY_BATCH
 import os
+import sys
 import json
 
 # ═══════════════════════════════════════════════════════════════
@@ -21,6 +24,14 @@ OUTPUT_FOLDER = './outputs'
 # Company website
 COMPANY_WEBSITE = "https://rnec.sa/"
 
+# Batch mode: send all summarization/criteria requests through the OpenAI Batch API
+# (set OPENAI_BATCH_BASE_URL to point at a local stand-in server for tests)
+BATCH_MODE = os.getenv("RFP_BATCH_MODE", "").strip().lower() in {"1", "true", "yes", "on"}
+
+# Offline pipeline: all LLM calls run in the lowest scheduler class so they never
+# compete with interactive chat when sharing LLM_SCHEDULER_STATE with the app
+set_process_priority(PRIORITY_BATCH)
+
 # Create output folder
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
@@ -35,6 +46,69 @@ print("=" * 60)
 all_rfps = os.listdir(PDF_FOLDER)
 print(f"\n عدد ملفات المناقصات: {len(all_rfps)}\n")
 
+# ═══════════════════════════════════════════════════════════════
+# Batch mode (offline bulk processing)
+# ═══════════════════════════════════════════════════════════════
+
+def run_batch_mode(all_rfps):
+    """Extract + chunk every RFP, then summarize and extract criteria in one batch"""
+    from modules.batch_processor import run_batch_pipeline
+
+    chunker = Chunker()
+    rfp_docs = []
+
+    for i, each_rfp in enumerate(all_rfps, 1):
+        print(f"🔄 [{i}/{len(all_rfps)}] تجهيز الملف: {each_rfp}")
+        try:
+            extracted_text = HandlePDF(os.path.join(PDF_FOLDER, each_rfp)).extract_text()
+            if not extracted_text or len(extracted_text.strip()) == 0:
+                print(f"⚠️ الملف {each_rfp} لا يحتوي على نصوص")
+                continue
+
+            cleaned_text = chunker.clean_text(extracted_text)
+            chunks = chunker.chunk_text(cleaned_text)
+            rfp_docs.append({
+                "doc_id": each_rfp.replace('.pdf', ''),
+                "text": cleaned_text,
+                "chunks": chunks,
+            })
+            print(f"✅ {len(chunks)} جزء\n")
+        except Exception as e:
+            print(f"❌ خطأ أثناء تجهيز {each_rfp}: {str(e)}\n")
+
+    summarizer = SummarizeChunk([])
+    mapped = run_batch_pipeline(rfp_docs, summarizer)
+
+    for doc in rfp_docs:
+        base_name = doc["doc_id"]
+        result = mapped.get(base_name, {})
+        combined_summary = summarizer.combine_all_summarized_chunk(result.get("summaries", []))
+
+        summary_file = os.path.join(OUTPUT_FOLDER, f"summary_{base_name}.txt")
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            f.write(f"🔹 ملخص RFP: {base_name}\n\n")
+            f.write(combined_summary)
+        print(f"   ✅ الملخص → {summary_file}")
+
+        if result.get("criteria"):
+            criteria_file = os.path.join(OUTPUT_FOLDER, f"criteria_{base_name}.json")
+            with open(criteria_file, 'w', encoding='utf-8') as f:
+                json.dump(result["criteria"], f, ensure_ascii=False, indent=2)
+            print(f"   ✅ المعايير → {criteria_file}")
+
+        chunks_file = os.path.join(OUTPUT_FOLDER, f"chunks_{base_name}.json")
+        with open(chunks_file, 'w', encoding='utf-8') as f:
+            json.dump({"chunks": doc["chunks"], "count": len(doc["chunks"])}, f, ensure_ascii=False, indent=2)
+
+    print("\n" + "=" * 60)
+    print(f"🎉 تمت المعالجة الدفعية لـ {len(rfp_docs)} ملف")
+    print("=" * 60)
+
+
+if BATCH_MODE:
+    run_batch_mode(all_rfps)
+    sys.exit(0)
+
 # ═══════════════════════════════════════════════════════════════
 # Process each file
 # ═══════════════════════════════════════════════════════════════
@@ -176,4 +250,8 @@ print(f"   - عدد الملفات المُعالجة: {len(all_rfps)}")
 print(f"   - مجلد الإخراج: {OUTPUT_FOLDER}")
 print(f"   - معلومات الشركة: company_info.csv & company_info.json")
 
+usage = METER.write_report(os.path.join(OUTPUT_FOLDER, "llm_usage_report.json"))["summary"]["totals"]
+print(f"   - استهلاك النماذج: {usage['calls']} استدعاء، "
+      f"{usage['prompt_tokens'] + usage['completion_tokens']} توكن، ${usage['cost_usd']}")
+
 
@@ -0,0 +1,313 @@
+"""
+Batch Processor Module
+معالجة دفعية لملفات المناقصات عبر OpenAI Batch API (للتشغيل الليلي بدون انتظار تفاعلي)
+
+نفس قواعد المسار التفاعلي: الطلبات الفاشلة، والملخصات الأقصر من 8 جمل، والمعايير
+غير الصالحة تُعاد مرة واحدة في دفعة متابعة (الملخص بنفس تذكير generate_summary_ar)
+"""
+
+import os
+import json
+import time
+from datetime import datetime
+from openai import OpenAI
+
+from modules.rfp_extractor import AllCriteria, build_criteria_prompt, apply_category_weights
+
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_WORK_DIR = "data/batch"
+CRITERIA_MODEL = "gpt-4o-mini"
+
+# حالات الدفعة النهائية في Batch API
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def _make_client(api_key=None, base_url=None):
+    """إنشاء عميل OpenAI (يدعم خادماً محلياً بديلاً عبر base_url)"""
+    base_url = base_url or os.getenv("OPENAI_BATCH_BASE_URL")
+    kwargs = {}
+    if api_key:
+        kwargs["api_key"] = api_key
+    if base_url:
+        kwargs["base_url"] = base_url
+        kwargs.setdefault("api_key", os.getenv("OPENAI_API_KEY") or "local")
+    return OpenAI(**kwargs)
+
+
+# ============================================
+# بناء الطلبات
+# ============================================
+def build_criteria_request(text, model=CRITERIA_MODEL):
+    """طلب استخراج المعايير بصيغة JSON (بديل with_structured_output في الوضع الدفعي)"""
+    schema = json.dumps(AllCriteria.model_json_schema(), ensure_ascii=False)
+    prompt = build_criteria_prompt(text) + f"""
+أعد النتيجة بصيغة JSON فقط مطابقة للمخطط التالي:
+{schema}
+"""
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": "أعد JSON صالح فقط."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0,
+        "response_format": {"type": "json_object"},
+    }
+
+
+def _request_line(custom_id, body):
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def build_batch_requests(rfp_docs, summarizer):
+    """
+    تحويل المستندات إلى أسطر طلبات Batch API
+
+    Args:
+        rfp_docs: قائمة عناصر {"doc_id", "text", "chunks"}
+        summarizer: كائن SummarizeChunk لبناء طلبات التلخيص
+
+    Returns:
+        list: أسطر الطلبات (custom_id فريد لكل جزء/معايير)
+    """
+    lines = []
+    for doc in rfp_docs:
+        doc_id = doc["doc_id"]
+        for i, chunk in enumerate(doc.get("chunks", [])):
+            if not chunk or not chunk.strip():
+                continue
+            lines.append(_request_line(f"{doc_id}::summary::{i}", summarizer.build_summary_request(chunk)))
+        if doc.get("text"):
+            lines.append(_request_line(f"{doc_id}::criteria", build_criteria_request(doc["text"])))
+    return lines
+
+
+def build_retry_requests(rfp_docs, results, summarizer):
+    """
+    طلبات دفعة المتابعة: كل طلب بلا نتيجة (خطأ أو مفقود)، والملخصات القصيرة،
+    والمعايير التي لا تطابق المخطط
+
+    Returns:
+        list: أسطر الطلبات بنفس custom_id الأصلي
+    """
+    lines = []
+    for doc in rfp_docs:
+        doc_id = doc["doc_id"]
+        for i, chunk in enumerate(doc.get("chunks", [])):
+            if not chunk or not chunk.strip():
+                continue
+            summary = results.get(f"{doc_id}::summary::{i}")
+            if summary is None or summarizer.is_short_summary(summary):
+                lines.append(_request_line(
+                    f"{doc_id}::summary::{i}", summarizer.build_summary_request(chunk, retry=True)
+                ))
+        if doc.get("text") and parse_criteria(results.get(f"{doc_id}::criteria")) is None:
+            lines.append(_request_line(f"{doc_id}::criteria", build_criteria_request(doc["text"])))
+    return lines
+
+
+def write_batch_file(lines, output_path):
+    """كتابة الطلبات في ملف JSONL"""
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    print(f"✓ تم كتابة {len(lines)} طلب في: {output_path}")
+    return output_path
+
+
+# ============================================
+# الإرسال والمتابعة
+# ============================================
+def submit_batch(client, batch_file, metadata=None):
+    """رفع ملف الطلبات وإنشاء الدفعة"""
+    with open(batch_file, "rb") as f:
+        uploaded = client.files.create(file=f, purpose="batch")
+
+    batch = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=BATCH_COMPLETION_WINDOW,
+        metadata=metadata or {},
+    )
+    print(f"✓ تم إنشاء الدفعة: {batch.id}")
+    return batch
+
+
+def wait_for_batch(client, batch_id, poll_interval=30, timeout=None):
+    """متابعة حالة الدفعة حتى تنتهي"""
+    started = time.monotonic()
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        if counts is not None:
+            print(f"   ⏳ {batch.status}: {counts.completed}/{counts.total} (فشل: {counts.failed})")
+        else:
+            print(f"   ⏳ {batch.status}")
+
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+
+        if timeout is not None and time.monotonic() - started > timeout:
+            raise TimeoutError(f"Batch {batch_id} not finished after {timeout}s (status: {batch.status})")
+
+        time.sleep(poll_interval)
+
+
+def _read_jsonl_file(client, file_id):
+    if not file_id:
+        return []
+    content = client.files.content(file_id)
+    return [json.loads(line) for line in content.text.splitlines() if line.strip()]
+
+
+def download_batch_results(client, batch):
+    """
+    تنزيل نتائج الدفعة
+
+    Returns:
+        tuple: (نتائج {custom_id: نص الرد}, أخطاء {custom_id: رسالة الخطأ})
+    """
+    results, errors = {}, {}
+
+    for row in _read_jsonl_file(client, batch.output_file_id):
+        custom_id = row.get("custom_id")
+        response = row.get("response") or {}
+        if row.get("error") or response.get("status_code", 200) != 200:
+            errors[custom_id] = row.get("error") or response.get("body")
+            continue
+        choices = (response.get("body") or {}).get("choices") or []
+        results[custom_id] = choices[0]["message"]["content"].strip() if choices else ""
+
+    for row in _read_jsonl_file(client, batch.error_file_id):
+        errors[row.get("custom_id")] = row.get("error") or row.get("response")
+
+    return results, errors
+
+
+def parse_criteria(raw):
+    """رد المعايير بعد التحقق من المخطط وتطبيق أوزان الفئات؛ None إذا كان فارغاً أو غير صالح"""
+    if not raw:
+        return None
+    try:
+        return apply_category_weights(AllCriteria.model_validate_json(raw).model_dump())
+    except ValueError:
+        return None
+
+
+def map_results_to_documents(rfp_docs, results, summarizer):
+    """
+    إعادة ربط نتائج الدفعة بالأجزاء والمستندات الأصلية
+
+    Returns:
+        dict: {doc_id: {"summaries": [(chunk, summary)], "criteria": dict | None}}
+    """
+    mapped = {}
+    for doc in rfp_docs:
+        doc_id = doc["doc_id"]
+
+        summaries = []
+        for i, chunk in enumerate(doc.get("chunks", [])):
+            summary = results.get(f"{doc_id}::summary::{i}")
+            summaries.append((chunk, summarizer.clean_summary(summary) if summary else None))
+
+        raw_criteria = results.get(f"{doc_id}::criteria")
+        criteria = parse_criteria(raw_criteria)
+        if raw_criteria and criteria is None:
+            print(f"⚠️ فشل تحليل معايير {doc_id}")
+
+        mapped[doc_id] = {"summaries": summaries, "criteria": criteria}
+
+    return mapped
+
+
+# ============================================
+# الدالة الرئيسية
+# ============================================
+def _run_batch(client, lines, batch_file, metadata, poll_interval, timeout):
+    """
+    كتابة الطلبات ورفعها وانتظار الدفعة وتنزيل نتائجها
+
+    Returns:
+        tuple: (batch, نتائج {custom_id: نص الرد}, أخطاء {custom_id: رسالة الخطأ})
+    """
+    write_batch_file(lines, batch_file)
+    batch = submit_batch(client, batch_file, metadata=metadata)
+    batch = wait_for_batch(client, batch.id, poll_interval=poll_interval, timeout=timeout)
+
+    if batch.status != "completed":
+        raise RuntimeError(f"Batch {batch.id} ended with status: {batch.status}")
+
+    results, errors = download_batch_results(client, batch)
+    print(f"✓ تم استلام {len(results)} نتيجة ({len(errors)} خطأ)")
+    return batch, results, errors
+
+
+def run_batch_pipeline(
+    rfp_docs,
+    summarizer,
+    work_dir=BATCH_WORK_DIR,
+    api_key=None,
+    base_url=None,
+    poll_interval=30,
+    timeout=None
+):
+    """
+    تشغيل التلخيص واستخراج المعايير لكل المستندات في دفعة واحدة، ثم دفعة متابعة
+    واحدة للطلبات الفاشلة والملخصات القصيرة والمعايير غير الصالحة
+
+    Args:
+        rfp_docs: قائمة عناصر {"doc_id", "text", "chunks"}
+        summarizer: كائن SummarizeChunk
+        work_dir: مجلد ملفات الطلبات والنتائج
+        api_key: مفتاح OpenAI API (اختياري)
+        base_url: رابط خادم بديل (مثل خادم محلي للاختبار)
+        poll_interval: الفاصل بين فحوصات الحالة بالثواني
+        timeout: أقصى مدة انتظار بالثواني (None = بدون حد)
+
+    Returns:
+        dict: {doc_id: {"summaries": [...], "criteria": {...}}}
+    """
+    print("\n" + "="*60)
+    print("📦 بدء المعالجة الدفعية")
+    print("="*60)
+
+    client = _make_client(api_key=api_key, base_url=base_url)
+
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    lines = build_batch_requests(rfp_docs, summarizer)
+    if not lines:
+        print("⚠️ لا توجد طلبات لإرسالها")
+        return {}
+
+    metadata = {"docs": str(len(rfp_docs))}
+    batch, results, errors = _run_batch(
+        client, lines, os.path.join(work_dir, f"requests_{stamp}.jsonl"), metadata, poll_interval, timeout
+    )
+
+    retry_batch_id = None
+    retry_lines = build_retry_requests(rfp_docs, results, summarizer)
+    if retry_lines:
+        print(f"🔁 إعادة {len(retry_lines)} طلب (فشل / ملخص قصير / معايير غير صالحة) في دفعة متابعة")
+        try:
+            retry_batch, retried, retry_errors = _run_batch(
+                client, retry_lines, os.path.join(work_dir, f"requests_{stamp}_retry.jsonl"),
+                {**metadata, "retry_of": batch.id}, poll_interval, timeout
+            )
+            retry_batch_id = retry_batch.id
+            # مثل generate_summary_ar: رد إعادة المحاولة يُعتمد، وفشلها يُبقي رد الدفعة الأولى
+            results.update(retried)
+            errors = {cid: e for cid, e in {**errors, **retry_errors}.items() if cid not in results}
+        except (RuntimeError, TimeoutError) as e:
+            print(f"⚠️ فشلت دفعة المتابعة، تُستخدم نتائج الدفعة الأولى: {e}")
+
+    results_file = os.path.join(work_dir, f"results_{stamp}.json")
+    with open(results_file, "w", encoding="utf-8") as f:
+        json.dump({"batch_id": batch.id, "retry_batch_id": retry_batch_id, "results": results, "errors": errors},
+                  f, ensure_ascii=False, indent=2)
+
+    mapped = map_results_to_documents(rfp_docs, results, summarizer)
+    print("="*60)
+    return mapped
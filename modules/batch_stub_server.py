@@ -0,0 +1,213 @@
+"""
+Local Batch API Stand-in
+خادم محلي يحاكي مسارات Batch API (files / batches) لاختبار المعالجة الدفعية بدون اتصال
+
+Usage:
+    python -m modules.batch_stub_server --port 8765
+    OPENAI_BATCH_BASE_URL=http://127.0.0.1:8765/v1 python main.py
+"""
+
+import json
+import time
+import uuid
+import argparse
+import threading
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# 8 جمل: الحد الأدنى للملخص المقبول (SUMMARY_MIN_SENTENCES) حتى لا يُعاد كل ملخص
+STUB_SUMMARY = " ".join(f"جملة تجريبية رقم {i} من الخادم المحلي." for i in range(1, 9))
+STUB_CRITERIA = {"summary": "معايير تجريبية من الخادم المحلي.", "criteria": []}
+
+
+class _Store:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files = {}
+        self.batches = {}
+
+
+def stub_content(custom_id, body):
+    """رد ثابت لكل طلب: JSON للطلبات التي تطلب json_object ونص عادي لغيرها"""
+    wants_json = (body.get("response_format") or {}).get("type") == "json_object"
+    return json.dumps(STUB_CRITERIA, ensure_ascii=False) if wants_json else STUB_SUMMARY
+
+
+def _fake_completion(body, content):
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def _file_object(file_id, filename, size, purpose):
+    return {
+        "id": file_id,
+        "object": "file",
+        "bytes": size,
+        "created_at": int(time.time()),
+        "filename": filename,
+        "purpose": purpose,
+        "status": "processed",
+    }
+
+
+def _result_line(req, respond):
+    """سطر ملف النتائج لطلب واحد؛ respond يرجع None لمحاكاة طلب فاشل"""
+    body = req.get("body") or {}
+    content = respond(req.get("custom_id"), body)
+    if content is None:
+        response = {"status_code": 500, "request_id": uuid.uuid4().hex,
+                    "body": {"error": {"message": "stub failure", "type": "server_error"}}}
+    else:
+        response = {"status_code": 200, "request_id": uuid.uuid4().hex, "body": _fake_completion(body, content)}
+    return {
+        "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+        "custom_id": req.get("custom_id"),
+        "response": response,
+        "error": None,
+    }
+
+
+def make_handler(store, respond=None):
+    """
+    Args:
+        respond: دالة (custom_id, body) -> نص الرد أو None للفشل (الافتراضي stub_content)
+    """
+    respond = respond or stub_content
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send_json(self, payload, status=200):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_bytes(self, data):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length) if length else b""
+
+        def do_POST(self):
+            path = self.path.split("?", 1)[0].rstrip("/")
+            if path.endswith("/files"):
+                return self._upload_file()
+            if path.endswith("/batches"):
+                return self._create_batch()
+            self._send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0].rstrip("/")
+            parts = path.split("/")
+            if len(parts) >= 2 and parts[-2] == "batches":
+                batch = store.batches.get(parts[-1])
+                if batch:
+                    return self._send_json(batch)
+            if len(parts) >= 3 and parts[-1] == "content" and parts[-3] == "files":
+                entry = store.files.get(parts[-2])
+                if entry:
+                    return self._send_bytes(entry["content"])
+            self._send_json({"error": {"message": f"Not found: {self.path}"}}, status=404)
+
+        def _upload_file(self):
+            raw = self._body()
+            header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("utf-8")
+            message = BytesParser(policy=policy.default).parsebytes(header + raw)
+
+            content, filename, purpose = b"", "upload.jsonl", "batch"
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                if name == "file":
+                    content = part.get_payload(decode=True) or b""
+                    filename = part.get_filename() or filename
+                elif name == "purpose":
+                    purpose = (part.get_payload(decode=True) or b"batch").decode("utf-8")
+
+            file_id = f"file-{uuid.uuid4().hex[:16]}"
+            with store.lock:
+                store.files[file_id] = {
+                    "content": content,
+                    "meta": _file_object(file_id, filename, len(content), purpose),
+                }
+            self._send_json(store.files[file_id]["meta"])
+
+        def _create_batch(self):
+            body = json.loads(self._body() or b"{}")
+            entry = store.files.get(body.get("input_file_id"))
+            if entry is None:
+                return self._send_json({"error": {"message": "input file not found"}}, status=400)
+
+            # كل الطلبات تُنفّذ فوراً؛ الدفعة تُعاد مكتملة من أول استعلام
+            rows = [_result_line(json.loads(line), respond)
+                    for line in entry["content"].decode("utf-8").splitlines() if line.strip()]
+            out_lines = [json.dumps(row, ensure_ascii=False) for row in rows]
+            failed = sum(1 for row in rows if row["response"]["status_code"] != 200)
+
+            output = ("\n".join(out_lines) + "\n").encode("utf-8")
+            output_id = f"file-{uuid.uuid4().hex[:16]}"
+            batch_id = f"batch_{uuid.uuid4().hex[:16]}"
+            now = int(time.time())
+
+            with store.lock:
+                store.files[output_id] = {
+                    "content": output,
+                    "meta": _file_object(output_id, "output.jsonl", len(output), "batch_output"),
+                }
+                store.batches[batch_id] = {
+                    "id": batch_id,
+                    "object": "batch",
+                    "endpoint": body.get("endpoint"),
+                    "input_file_id": body.get("input_file_id"),
+                    "completion_window": body.get("completion_window"),
+                    "status": "completed",
+                    "output_file_id": output_id,
+                    "error_file_id": None,
+                    "created_at": now,
+                    "completed_at": now,
+                    "metadata": body.get("metadata") or {},
+                    "request_counts": {"total": len(out_lines), "completed": len(out_lines) - failed, "failed": failed},
+                }
+            self._send_json(store.batches[batch_id])
+
+    return Handler
+
+
+def start_stub_server(host="127.0.0.1", port=0, respond=None):
+    """تشغيل الخادم في thread خلفي وإرجاع (server, base_url)"""
+    server = ThreadingHTTPServer((host, port), make_handler(_Store(), respond))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://{host}:{server.server_address[1]}/v1"
+    return server, base_url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI Batch API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(_Store()))
+    print(f"🧪 Batch stand-in listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
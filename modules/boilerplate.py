@@ -0,0 +1,75 @@
+"""
+Boilerplate Module
+إزالة النصوص المتكررة عبر صفحات الموقع نفسه (الهيدر، القائمة، الفوتر)
+قبل دمج النصوص وإرسالها للنموذج اللغوي
+"""
+
+import re
+import math
+
+
+BOILERPLATE_MIN_FRACTION = 0.5   # السطر مكرر في نصف الصفحات أو أكثر
+BOILERPLATE_MIN_PAGES = 3        # ولا يقل عن 3 صفحات
+KEEP_ONCE_MIN_WORDS = 5          # الأسطر الطويلة (عنوان، وصف الفوتر) تُحفظ مرة واحدة
+
+INVIS_RE = re.compile(r"[\u200e\u200f\u202A-\u202E\u2066-\u2069\u00A0]")  # bidi/nbsp
+
+
+def _key(line: str) -> str:
+    return re.sub(r"\s+", " ", INVIS_RE.sub(" ", line)).strip().lower()
+
+
+def find_boilerplate(page_texts: list, min_fraction: float = BOILERPLATE_MIN_FRACTION,
+                     min_pages: int = BOILERPLATE_MIN_PAGES) -> set:
+    """
+    الأسطر (بعد التطبيع) التي تظهر في عدد كبير من الصفحات
+
+    Args:
+        page_texts: النص المرئي لكل صفحة (سطر لكل كتلة نصية)
+        min_fraction: أدنى نسبة صفحات يظهر فيها السطر
+        min_pages: أدنى عدد صفحات
+
+    Returns:
+        set: مفاتيح الأسطر المتكررة
+    """
+    texts = [t for t in page_texts if t]
+    threshold = max(min_pages, math.ceil(min_fraction * len(texts)))
+    if len(texts) < threshold:
+        return set()
+
+    counts = {}
+    for text in texts:
+        for key in {_key(line) for line in text.splitlines()}:
+            if key:
+                counts[key] = counts.get(key, 0) + 1
+    return {key for key, n in counts.items() if n >= threshold}
+
+
+def remove_boilerplate(page_texts: list, **kwargs):
+    """
+    حذف الأسطر المتكررة من كل الصفحات
+
+    الأسطر المتكررة القصيرة (عناصر القائمة) تُحذف نهائياً، والطويلة منها
+    (مثل وصف الشركة أو العنوان في الفوتر) تُحفظ مرة واحدة فقط.
+
+    Returns:
+        tuple: (النصوص بعد التنظيف, نص الأسطر المشتركة المحفوظة مرة واحدة, عدد الأسطر المحذوفة)
+    """
+    boiler = find_boilerplate(page_texts, **kwargs)
+    if not boiler:
+        return list(page_texts), "", 0
+
+    cleaned, common, removed = [], {}, 0
+    for text in page_texts:
+        kept = []
+        for line in (text or "").splitlines():
+            key = _key(line)
+            if key in boiler:
+                removed += 1
+                if len(key.split()) >= KEEP_ONCE_MIN_WORDS:
+                    common.setdefault(key, line.strip())
+                continue
+            kept.append(line)
+        cleaned.append(re.sub(r"\n{3,}", "\n\n", "\n".join(kept)).strip())
+
+    return cleaned, "\n".join(common.values()), removed
@@ -0,0 +1,157 @@
+"""
+Browser Pool Module
+مجموعة متصفحات headless مُدارة لعرض صفحات JavaScript (requests-html / pyppeteer)
+
+- يبدأ المتصفح عند أول طلب فقط (lazy) ويُعاد استخدامه لكل الروابط والجلسات
+- عدد المتصفحات المتزامنة محدود (JS_RENDER_BROWSERS)
+- يُعاد تشغيل المتصفح بعد N عملية عرض (JS_RENDER_RECYCLE_AFTER) لتفادي تسرب الذاكرة
+- كل متصفح يعمل في thread مخصص بحلقة asyncio خاصة به (pyppeteer ليس thread-safe)
+"""
+
+import os
+import queue
+import atexit
+import asyncio
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+
+MAX_BROWSERS = int(os.getenv("JS_RENDER_BROWSERS", "1"))
+RECYCLE_AFTER = int(os.getenv("JS_RENDER_RECYCLE_AFTER", "50"))
+RENDER_TIMEOUT = 30
+
+
+class _BrowserWorker(threading.Thread):
+    """thread يملك متصفحاً واحداً ويعالج طلبات العرض من الطابور المشترك"""
+
+    def __init__(self, pool, index: int):
+        super().__init__(name=f"browser-{index}", daemon=True)
+        self.pool = pool
+        self.loop = None
+        self.session = None
+        self.renders = 0
+
+    def _launch(self):
+        import pyppeteer
+        from requests_html import HTMLSession
+
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+
+        session = HTMLSession()
+        session.loop = self.loop
+        # معالجات الإشارات لا تعمل خارج الـ main thread (مثل threads الخاصة بـ Streamlit)
+        session._browser = self.loop.run_until_complete(pyppeteer.launch(
+            headless=True,
+            args=["--no-sandbox"],
+            handleSIGINT=False,
+            handleSIGTERM=False,
+            handleSIGHUP=False,
+        ))
+        self.session = session
+        self.renders = 0
+        print(f"🧭 {self.name}: headless browser started")
+
+    def _close(self):
+        if self.session is None:
+            return
+        try:
+            self.session.close()
+        except Exception:
+            pass
+        self.session = None
+
+    def _render(self, url: str, html: str, timeout: float, sleep: float) -> str:
+        from requests_html import HTML
+
+        if self.session is None:
+            self._launch()
+
+        page = HTML(session=self.session, url=url, html=html)
+        # Small sleep helps Elementor populate nodes
+        page.render(timeout=timeout, sleep=sleep, reload=False)
+        self.renders += 1
+
+        if self.renders >= self.pool.recycle_after:
+            print(f"♻️ {self.name}: recycling browser after {self.renders} renders")
+            self._close()
+        return page.html
+
+    def run(self):
+        while True:
+            job = self.pool._jobs.get()
+            if job is None:
+                break
+            fut, url, html, timeout, sleep = job
+            self.pool._mark_busy(+1)
+            try:
+                if fut.set_running_or_notify_cancel():
+                    try:
+                        fut.set_result(self._render(url, html, timeout, sleep))
+                    except Exception as e:
+                        # المتصفح قد يكون في حالة غير سليمة بعد الخطأ
+                        self._close()
+                        fut.set_exception(e)
+            finally:
+                self.pool._mark_busy(-1)
+        self._close()
+
+
+class BrowserPool:
+    """طابور طلبات عرض تخدمه حتى max_browsers متصفحات"""
+
+    def __init__(self, max_browsers: int = MAX_BROWSERS, recycle_after: int = RECYCLE_AFTER):
+        self.max_browsers = max(1, max_browsers)
+        self.recycle_after = max(1, recycle_after)
+        self._jobs = queue.Queue()
+        self._workers = []
+        self._busy = 0
+        self._lock = threading.Lock()
+
+    def _mark_busy(self, delta: int):
+        with self._lock:
+            self._busy += delta
+
+    def _ensure_worker(self):
+        # متصفح جديد فقط إذا كانت كل المتصفحات الحالية مشغولة
+        with self._lock:
+            idle = len(self._workers) - self._busy - self._jobs.qsize()
+            if idle <= 0 and len(self._workers) < self.max_browsers:
+                worker = _BrowserWorker(self, len(self._workers))
+                self._workers.append(worker)
+                worker.start()
+
+    def render(self, url: str, html: str, timeout: float = RENDER_TIMEOUT, sleep: float = 1.0) -> str:
+        """
+        عرض HTML صفحة بمتصفح من المجموعة وإرجاع الـ DOM بعد تنفيذ JavaScript
+
+        Args:
+            url: رابط الصفحة
+            html: HTML الصفحة (من fetch_html)
+            timeout: مهلة العرض بالثواني
+            sleep: انتظار بعد التحميل (لعناصر Elementor)
+        """
+        fut = Future()
+        self._ensure_worker()
+        self._jobs.put((fut, url, html, timeout, sleep))
+        # هامش لتشغيل المتصفح أول مرة + انتظار الدور في الطابور
+        try:
+            return fut.result(timeout=timeout * 3 + sleep)
+        except FutureTimeout:
+            # طلب متروك: إلغاؤه حتى يتخطاه العامل بدل أن يشغل متصفحاً ويؤخر من ينتظر
+            fut.cancel()
+            raise
+
+    def close(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._jobs.put(None)
+        for w in workers:
+            w.join(timeout=10)
+
+
+# مجموعة واحدة لكل العملية
+BROWSER_POOL = BrowserPool()
+atexit.register(BROWSER_POOL.close)
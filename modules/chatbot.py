@@ -6,8 +6,11 @@ Multi-page application for RFP processing and proposal generation
 import streamlit as st
 import os
 import json
+import uuid
 from datetime import datetime
 
+from modules.llm_client import invoke_chat_model
+
 # ============================================
 # Setup
 # ============================================
@@ -27,6 +30,9 @@ os.environ["OPENAI_API_KEY"] = st.secrets["OPENAI_API_KEY"]
 if 'page' not in st.session_state:
     st.session_state.page = 1
 
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:12]
+
 if 'rfp_uploaded' not in st.session_state:
     st.session_state.rfp_uploaded = False
 
@@ -181,7 +187,7 @@ def get_ai_response(user_message, model, conversation_history):
     
     # Get AI response
     messages = [{"role": msg["role"], "content": msg["content"]} for msg in conversation_history]
-    response = model.invoke(messages)
+    response = invoke_chat_model("chat", model, messages, tags={"session": st.session_state.session_id})
     ai_message = response.content
     
     # Add AI response to history
@@ -426,7 +432,12 @@ def page_chatbot():
                     {"role": msg["role"], "content": msg["content"]} 
                     for msg in st.session_state.conversation_history
                 ]
-                response = st.session_state.conversation_model.invoke(messages)
+                response = invoke_chat_model(
+                    "chat",
+                    st.session_state.conversation_model,
+                    messages,
+                    tags={"session": st.session_state.session_id}
+                )
                 ai_message = response.content
                 
                 st.session_state.conversation_history.append({
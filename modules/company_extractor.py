@@ -8,18 +8,34 @@ import warnings
 warnings.filterwarnings("ignore")
 
 import re
+import copy
 import json
-import unicodedata
 import requests
-import pandas as pd
-import html as ihtml
 from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup, NavigableString, Comment
+from bs4 import BeautifulSoup
 from openai import OpenAI
-import advertools as adv
 import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 
+from modules.llm_client import chat_completion, current_deadline, remaining_time
+from modules.llm_scheduler import priority_scope, PRIORITY_BATCH
+from modules.prompt_budget import trim_by_fields
+from modules.boilerplate import remove_boilerplate
+from modules.web_fetcher import fetch_html, fetch_many, time_left, CrawlBudgetExceeded, new_cache_stats
+from modules.http_cassette import CASSETTE
+from modules.parsed_page import ParsedPage, as_page
+from modules.contact_scanner import scan_contacts, normalize_sa_phone, EMAIL_RE, PHONE
+from modules.browser_pool import BROWSER_POOL
+from modules.logo_ocr import ocr_logo_texts, OCR_BUDGET_SECONDS
+from modules.sitemap_discovery import discover_pages, score_url, is_arabic_url, same_host
+from modules.company_store import COMPANY_STORE, SingleFlightTimeout, normalize_domain, content_hash
+from modules.page_dedup import PageDeduper, dedupe_urls
+from modules.llm_metrics import METER, current_tags, metering_context
+
 # ====== API KEY Setup ======
 load_dotenv()  # Load from .env file
 # Or set directly (for testing only):
@@ -28,6 +44,7 @@ load_dotenv()  # Load from .env file
 OPENAI_MODEL = "gpt-4o-mini"
 HEADERS = {"User-Agent": "Mozilla/5.0 (X11; Linux x86_64)"}
 TIMEOUT = 20
+COMPANY_TEXT_TOKENS = 9000  # ميزانية النص العربي داخل PROMPT_AR
 
 # ---- Feature Toggles ----
 def _env_flag(name: str, default: bool = False) -> bool:
@@ -48,13 +65,25 @@ def _has_easyocr() -> bool:
 ENABLE_OCR_PARTNERS = _env_flag("ENABLE_OCR_PARTNERS", default=_has_easyocr())
 ENABLE_JS_RENDER = True  # Set to True to render JavaScript pages (requires requests-html)
 
+# Per-page analysis in worker processes (0/1 = in the calling thread).
+# Worth enabling for large sites (max_pages well above 25).
+ANALYSIS_PROCESSES = int(os.getenv("CRAWL_ANALYSIS_PROCESSES", "0"))
+
+# Wall-clock budget for sitemap discovery + page fetching (0 = no budget).
+# When it runs out the LLM runs on the pages gathered so far and the profile
+# is refreshed in the background.
+CRAWL_BUDGET_SECONDS = float(os.getenv("CRAWL_BUDGET_SECONDS", "90"))
+LLM_RESERVE_SECONDS = 60  # kept free for the LLM call under an outer deadline_scope
+
+# How long a session waits for another session's crawl of the same domain
+# (a budgeted crawl plus its LLM call) before falling back to the stored profile.
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.getenv("COMPANY_CRAWL_WAIT", str(CRAWL_BUDGET_SECONDS + LLM_RESERVE_SECONDS)))
+
 # ===================== Regex Patterns =====================
 URL_RE = re.compile(r"https?://\S+|www\.\S+", re.I)
-EMAIL_RE = re.compile(r"[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}", re.I)
 HANDLE_RE = re.compile(r"@[A-Za-z0-9_]{2,}")
 ARABIC = re.compile(r"[\u0600-\u06FF]")
 LATIN = re.compile(r"^[A-Za-z0-9 ,.&()''\-/|]+$")
-PHONE = re.compile(r"(?:\+?966|0)5\d{8}")
 INVIS_RE = re.compile(r"[\u200e\u200f\u202A-\u202E\u2066-\u2069\u00A0]")  # bidi/nbsp
 
 # ---- partner hints / detector ----
@@ -126,11 +155,8 @@ def strip_invisible(s: str) -> str:
 
 
 def get_html(url: str) -> str:
-    """Fetch HTML content from URL"""
-    r = requests.get(url, headers=HEADERS, timeout=TIMEOUT, allow_redirects=True)
-    r.raise_for_status()
-    r.encoding = r.apparent_encoding or r.encoding
-    return r.text
+    """Fetch HTML content from URL (shared pooled session)"""
+    return fetch_html(url, timeout=TIMEOUT)
 
 
 def get_html_js(url: str) -> str:
@@ -139,43 +165,17 @@ def get_html_js(url: str) -> str:
         return ""
     
     try:
-        from requests_html import HTMLSession
-        sess = HTMLSession()
-        r = sess.get(url, headers=HEADERS, timeout=TIMEOUT)
-        # Small sleep helps Elementor populate nodes
-        r.html.render(timeout=30, sleep=1.0, reload=False, keep_page=True)
-        return r.html.html
+        # Pooled browser: no Chromium boot per URL, only render time
+        # (recorded/replayed as a whole when HTTP_CASSETTE is set)
+        return CASSETTE.wrap("render", url, lambda: BROWSER_POOL.render(url, get_html(url), timeout=30, sleep=1.0))
     except Exception as e:
         print(f"⚠️ JS rendering failed for {url}: {e}")
         return ""
 
 
-def visible_text(html: str) -> str:
-    """Extract visible text from HTML, removing scripts, styles, etc."""
-    soup = BeautifulSoup(html, "html.parser")
-    
-    # Remove non-visible tags
-    for tag in soup(["script", "style", "noscript", "svg", "canvas", "iframe"]):
-        tag.decompose()
-    
-    # Remove comments
-    for comment in soup.find_all(string=lambda s: isinstance(s, Comment)):
-        comment.extract()
-    
-    body = soup.body or soup
-    out = []
-    
-    for node in body.descendants:
-        if isinstance(node, NavigableString):
-            s = str(node).strip()
-            if s:
-                out.append(s)
-    
-    text = "\n".join(out)
-    text = re.sub(r"[ \t]+", " ", text)
-    text = re.sub(r"\n{2,}", "\n\n", text)
-    
-    return unicodedata.normalize("NFC", text.strip())
+def visible_text(html) -> str:
+    """Extract visible text from HTML (or a ParsedPage), skipping scripts, styles, etc."""
+    return as_page(html).visible_text
 
 
 def keep_arabic(text: str) -> str:
@@ -191,204 +191,61 @@ def clean_links(s: str) -> str:
     return re.sub(r"\n{3,}", "\n\n", s.strip())
 
 
-def detect_english_name(htmls: list) -> str:
-    """Detect English company name from HTML meta tags and headings"""
-    soup = BeautifulSoup(" ".join(htmls), "html.parser")
+def english_name_candidates(html) -> list:
+    """Title, meta tags and h1/h2 headings of one page"""
+    page = as_page(html)
     candidates = []
     
     # Check title tag
-    if soup.title and soup.title.string:
-        candidates.append(soup.title.string)
+    if page.title:
+        candidates.append(page.title)
     
     # Check meta tags
     for prop in ["og:site_name", "og:title", "twitter:title"]:
-        meta = soup.find("meta", attrs={"property": prop}) or soup.find("meta", attrs={"name": prop})
-        if meta and meta.get("content"):
-            candidates.append(meta["content"])
+        content = page.meta_content(prop)
+        if content:
+            candidates.append(content)
     
     # Check headings
-    for h in soup.find_all(["h1", "h2"]):
-        candidates.append(h.get_text(" ", strip=True))
-    
+    candidates.extend(text for _, text in page.headings(["h1", "h2"]))
+    return candidates
+
+
+def pick_english_name(candidates: list) -> str:
+    """Longest Latin-only candidate"""
     # Filter for Latin/English text only
     hits = [c for c in candidates if LATIN.match(c.strip())]
     return sorted(hits, key=len, reverse=True)[0] if hits else "غير متوفر"
 
 
-# ===================== Contact Extraction =====================
-
-def normalize_sa_phone(num: str) -> str:
-    """Normalize Saudi phone numbers to +966XXXXXXXXX format"""
-    digits = re.sub(r"\D", "", num)
-    
-    if digits.startswith("05") and len(digits) >= 10:
-        return "+966" + digits[1:10]  # +966 5xxxxxxxx
-    if digits.startswith("9665"):
-        return "+" + digits[:12]  # +9665xxxxxxxx
-    if digits.startswith("966") and not digits.startswith("9665"):
-        return "+" + digits
-    
-    return "+" + digits if digits else num
-
-
-def collect_attr_values(element) -> list:
-    """Collect all attribute values from an HTML element"""
-    vals = []
-    for _, v in element.attrs.items():
-        if isinstance(v, list):
-            vals += [str(x) for x in v]
-        else:
-            vals.append(str(v))
-    return vals
-
+def detect_english_name(htmls: list) -> str:
+    """Detect English company name from each page's title, meta tags and headings"""
+    return pick_english_name([c for h in htmls for c in english_name_candidates(h)])
 
-FUZZY_EMAIL = re.compile(
-    r"([A-Z0-9._%+\-\u200e\u200f\u202A-\u202E\u2066-\u2069\u00A0\s]{1,64})"
-    r"@"
-    r"([A-Z0-9.\-\u200e\u200f\u202A-\u202E\u2066-\u2069\u00A0\s]{1,255})",
-    re.I
-)
 
+# ===================== Contact Extraction =====================
 
-def _normalize_email_candidate(s: str) -> str:
-    """Normalize email candidate by removing invisible chars and spaces"""
-    s = strip_invisible(ihtml.unescape(s))
-    s = re.sub(r"\s+", "", s)
-    s = s.replace("٫", ".").replace("·", ".").replace("•", ".")
-    return s
+def harvest_emails_all_channels(html, soup: BeautifulSoup = None) -> set:
+    """Comprehensive email extraction from multiple sources (see contact_scanner.scan_contacts)"""
+    return set(scan_contacts(as_page(html, soup=soup))[1])
 
 
-def harvest_emails_all_channels(html: str, soup: BeautifulSoup) -> set:
-    """Comprehensive email extraction from multiple sources"""
-    emails = set()
-    
-    # 1) mailto: links
-    for a in soup.select('a[href^="mailto:"]'):
-        emails.add(a.get("href", "").replace("mailto:", "").strip())
-    
-    # 2) visible text (two passes)
-    txt1 = strip_invisible(soup.get_text(" ", strip=True))
-    txt2 = strip_invisible(soup.get_text("", strip=True))
-    
-    for blob in (txt1, txt2):
-        emails |= set(EMAIL_RE.findall(blob))
-        for m in FUZZY_EMAIL.finditer(blob):
-            emails.add(_normalize_email_candidate(m.group(0)))
-    
-    # 3) raw HTML (entity-decoded)
-    raw = strip_invisible(ihtml.unescape(html))
-    emails |= set(EMAIL_RE.findall(raw))
-    
-    for m in FUZZY_EMAIL.finditer(raw):
-        emails.add(_normalize_email_candidate(m.group(0)))
-    
-    # 4) HTML element attributes
-    for el in soup.find_all(True):
-        for val in collect_attr_values(el):
-            v = strip_invisible(ihtml.unescape(str(val)))
-            if "@" in v:
-                emails |= set(EMAIL_RE.findall(v))
-                for m in FUZZY_EMAIL.finditer(v):
-                    emails.add(_normalize_email_candidate(m.group(0)))
-    
-    # 5) Elementor list text (direct selector)
-    for sp in soup.select("span.elementor-icon-list-text"):
-        txt = sp.get_text(" ", strip=True)
-        if txt:
-            n = _normalize_email_candidate(txt)
-            if EMAIL_RE.fullmatch(n):
-                emails.add(n)
-    
-    # Final strict validation
-    return {e.lower() for e in emails if EMAIL_RE.fullmatch(e)}
-
-
-def extract_social_media(html: str, soup: BeautifulSoup) -> set:
+def extract_social_media(html, soup: BeautifulSoup = None) -> set:
     """Extract social media links from HTML"""
-    social_pattern = re.compile(
-        r"(?:https?://|//)?(?:www\.)?"
-        r"(instagram\.com|twitter\.com|x\.com|linkedin\.com|facebook\.com|snapchat\.com|tiktok\.com|youtube\.com)"
-        r"/[^\s\"'<>)]{1,200}",
-        re.I
-    )
-    
-    def _norm(u: str) -> str:
-        """Normalize social media URL"""
-        u = u.strip()
-        if u.startswith("//"):
-            return "https:" + u
-        if not u.startswith("http"):
-            return "https://" + u.lstrip("/")
-        return u
-    
-    socials = set()
-    
-    # 1) From visible text
-    txt = soup.get_text(" ", strip=True)
-    for match in social_pattern.finditer(txt):
-        socials.add(_norm(match.group(0)))
-    
-    # 2) From all href attributes (including icon links)
-    for a in soup.find_all("a", href=True):
-        href = a.get("href", "")
-        m = social_pattern.search(href)
-        if m:
-            socials.add(_norm(m.group(0)))
-    
-    # 3) From raw HTML
-    raw = ihtml.unescape(html)
-    for match in social_pattern.finditer(raw):
-        socials.add(_norm(match.group(0)))
-    
-    return socials
+    return set(scan_contacts(as_page(html, soup=soup))[2])
 
 
-def get_contacts_from_html(html: str):
-    """Extract phone numbers, emails, and social media from HTML"""
-    soup = BeautifulSoup(html, "html.parser")
-    phones = set()
-    
-    # Extract from tel: links
-    for a in soup.select('a[href^="tel:"]'):
-        phones.add(a.get("href", "").replace("tel:", "").strip())
-    
-    # Extract from text and attributes
-    txt = strip_invisible(soup.get_text(" ", strip=True))
-    raw = strip_invisible(ihtml.unescape(html))
-    
-    phones.update(PHONE.findall(txt))
-    
-    for el in soup.find_all(True):
-        for val in collect_attr_values(el):
-            v = strip_invisible(ihtml.unescape(str(val)))
-            phones.update(PHONE.findall(v))
-    
-    # Extract from WhatsApp links
-    for a in soup.select('a[href*="wa.me/"], a[href*="api.whatsapp.com/send"]'):
-        href = a.get("href", "")
-        m = re.search(r"(?:\+?966|0)5\d{8}", href)
-        if m:
-            phones.add(m.group(0))
-    
-    # Normalize phone numbers with + prefix
-    normalized = []
-    for p in phones:
-        n = normalize_sa_phone(p)
-        if "966" in n and len(n) >= 13:  # +9665xxxxxxxx
-            normalized.append(n)
-    
-    # Extract emails and social media
-    emails = harvest_emails_all_channels(html, soup)
-    socials = extract_social_media(html, soup)
-
-    return sorted(set(normalized)), sorted(emails), sorted(socials)
+def get_contacts_from_html(html):
+    """Extract phone numbers, emails, and social media from HTML (or a ParsedPage) in one pass"""
+    return scan_contacts(html)
 
 
 # ===================== Branch Locations Extraction =====================
 
-def extract_branch_locations(html: str) -> list:
+def extract_branch_locations(html) -> list:
     """Extract branch/location snippets from the HTML."""
-    soup = BeautifulSoup(html, "html.parser")
+    page = as_page(html)
+    soup = page.soup
     results = []
     seen = set()
 
@@ -444,8 +301,8 @@ def extract_branch_locations(html: str) -> list:
     selectors = ", ".join(BRANCH_SECTION_SELECTORS)
     branch_sections = list(soup.select(selectors)) if selectors else []
 
-    for heading in soup.find_all(["h1", "h2", "h3", "h4", "h5", "strong", "b"]):
-        if contains_branch_hint(heading.get_text(" ", strip=True)):
+    for heading, text in page.headings(["h1", "h2", "h3", "h4", "h5", "strong", "b"]):
+        if contains_branch_hint(text):
             sec = heading.find_parent(["section", "div", "ul", "ol"]) or heading.parent
             if sec:
                 branch_sections.append(sec)
@@ -466,7 +323,7 @@ def extract_branch_locations(html: str) -> list:
             consider(node.get_text(" ", strip=True))
 
     if not results:
-        for line in soup.get_text("\n", strip=True).splitlines():
+        for line in page.get_text("\n").splitlines():
             consider(line)
 
     return results
@@ -513,14 +370,14 @@ def dedupe_branch_entries(values: list) -> list:
 
 # ===================== Consultations Extraction =====================
 
-def extract_consultations_from_html(html: str) -> list:
+def extract_consultations_from_html(html) -> list:
     """Extract consultation-related descriptions from the website."""
-    soup = BeautifulSoup(html, "html.parser")
+    page = as_page(html)
+    soup = page.soup
     heading_re = re.compile(r"(الاستشارات|استشارات|consultations?|consulting|advisory)", re.I)
     candidate_sections = []
 
-    for heading in soup.find_all(["h1", "h2", "h3", "h4", "h5", "strong", "b"]):
-        txt = heading.get_text(" ", strip=True)
+    for heading, txt in page.headings(["h1", "h2", "h3", "h4", "h5", "strong", "b"]):
         if heading_re.search(txt or ""):
             sec = heading.find_parent(["section", "div", "article"]) or heading.parent
             if sec:
@@ -562,24 +419,42 @@ def extract_consultations_from_html(html: str) -> list:
 
 # ===================== Partners Extraction =====================
 
-def extract_partners_from_html(html: str, base_url: str, ocr=False) -> list:
-    """Extract success partners/clients from HTML (including sliders and carousels)"""
-    soup = BeautifulSoup(html, "html.parser")
-    names = set()
-    
-    # Find sections with partner headings
+def _partner_sections(page: ParsedPage) -> list:
+    """Sections under a partners/clients heading, or common slider containers"""
     heading_re = re.compile(r"(شركاء\s*النجاح|شركاؤنا|عملاؤنا|العملاء)", re.I)
     candidate_sections = []
     
-    for h in soup.find_all(["h1", "h2", "h3", "h4", "h5"]):
-        if heading_re.search(h.get_text(" ", strip=True) or ""):
+    for h, text in page.headings(["h1", "h2", "h3", "h4", "h5"]):
+        if heading_re.search(text or ""):
             sec = h.find_parent(["section", "div"]) or h.parent
             if sec:
                 candidate_sections.append(sec)
     
     # If no heading found, look for common slider classes
     if not candidate_sections:
-        candidate_sections = soup.select(".swiper, .swiper-container, .carousel, .slider, .clients, .partners")
+        candidate_sections = page.soup.select(".swiper, .swiper-container, .carousel, .slider, .clients, .partners")
+    return candidate_sections
+
+
+def partner_logo_urls(html, base_url: str) -> list:
+    """Absolute URLs of the logo images inside the partners sections"""
+    page = as_page(html, url=base_url)
+    urls = []
+    for sec in _partner_sections(page):
+        for img in sec.find_all("img"):
+            src = img.get("data-src") or img.get("data-lazy") or img.get("src") or ""
+            if src:
+                urls.append(urljoin(base_url, src))
+    return list(dict.fromkeys(urls))
+
+
+def extract_partners_from_html(html, base_url: str, ocr=False) -> list:
+    """Extract success partners/clients from HTML (including sliders and carousels)"""
+    page = as_page(html, url=base_url)
+    names = {}  # insertion-ordered set: same order in every process
+    
+    # Find sections with partner headings
+    candidate_sections = _partner_sections(page)
     
     def sanitize_from_src(src: str) -> str:
         """Extract company name from image filename"""
@@ -599,49 +474,32 @@ def extract_partners_from_html(html: str, base_url: str, ocr=False) -> list:
             for key in ["alt", "title", "aria-label", "data-alt", "data-title", "data-name"]:
                 val = (img.get(key) or "").strip()
                 if val:
-                    names.add(val)
+                    names.setdefault(val)
             
             src = img.get("data-src") or img.get("data-lazy") or img.get("src") or ""
             if src:
                 guess = sanitize_from_src(src)
                 if guess:
-                    names.add(guess)
+                    names.setdefault(guess)
                 img_urls.append(urljoin(base_url, src))
         
         # Extract from links
         for a in sec.find_all("a"):
             txt = a.get_text(" ", strip=True)
             if txt and len(txt) <= 120:
-                names.add(txt)
+                names.setdefault(txt)
         
         # Extract from captions and text elements
         for cap in sec.find_all(["figcaption", "p", "span", "div"]):
             txt = cap.get_text(" ", strip=True)
             if 2 <= len(txt) <= 120 and not URL_RE.search(txt):
-                names.add(txt)
+                names.setdefault(txt)
     
-    # OCR for logos (optional)
+    # OCR for logos (optional; shared reader + logo cache, see modules/logo_ocr.py)
     if ocr and ENABLE_OCR_PARTNERS and img_urls:
         try:
-            import easyocr
-            import numpy as np
-            from PIL import Image
-            import io
-            
-            reader = easyocr.Reader(["ar", "en"], gpu=False)
-            
-            for u in img_urls[:15]:  # Limit to 15 images
-                try:
-                    img_bytes = requests.get(u, headers=HEADERS, timeout=10).content
-                    im = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-                    res = reader.readtext(np.array(im), detail=0, paragraph=True)
-                    
-                    for r in res:
-                        s = r.strip()
-                        if (ARABIC.search(s) or re.search(r"[A-Za-z]{3,}", s)) and 2 <= len(s) <= 80:
-                            names.add(s)
-                except Exception:
-                    continue
+            for s in ocr_logo_texts(img_urls[:15]):  # Limit to 15 images
+                names.setdefault(s)
         except Exception:
             pass
     
@@ -659,17 +517,17 @@ def extract_partners_from_html(html: str, base_url: str, ocr=False) -> list:
 
 # ===================== Previous Projects Extraction =====================
 
-def extract_previous_projects(html: str) -> list:
+def extract_previous_projects(html) -> list:
     """Extract previous projects from the website"""
-    soup = BeautifulSoup(html, "html.parser")
+    page = as_page(html)
     projects = []
     
     # Look for project-related headings
     heading_re = re.compile(r"(مشاريع|أعمال|المشاريع|الأعمال|projects|portfolio)", re.I)
     
     # Find sections with project headings
-    for h in soup.find_all(["h1", "h2", "h3", "h4", "h5"]):
-        if heading_re.search(h.get_text(" ", strip=True) or ""):
+    for h, text in page.headings(["h1", "h2", "h3", "h4", "h5"]):
+        if heading_re.search(text or ""):
             sec = h.find_parent(["section", "div", "article"]) or h.parent
             if sec:
                 # Extract project names from this section
@@ -683,9 +541,9 @@ def extract_previous_projects(html: str) -> list:
 
 # ===================== Why Us Extraction =====================
 
-def extract_why_us_from_html(html: str) -> list:
+def extract_why_us_from_html(html) -> list:
     """Extract 'Why Us' section from HTML"""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = as_page(html).soup
     items = []
     
     # Find "لماذا نحن" heading
@@ -772,6 +630,25 @@ PROMPT_AR = """استخرج معلومات الشركة من النص العرب
 النص العربي:
 <<AR_TEXT>>"""
 
+# مصطلحات كل حقل في القالب: القص يضمن لكل حقل أفضل فقراته قبل ملء الباقي
+PROMPT_FIELD_QUERIES = {
+    "نبذة_عن_الشركة": "نبذة عن الشركة من نحن تعريف",
+    "الخدمات": "الخدمات خدماتنا نقدم",
+    "المجالات": "المجالات مجالات القطاعات",
+    "الرؤية": "الرؤية رؤيتنا",
+    "الرسالة": "الرسالة رسالتنا",
+    "الأهداف": "الأهداف أهدافنا",
+    "القيم": "القيم قيمنا",
+    "التراخيص": "التراخيص ترخيص شهادة اعتماد",
+    "فروع_الشركة": "الفروع فرع مكاتب",
+    "سنة_التأسيس": "سنة التأسيس تأسست تأسيس عام",
+    "الخبرات_المتراكمة": "الخبرات خبرة سنوات",
+    "الاستشارات": "الاستشارات استشارات استشارية",
+    "مشاريع_سابقة": "المشاريع السابقة مشاريعنا أعمالنا",
+    "شركاء_النجاح": "شركاء النجاح شركاؤنا العملاء عملاؤنا",
+    "لماذا_نحن": "لماذا نحن يميزنا",
+}
+
 # Define schema keys
 LIST_KEYS = {
     "الخدمات", "المجالات", "الأهداف", "القيم", "التراخيص", "فروع_الشركة",
@@ -823,98 +700,301 @@ def strip_links_text(v):
 
 # ===================== Core Extractor =====================
 
-def extract_company_info_from_urls(urls, api_key=None):
+def analyze_page(url: str, html: str, ocr: bool = False) -> dict:
+    """Run every extractor on one fetched page and return a per-page record"""
+    path_lower = urlparse(url).path.lower()
+    page = ParsedPage(html, url=url)  # parsed once, shared by every extractor
+    p, e, s = get_contacts_from_html(page)
+
+    return {
+        "url": url,
+        "text": page.visible_text,
+        # Mark contact-like pages for JS rendering fallback
+        "contact_like": any(k in path_lower for k in ["contact", "تواصل", "اتصل"]),
+        "phones": p,
+        "emails": e,
+        "socials": s,
+        # Logo OCR runs once per crawl over all pages' logos (see extract_company_state)
+        "partners": extract_partners_from_html(page, base_url=url),
+        "logo_urls": partner_logo_urls(page, url) if ocr else [],
+        "why_us": extract_why_us_from_html(page),
+        "projects": extract_previous_projects(page),
+        "branches": extract_branch_locations(page),
+        "consultations": extract_consultations_from_html(page),
+        "name_candidates": english_name_candidates(page),
+    }
+
+
+_process_pools = {}  # processes -> pool
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool(processes: int) -> ProcessPoolExecutor:
+    """
+    Lazily started, reused process pool per worker count (spawn: safe next to the
+    fetch threads). Pools are keyed rather than recreated: a concurrent crawl may
+    still be using the pool of another size.
+    """
+    with _process_pool_lock:
+        pool = _process_pools.get(processes)
+        if pool is None:
+            pool = _process_pools[processes] = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return pool
+
+
+def crawl_page_records(urls, processes: int = None, lastmods: dict = None, known: dict = None,
+                       deadline: float = None, report: dict = None) -> list:
+    """
+    Fetch pages concurrently and analyze each one as soon as it arrives
+
+    Args:
+        urls: page URLs
+        processes: worker processes for analysis (default ANALYSIS_PROCESSES)
+        lastmods: {url: sitemap lastmod}; unchanged pages are served from the HTTP cache
+        known: {url: {"hash", "record"}} from the profile store; pages whose
+               content hash did not change reuse their stored record
+        deadline: crawl budget end (epoch); pages not fetched by then are skipped
+        report: optional dict filled with {"skipped": [...], "failed": [...],
+                "duplicates": {url: same_as_url}}
+
+    Pages whose content is identical or near-identical (simhash) to an earlier
+    page are not analyzed; the kept record sits at the group's first URL index.
+
+    Returns:
+        list: analyze_page records aligned with urls (None for failed pages),
+              each with its "content_hash"
+    """
+    processes = ANALYSIS_PROCESSES if processes is None else processes
+    pool = _get_process_pool(processes) if processes > 1 else None
+    known = known or {}
+    # Duplicate groups may keep a different URL than last run: reuse by content hash too
+    known_by_hash = {v["hash"]: v for v in known.values() if v.get("hash") and v.get("record")}
+    records = [None] * len(urls)
+    hashes = {}
+    pending = {}
+    reused = 0
+    skipped, failed = [], []
+    deduper = PageDeduper()
+    kept_at = {}       # url -> index of the analyzed page
+    duplicates = {}    # index -> index of the page it duplicates
+    analysis_seconds, analyzed = 0.0, 0
+
+    stats = new_cache_stats()  # this crawl only: concurrent crawls must not share counters
+    for i, u, h, err in fetch_many(urls, timeout=TIMEOUT, lastmods=lastmods, deadline=deadline, stats=stats):
+        if isinstance(err, CrawlBudgetExceeded):
+            skipped.append(i)
+            continue
+        if err is not None:
+            print(f"  ⚠️ Skip {u}: {err}")
+            failed.append(i)
+            continue
+        print(f"  📄 Fetched: {u}")
+        hashes[i] = content_hash(h)
+        same_as, kind = deduper.check(u, h, digest=hashes[i])
+        if same_as is not None:
+            print(f"  🔁 Duplicate ({kind}) of {same_as}: {u}")
+            duplicates[i] = kept_at[same_as]
+            continue
+        kept_at[u] = i
+        stored = known.get(u)
+        if not (stored and stored.get("hash") == hashes[i] and stored.get("record")):
+            stored = known_by_hash.get(hashes[i])
+        if stored:
+            records[i] = {**stored["record"], "url": u}
+            reused += 1
+            continue
+        if pool is not None:
+            pending[i] = pool.submit(analyze_page, u, h, ENABLE_OCR_PARTNERS)
+            continue
+        started = time.perf_counter()
+        try:
+            records[i] = analyze_page(u, h, ocr=ENABLE_OCR_PARTNERS)
+        except Exception as ex:
+            print(f"  ⚠️ Skip {u}: {ex}")
+        analysis_seconds += time.perf_counter() - started
+        analyzed += 1
+
+    for i, fut in pending.items():
+        try:
+            records[i] = fut.result()
+        except Exception as ex:
+            print(f"  ⚠️ Skip {urls[i]}: {ex}")
+
+    for i, rec in enumerate(records):
+        if rec is not None:
+            rec["content_hash"] = hashes[i]
+
+    # Pages arrive in fetch order: keep each group's record at its first URL for a stable merge
+    groups = {}
+    for i, k in duplicates.items():
+        groups.setdefault(k, []).append(i)
+    duplicates = {}
+    for k, members in groups.items():
+        first = min([k] + members)
+        if first != k:
+            records[first], records[k] = records[k], None
+            if records[first] is not None:
+                # The store keys pages by rec["url"]: the record now belongs to the kept URL
+                records[first]["url"] = urls[first]
+                records[first]["content_hash"] = hashes[first]
+        for j in [k] + members:
+            if j != first:
+                duplicates[j] = first
+
+    if duplicates:
+        saved = f", ~{analysis_seconds / analyzed * len(duplicates):.1f}s parsing saved" if analyzed else ""
+        print(f"  🔁 {len(duplicates)} duplicate pages not analyzed{saved}")
+
+    if known:
+        print(f"  ♻️ {reused} unchanged pages reused from the profile store")
+
+    if skipped:
+        print(f"  ⏱️ Crawl budget exhausted: {len(skipped)} pages not fetched")
+    if report is not None:
+        report["skipped"] = [urls[i] for i in sorted(skipped)]
+        report["failed"] = [urls[i] for i in sorted(failed)]
+        report["duplicates"] = {urls[i]: urls[k] for i, k in sorted(duplicates.items())}
+
+    print(f"  💾 HTTP cache: {stats['lastmod_skips']} unchanged (lastmod), "
+          f"{stats['not_modified']} not modified (304), {stats['downloads']} downloaded")
+    return records
+
+
+def _extend_unique(target: list, items):
+    for item in items:
+        if item not in target:
+            target.append(item)
+
+
+def extract_company_info_from_urls(urls, api_key=None, processes: int = None, lastmods: dict = None):
     """Extract company information from multiple URLs"""
-    htmls, texts = [], []
+    return extract_company_state(urls, api_key=api_key, processes=processes, lastmods=lastmods)["profile"]
+
+
+def extract_company_state(urls, api_key=None, processes: int = None, lastmods: dict = None, previous: dict = None,
+                          deadline: float = None) -> dict:
+    """
+    Extract company information and return everything the profile store keeps
+
+    Args:
+        previous: stored entry for the same domain; unchanged pages reuse their
+                  records and the LLM merge is skipped if the Arabic text is unchanged
+        deadline: crawl budget end (epoch); fetching, logo OCR and JS rendering
+                  stop there and the LLM runs on what was gathered
+
+    Returns:
+        dict: {"profile", "llm_data", "text_hash", "pages", "crawl_report"}
+    """
+    started = time.time()
+    previous = previous or {}
+    report = {"skipped": [], "failed": []}
+    texts, name_candidates, logo_urls = [], [], []
     phones, emails, socials = set(), set(), set()
-    partners = set()
-    why_us = set()
-    projects = set()
-    branches = set()
+    partners, why_us, projects, branches = [], [], [], []
     consultations = []
     contact_like = []
     
     print(f"🔍 Processing {len(urls)} URLs...")
     
-    for u in urls:
+    # Per-page records are merged in the original URL order so the output is stable
+    records = crawl_page_records(urls, processes=processes, lastmods=lastmods, known=previous.get("pages"),
+                                 deadline=deadline, report=report)
+    for rec in records:
+        if rec is None:
+            continue
+        texts.append(rec["text"])
+        name_candidates.extend(rec["name_candidates"])
+        if rec["contact_like"]:
+            contact_like.append(rec["url"])
+        phones.update(rec["phones"])
+        emails.update(rec["emails"])
+        socials.update(rec["socials"])
+        _extend_unique(partners, rec["partners"])
+        _extend_unique(logo_urls, rec.get("logo_urls") or [])
+        _extend_unique(why_us, rec["why_us"])
+        _extend_unique(projects, rec["projects"])
+        _extend_unique(branches, rec["branches"])
+        _extend_unique(consultations, rec["consultations"])
+    
+    # OCR partner logos collected from all pages (deduped, cached, time-boxed)
+    ocr_budget = OCR_BUDGET_SECONDS
+    if deadline is not None:
+        ocr_budget = min(ocr_budget, time_left(deadline))
+    if ENABLE_OCR_PARTNERS and logo_urls and ocr_budget > 0:
         try:
-            print(f"  📄 Fetching: {u}")
-            h = get_html(u)
-            htmls.append(h)
-            
-            t = visible_text(h)
-            texts.append(t)
-            
-            # Mark contact-like pages for JS rendering fallback
-            path_lower = urlparse(u).path.lower()
-            if any(k in path_lower for k in ["contact", "تواصل", "اتصل"]):
-                contact_like.append(u)
-            
-            # Extract contacts (first pass, non-JS)
-            p, e, s = get_contacts_from_html(h)
-            phones.update(p)
-            emails.update(e)
-            socials.update(s)
-            
-            # Extract partners, why-us, projects, branches, and consultations
-            partners.update(extract_partners_from_html(h, base_url=u, ocr=ENABLE_OCR_PARTNERS))
-            why_us.update(extract_why_us_from_html(h))
-            projects.update(extract_previous_projects(h))
-            branches.update(extract_branch_locations(h))
-            for item in extract_consultations_from_html(h):
-                if item not in consultations:
-                    consultations.append(item)
-
+            _extend_unique(partners, ocr_logo_texts(logo_urls, budget_seconds=ocr_budget))
         except Exception as ex:
-            print(f"  ⚠️ Skip {u}: {ex}")
+            print(f"  ⚠️ Logo OCR skipped: {ex}")
     
     # If no emails found and JS rendering enabled, try contact pages with JS
     if not emails and ENABLE_JS_RENDER and contact_like:
         print("📧 No emails found, trying JS rendering on contact pages...")
         for u in contact_like[:3]:  # Limit to 3 pages
+            if deadline is not None and time_left(deadline) <= 0:
+                print("  ⏱️ Crawl budget exhausted, skipping JS rendering")
+                report["js_skipped"] = True
+                break
             print(f"  🔄 Rendering JS: {u}")
             h_js = get_html_js(u)
             if not h_js:
                 continue
             
             # Re-parse with JS-rendered DOM
-            p2, e2, s2 = get_contacts_from_html(h_js)
+            page_js = ParsedPage(h_js, url=u)
+            p2, e2, s2 = get_contacts_from_html(page_js)
             phones.update(p2)
             emails.update(e2)
             socials.update(s2)
             
             # Also try لماذا نحن, branches, and consultations again (in case lazy-loaded)
-            why_us.update(extract_why_us_from_html(h_js))
-            branches.update(extract_branch_locations(h_js))
-            for item in extract_consultations_from_html(h_js):
-                if item not in consultations:
-                    consultations.append(item)
+            _extend_unique(why_us, extract_why_us_from_html(page_js))
+            _extend_unique(branches, extract_branch_locations(page_js))
+            _extend_unique(consultations, extract_consultations_from_html(page_js))
     
     # Detect English name
-    english = detect_english_name(htmls)
+    english = pick_english_name(name_candidates)
     
-    # Merge all Arabic text
-    merged = keep_arabic(clean_links("\n\n".join(texts)))
-    
-    # Call OpenAI API for extraction
-    print("🤖 Calling OpenAI API for data extraction...")
-    client = OpenAI()
-    prompt = PROMPT_AR.replace("<<EN_NAME>>", english).replace("<<AR_TEXT>>", merged[:18000])
-    
-    resp = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=[
-            {"role": "system", "content": "أعد JSON صالح فقط."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0,
-        response_format={"type": "json_object"}
-    )
+    # Drop header/menu/footer lines repeated across pages, keeping long shared lines once
+    texts, common, removed = remove_boilerplate(texts)
+    if removed:
+        print(f"🧹 Removed {removed} repeated boilerplate lines")
     
-    data = json.loads(resp.choices[0].message.content)
+    # Merge all Arabic text
+    merged = keep_arabic(clean_links("\n\n".join(texts + [common])))
+    
+    text_hash = content_hash(english + "\n" + merged)
+    
+    if previous.get("text_hash") == text_hash and previous.get("llm_data"):
+        # Same text as the stored extraction: skip the LLM call
+        print("♻️ Company text unchanged, reusing the stored LLM extraction")
+        METER.record_cache_hit("company_profile", model=OPENAI_MODEL)
+        llm_data = previous["llm_data"]
+    else:
+        # Call OpenAI API for extraction
+        print("🤖 Calling OpenAI API for data extraction...")
+        client = OpenAI()
+        ar_text = trim_by_fields(merged, COMPANY_TEXT_TOKENS, PROMPT_FIELD_QUERIES, model=OPENAI_MODEL)
+        prompt = PROMPT_AR.replace("<<EN_NAME>>", english).replace("<<AR_TEXT>>", ar_text)
+        
+        resp = chat_completion(
+            "company_profile",
+            client=client,
+            model=OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": "أعد JSON صالح فقط."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0,
+            response_format={"type": "json_object"}
+        )
+        
+        llm_data = json.loads(resp.choices[0].message.content)
     
     # Enforce schema and fill contacts
-    data = coerce_schema(data)
+    data = coerce_schema(copy.deepcopy(llm_data))
     
     # Fill contact information
     data["التواصل"]["الهواتف"] = sorted(phones) if phones else ["غير متوفر"]
@@ -922,10 +1002,10 @@ def extract_company_info_from_urls(urls, api_key=None):
     data["التواصل"]["وسائل_التواصل"] = sorted(socials) if socials else ["غير متوفر"]
     
     # Merge scraped lists with AI-extracted lists
-    scraped_partners = list(partners) if partners else []
-    scraped_why_us = list(why_us) if why_us else []
-    scraped_projects = list(projects) if projects else []
-    scraped_branches = list(branches) if branches else []
+    scraped_partners = partners
+    scraped_why_us = why_us
+    scraped_projects = projects
+    scraped_branches = branches
 
     # Merge and dedupe branches
     merged_branches = (data.get("فروع_الشركة") or []) + scraped_branches
@@ -975,19 +1055,56 @@ def extract_company_info_from_urls(urls, api_key=None):
         print("⚙️ Removing duplicate وسائل_التواصل from root level")
         del data["وسائل_التواصل"]
     
+    report["partial"] = bool(report["skipped"] or report.get("js_skipped"))
+    report["elapsed_seconds"] = round(time.time() - started, 1)
+    if report["partial"]:
+        print(f"⚠️ Partial extraction ({report['elapsed_seconds']}s): {len(report['skipped'])} pages skipped")
+        for u in report["skipped"]:
+            print(f"  ⏭️ {u}")
+    
     print("✅ Extraction complete!")
-    return data
+    return {
+        "profile": data,
+        "llm_data": llm_data,
+        "text_hash": text_hash,
+        "pages": {rec["url"]: {"hash": rec["content_hash"], "record": rec} for rec in records if rec},
+        "crawl_report": report,
+    }
 
 
 # ===================== Sitemap Integration =====================
 
 def _same_host(url, root):
     """Check if URL belongs to same host as root"""
-    return urlparse(url).netloc == urlparse(root).netloc
+    return same_host(url, root)
+
 
+def _sitemap_to_df(sitemap_url: str):
+    """advertools sitemap_to_df (bypasses the shared session, so cassettes store the parsed rows)"""
+    import advertools as adv
+    import pandas as pd
+    
+    if not CASSETTE.active:
+        return adv.sitemaps.sitemap_to_df(sitemap_url)
+    
+    body = CASSETTE.wrap(
+        "sitemap_df", sitemap_url,
+        lambda: adv.sitemaps.sitemap_to_df(sitemap_url).to_json(orient="records", date_format="iso"),
+    )
+    df = pd.DataFrame(json.loads(body))
+    if "lastmod" in df:
+        df["lastmod"] = pd.to_datetime(df["lastmod"], utc=True, errors="coerce")
+    return df
+
+
+def load_sitemap_urls(root_url: str):
+    """
+    Load all URLs from the website sitemap as a DataFrame (legacy, loads everything)
 
-def load_sitemap_urls(root_url: str) -> pd.DataFrame:
-    """Load URLs from website sitemap"""
+    The crawl itself uses sitemap_discovery.discover_pages, which streams the
+    sitemap and keeps only the selected pages; advertools/pandas are imported
+    lazily here only for callers that still need the full DataFrame.
+    """
     candidates = [
         urljoin(root_url, "sitemap.xml"),
         urljoin(root_url, "/sitemap.xml"),
@@ -1003,9 +1120,9 @@ def load_sitemap_urls(root_url: str) -> pd.DataFrame:
     
     for sm in candidates:
         try:
-            df = adv.sitemaps.sitemap_to_df(sm)
+            df = _sitemap_to_df(sm)
             if "loc" in df and not df.empty:
-                df = df[df["loc"].apply(lambda u: _same_host(u, root_url))]
+                df = df[[_same_host(u, root_url) for u in df["loc"].astype(str)]]
                 if not df.empty:
                     return df[["loc", "lastmod"]] if "lastmod" in df else df[["loc"]]
         except Exception as e:
@@ -1014,36 +1131,76 @@ def load_sitemap_urls(root_url: str) -> pd.DataFrame:
     raise RuntimeError("No sitemap found/parsed. Tried:\n" + "\n".join(errors))
 
 
-def pick_pages(df: pd.DataFrame, max_pages: int = 30) -> list:
-    """Select best pages from sitemap based on relevance"""
-    urls = df["loc"].dropna().astype(str).tolist()
+def sitemap_lastmods(df) -> dict:
+    """Map each sitemap URL to its lastmod (as a string), when the sitemap has one"""
+    import pandas as pd
+    
+    if "lastmod" not in df:
+        return {}
+    return {
+        str(loc): str(lastmod)
+        for loc, lastmod in zip(df["loc"], df["lastmod"])
+        if pd.notna(loc) and pd.notna(lastmod) and str(lastmod).strip()
+    }
+
+
+def pick_pages(df, max_pages: int = 30) -> list:
+    """Select best pages from sitemap (DataFrame or list of URLs) based on relevance"""
+    urls = df["loc"].dropna().astype(str).tolist() if hasattr(df, "columns") else [str(u) for u in df if u]
     urls = list(dict.fromkeys(urls))
     
     # Prioritize Arabic pages
-    arabic = [u for u in urls if "/en/" not in u.lower()]
-    rest = [u for u in urls if u not in arabic]
-    
-    def score(u: str) -> int:
-        """Score URL based on relevant keywords"""
-        path = urlparse(u).path.lower()
-        hits = 0
-        keywords = [
-            "about", "من-نحن", "نبذة", "services", "الخدمات",
-            "contact", "تواصل", "vision", "الرؤية", "mission", "الرسالة",
-            "why-us", "لماذا", "projects", "مشاريع", "portfolio", "أعمال"
-        ]
-        for kw in keywords:
-            if kw in path:
-                hits += 1
-        return hits
-    
-    arabic_sorted = sorted(arabic, key=score, reverse=True)
-    selected = (arabic_sorted + rest)[:max_pages]
+    arabic = [u for u in urls if is_arabic_url(u)]
+    rest = [u for u in urls if not is_arabic_url(u)]
+    
+    arabic_sorted = sorted(arabic, key=score_url, reverse=True)
+    # Canonical duplicates and archive pages (pagination, authors, categories) are dropped;
+    # Arabic URLs come first so they win over their ?lang=en twins
+    candidates, dropped = dedupe_urls(arabic_sorted + rest)
+    if dropped:
+        print(f"  🔁 Sitemap: {dropped} archive/duplicate URLs skipped before fetch")
+    selected = candidates[:max_pages]
     
     return selected
 
 
-def extract_company_info_with_advertools(root_url: str, max_pages: int = 30, api_key=None) -> dict:
+def crawl_deadline(budget: float = None):
+    """
+    End of the crawl budget (epoch seconds), or None for no budget
+
+    Under an outer deadline_scope the crawl also leaves LLM_RESERVE_SECONDS for the LLM.
+    """
+    budget = CRAWL_BUDGET_SECONDS if budget is None else budget
+    deadline = time.time() + budget if budget and budget > 0 else None
+    outer = current_deadline()
+    if outer is not None:
+        outer -= LLM_RESERVE_SECONDS
+        deadline = outer if deadline is None else min(deadline, outer)
+    return deadline
+
+
+def select_pages(root_url: str, max_pages: int = 30, deadline: float = None):
+    """
+    Stream the sitemap and pick the best pages
+
+    Returns:
+        tuple: (urls, {url: lastmod})
+    """
+    try:
+        return discover_pages(root_url, max_pages=max_pages, deadline=deadline)
+    except RuntimeError as e:
+        if deadline is not None and time_left(deadline) <= 0:
+            # No time left for the advertools fallback: the home page still has most of the profile
+            print(f"  ⏱️ Crawl budget exhausted before a sitemap was found, using the root page only")
+            return [root_url], {}
+        # Fallback: advertools handles a few exotic sitemap formats
+        print(f"  ⚠️ Streaming sitemap discovery failed, trying advertools: {e}")
+        df = load_sitemap_urls(root_url)
+        return pick_pages(df, max_pages=max_pages), sitemap_lastmods(df)
+
+
+def extract_company_info_with_advertools(root_url: str, max_pages: int = 30, api_key=None, processes: int = None,
+                                         budget: float = None) -> dict:
     """
     Main function: Extract company information from website using sitemap
     
@@ -1051,6 +1208,8 @@ def extract_company_info_with_advertools(root_url: str, max_pages: int = 30, api
         root_url: Website root URL (e.g., "https://example.com")
         max_pages: Maximum number of pages to scrape (default: 30)
         api_key: OpenAI API key (optional, uses env var if not provided)
+        processes: Worker processes for per-page analysis (default: CRAWL_ANALYSIS_PROCESSES)
+        budget: Wall-clock seconds for discovery + fetching (default: CRAWL_BUDGET_SECONDS, 0 = none)
     
     Returns:
         Dictionary containing extracted company information
@@ -1058,12 +1217,128 @@ def extract_company_info_with_advertools(root_url: str, max_pages: int = 30, api
     print(f"🌐 Starting extraction for: {root_url}")
     print(f"📋 Loading sitemap...")
     
-    df = load_sitemap_urls(root_url)
-    selected = pick_pages(df, max_pages=max_pages)
+    deadline = crawl_deadline(budget)
+    selected, lastmods = select_pages(root_url, max_pages=max_pages, deadline=deadline)
+    
+    print(f"✅ Selected {len(selected)} pages from sitemap")
+    
+    return extract_company_state(selected, api_key=api_key, processes=processes,
+                                 lastmods=lastmods, deadline=deadline)["profile"]
+
+
+_refreshing = set()
+_refresh_lock = threading.Lock()
+
+
+def refresh_in_background(root_url: str, max_pages: int = 30, api_key=None, processes: int = None) -> bool:
+    """
+    Re-crawl a domain without a budget in a daemon thread (one refresh per domain at a time)
+
+    Returns:
+        bool: False if a refresh for this domain is already running
+    """
+    domain = normalize_domain(root_url)
+    with _refresh_lock:
+        if domain in _refreshing:
+            return False
+        _refreshing.add(domain)
+
+    # وسوم الجلسة فقط (لا مهلة الطلب التفاعلي) — contextvars لا تنتقل للـ thread
+    tags = current_tags()
+
+    def run():
+        try:
+            with metering_context(**tags), priority_scope(PRIORITY_BATCH):
+                get_company_profile(root_url, max_pages=max_pages, api_key=api_key, force_refresh=True,
+                                    processes=processes, budget=0, background_refresh=False)
+            print(f"🔄 Background refresh finished for {domain}")
+        except Exception as e:
+            print(f"⚠️ Background refresh failed for {domain}: {e}")
+        finally:
+            with _refresh_lock:
+                _refreshing.discard(domain)
+
+    threading.Thread(target=run, name=f"refresh-{domain}", daemon=True).start()
+    return True
+
+
+def _crawl_and_store(domain: str, root_url: str, max_pages: int, api_key, processes, budget, entry) -> dict:
+    print(f"🌐 Starting extraction for: {root_url}")
+    print(f"📋 Loading sitemap...")
+    
+    deadline = crawl_deadline(budget)
+    selected, lastmods = select_pages(root_url, max_pages=max_pages, deadline=deadline)
     
     print(f"✅ Selected {len(selected)} pages from sitemap")
     
-    return extract_company_info_from_urls(selected, api_key=api_key)
+    state = extract_company_state(selected, api_key=api_key, processes=processes,
+                                  lastmods=lastmods, previous=entry, deadline=deadline)
+    COMPANY_STORE.save(domain, {**state, "root_url": root_url})
+    return state
+
+
+def get_company_profile(root_url: str, max_pages: int = 30, api_key=None, ttl: int = None,
+                        force_refresh: bool = False, processes: int = None,
+                        budget: float = None, background_refresh: bool = True) -> dict:
+    """
+    Company profile through the per-domain store
+
+    Within the TTL the stored profile is returned as is. After it, the site is
+    re-crawled but only changed pages are re-extracted, and the LLM runs only if
+    the merged Arabic text changed.
+
+    Only one crawl per domain runs at a time (threads and processes). Sessions
+    arriving meanwhile wait for it and reuse its result instead of crawling again.
+
+    Args:
+        root_url: Website root URL
+        max_pages: Maximum number of pages to scrape
+        api_key: OpenAI API key (optional)
+        ttl: Profile lifetime in seconds (default COMPANY_PROFILE_TTL)
+        force_refresh: Ignore the TTL and refresh now
+        processes: Worker processes for per-page analysis
+        budget: Wall-clock seconds for discovery + fetching (default: CRAWL_BUDGET_SECONDS, 0 = none)
+        background_refresh: After a partial crawl, complete the profile in a background thread
+
+    Returns:
+        Dictionary containing extracted company information
+    """
+    domain = normalize_domain(root_url)
+    entry = COMPANY_STORE.load(domain)
+    
+    if entry and not force_refresh and COMPANY_STORE.is_fresh(entry, ttl):
+        print(f"♻️ Using stored company profile for {domain}")
+        METER.record_cache_hit("company_profile", model=OPENAI_MODEL)
+        return entry["profile"]
+    
+    wait = SINGLE_FLIGHT_WAIT_SECONDS
+    left = remaining_time()
+    if left is not None:
+        wait = min(wait, max(0.0, left - LLM_RESERVE_SECONDS))
+    
+    wait_started = time.time()
+    try:
+        with COMPANY_STORE.single_flight(domain, timeout=wait) as waited:
+            if waited:
+                latest = COMPANY_STORE.load(domain)
+                if latest and "profile" in latest and latest.get("updated_at", 0) >= wait_started:
+                    print(f"♻️ Reusing the crawl of {domain} that finished while waiting")
+                    METER.record_cache_hit("company_profile", model=OPENAI_MODEL)
+                    return latest["profile"]
+                entry = latest or entry
+            state = _crawl_and_store(domain, root_url, max_pages, api_key, processes, budget, entry)
+    except SingleFlightTimeout as e:
+        if entry and "profile" in entry:
+            print(f"⏱️ {e}; using the stored profile for {domain}")
+            return entry["profile"]
+        print(f"⏱️ {e}; crawling without waiting")
+        state = _crawl_and_store(domain, root_url, max_pages, api_key, processes, budget, entry)
+    
+    if state["crawl_report"]["partial"] and background_refresh:
+        # Pages fetched now are reused by the refresh through the store and HTTP cache
+        if refresh_in_background(root_url, max_pages=max_pages, api_key=api_key, processes=processes):
+            print(f"🔄 Refreshing {domain} in the background")
+    return state["profile"]
 
 
 # ===================== Main Execution =====================
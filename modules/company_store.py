@@ -0,0 +1,159 @@
+"""
+Company Store Module
+مخزن دائم لملفات تعريف الشركات حسب النطاق (domain) مع مدة صلاحية (TTL)
+
+كل مدخل يحفظ البروفايل النهائي، ومخرجات النموذج اللغوي قبل الدمج، وسجل
+الاستخراج لكل صفحة مع بصمة محتواها (hash) — لإعادة استخراج الصفحات المتغيرة فقط
+
+single_flight: زحف واحد لكل نطاق في نفس الوقت (بين الـ threads وبين العمليات عبر
+ملف قفل)؛ الجلسات الأخرى تنتظر وتعيد استخدام نتيجته
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+COMPANY_STORE_DIR = os.getenv("COMPANY_STORE_DIR", "data/cache/company_profiles")
+PROFILE_TTL_SECONDS = int(os.getenv("COMPANY_PROFILE_TTL", str(24 * 3600)))
+LOCK_POLL_SECONDS = 0.2
+
+
+class SingleFlightTimeout(TimeoutError):
+    """انتهت مهلة انتظار الزحف الجاري لنفس النطاق"""
+
+
+def normalize_domain(url: str) -> str:
+    """https://www.RNEC.sa/ar/ → rnec.sa"""
+    url = (url or "").strip()
+    if "//" not in url:
+        url = "//" + url
+    host = (urlparse(url).hostname or "").lower().rstrip(".")
+    return host[4:] if host.startswith("www.") else host
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class CompanyProfileStore:
+    """
+    ملف JSON لكل نطاق داخل COMPANY_STORE_DIR
+
+    Entry:
+        {
+          "domain", "root_url", "updated_at",
+          "profile":   البروفايل النهائي (company_profile.json),
+          "llm_data":  رد النموذج قبل دمج القوائم المستخرجة,
+          "text_hash": بصمة النص العربي المدمج المرسل للنموذج,
+          "pages":     {url: {"hash": ..., "record": ...}},
+          "crawl_report": {"partial", "skipped", "failed", "elapsed_seconds"}
+        }
+    """
+
+    def __init__(self, store_dir: str = COMPANY_STORE_DIR, ttl: int = PROFILE_TTL_SECONDS):
+        self.store_dir = store_dir
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._flights = {}  # domain -> threading.Lock
+
+    def _path(self, domain: str) -> str:
+        return os.path.join(self.store_dir, f"{domain}.json")
+
+    def load(self, domain: str):
+        try:
+            with open(self._path(domain), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, domain: str, entry: dict) -> dict:
+        entry = {**entry, "domain": domain, "updated_at": time.time()}
+        os.makedirs(self.store_dir, exist_ok=True)
+        path = self._path(domain)
+        with self._lock:
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        return entry
+
+    def is_fresh(self, entry: dict, ttl: int = None) -> bool:
+        """داخل مدة الصلاحية ومن زحف مكتمل (الزحف الجزئي بسبب الميزانية يُحدّث في الطلب التالي)"""
+        ttl = self.ttl if ttl is None else ttl
+        if not entry or "profile" not in entry or (entry.get("crawl_report") or {}).get("partial"):
+            return False
+        return time.time() - entry.get("updated_at", 0) < ttl
+
+    # ============================================
+    # Single-flight
+    # ============================================
+    def _flight_lock(self, domain: str) -> threading.Lock:
+        with self._lock:
+            return self._flights.setdefault(domain, threading.Lock())
+
+    @contextmanager
+    def _file_lock(self, domain: str, deadline: float):
+        """قفل بين العمليات (fcntl)؛ بدونه (Windows) يكفي قفل الـ threads"""
+        try:
+            import fcntl
+        except ImportError:
+            yield False
+            return
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        waited = False
+        with open(self._path(domain) + ".lock", "a+") as f:
+            while True:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.time() >= deadline:
+                        raise SingleFlightTimeout(f"{domain}: crawl lock held by another process")
+                    waited = True
+                    time.sleep(LOCK_POLL_SECONDS)
+            try:
+                yield waited
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @contextmanager
+    def single_flight(self, domain: str, timeout: float):
+        """
+        زحف واحد لكل نطاق: داخل السياق يعمل مالك القفل فقط
+
+        Yields:
+            bool: True إذا انتظر المستدعي زحفاً آخر (ليعيد قراءة المخزن قبل الزحف)
+
+        Raises:
+            SingleFlightTimeout: إذا لم ينتهِ الزحف الجاري خلال timeout ثانية
+        """
+        deadline = time.time() + timeout
+        lock = self._flight_lock(domain)
+        waited = not lock.acquire(blocking=False)
+        if waited:
+            print(f"⏳ Waiting for the running crawl of {domain}")
+            if not lock.acquire(timeout=max(0.0, deadline - time.time())):
+                raise SingleFlightTimeout(f"{domain}: crawl still running in this process")
+        try:
+            with self._file_lock(domain, deadline) as file_waited:
+                if file_waited and not waited:
+                    print(f"⏳ Waited for a crawl of {domain} in another process")
+                yield waited or file_waited
+        finally:
+            lock.release()
+
+    def invalidate(self, domain: str):
+        try:
+            os.remove(self._path(domain))
+        except OSError:
+            pass
+
+
+# مخزن واحد لكل العملية
+COMPANY_STORE = CompanyProfileStore()
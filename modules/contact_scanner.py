@@ -0,0 +1,204 @@
+"""
+Contact Scanner Module
+استخراج الإيميلات والهواتف وحسابات التواصل الاجتماعي من الصفحة في مرور واحد
+
+- مرور واحد على شجرة الـ DOM يجمع النصوص وقيم الـ attributes وروابط tel:/mailto:/wa.me
+- فلترة رخيصة قبل أي regex: '@' للإيميلات، الأرقام للهواتف، '.com' للحسابات
+- الإيميلات المبعثرة (مسافات/محارف غير مرئية بين الأجزاء) تُلتقط بتوسع محدود حول كل '@'
+  بدل regex بمحددات {1,255} تتراجع (backtracking) على صفحات Elementor الكبيرة
+"""
+
+import re
+
+from bs4 import Tag, NavigableString, CData
+
+from modules.parsed_page import as_page
+
+
+EMAIL_RE = re.compile(r"[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}", re.I)
+PHONE = re.compile(r"(?:\+?966|0)5\d{8}")
+INVIS_RE = re.compile(r"[\u200e\u200f\u202A-\u202E\u2066-\u2069\u00A0]")  # bidi/nbsp
+
+SOCIAL_RE = re.compile(
+    r"(?:https?://|//)?(?:www\.)?"
+    r"(instagram\.com|twitter\.com|x\.com|linkedin\.com|facebook\.com|snapchat\.com|tiktok\.com|youtube\.com)"
+    r"/[^\s\"'<>)]{1,200}",
+    re.I
+)
+
+MAX_LOCAL = 64     # أقصى طول للجزء قبل '@'
+MAX_DOMAIN = 255   # أقصى طول للنطاق بعد '@'
+
+# نفس أنواع النصوص التي يرجعها soup.get_text (بدون scripts/styles/comments)
+TEXT_TYPES = (NavigableString, CData)
+
+# أنماط مثبتة بطول محدود (بدون تراجع مكلف): الجزء المحلي يُطابق على نافذة مقلوبة،
+# والنطاق حتى MAX_DOMAIN محرفاً بعد '@' (endpos)
+_INVIS_CLASS = r"\u200e\u200f\u202A-\u202E\u2066-\u2069\u00A0"
+_LOCAL_REVERSED = re.compile(r"\s{0,3}([A-Z0-9._%+\-" + _INVIS_CLASS + r"]{1,%d})" % MAX_LOCAL, re.I)
+_DOMAIN = re.compile(
+    r"\s{0,3}([A-Z0-9\-" + _INVIS_CLASS + r"]+(?:\s{0,3}\.\s{0,3}[A-Z0-9\-" + _INVIS_CLASS + r"]+)*)",
+    re.I
+)
+
+
+def strip_invisible(s: str) -> str:
+    return INVIS_RE.sub("", s or "")
+
+
+def normalize_sa_phone(num: str) -> str:
+    """Normalize Saudi phone numbers to +966XXXXXXXXX format"""
+    digits = re.sub(r"\D", "", num)
+
+    if digits.startswith("05") and len(digits) >= 10:
+        return "+966" + digits[1:10]  # +966 5xxxxxxxx
+    if digits.startswith("9665"):
+        return "+" + digits[:12]  # +9665xxxxxxxx
+    if digits.startswith("966") and not digits.startswith("9665"):
+        return "+" + digits
+
+    return "+" + digits if digits else num
+
+
+def normalize_email_candidate(s: str) -> str:
+    """Normalize email candidate by removing invisible chars and spaces"""
+    s = strip_invisible(s)
+    s = re.sub(r"\s+", "", s)
+    s = s.replace("٫", ".").replace("·", ".").replace("•", ".")
+    return s
+
+
+# ============================================
+# Emails
+# ============================================
+def _email_around(s: str, at: int) -> str:
+    """
+    الإيميل المحيط بـ '@' في الموضع at (أو "")
+
+    التوسع محدود بـ MAX_LOCAL / MAX_DOMAIN محرفاً، والمسافات مقبولة فقط مباشرة حول
+    '@' و '.' (مثل "info @ example . com") حتى لا تُلصق الكلمات السابقة بالإيميل.
+    """
+    # الجزء المحلي: نافذة محدودة قبل '@' مقلوبة، ثم match مثبت من بدايتها
+    window = s[max(0, at - MAX_LOCAL - 3):at][::-1]
+    m = _LOCAL_REVERSED.match(window)
+    if not m:
+        return ""
+    local = m.group(1)[::-1]
+
+    d = _DOMAIN.match(s, at + 1, at + 1 + MAX_DOMAIN)
+    if not d or "." not in d.group(1):
+        return ""
+
+    candidate = normalize_email_candidate(local + "@" + d.group(1)).strip(".")
+    e = EMAIL_RE.match(candidate)
+    return e.group(0) if e else ""
+
+
+def scan_emails(text: str) -> set:
+    """كل الإيميلات في النص، بزمن خطي في طول النص (فلترة بـ '@' أولاً)"""
+    found = set()
+    at = text.find("@")
+    while at != -1:
+        e = _email_around(text, at)
+        if e:
+            found.add(e)
+        at = text.find("@", at + 1)
+    return found
+
+
+# ============================================
+# Single-pass page scan
+# ============================================
+def _social_norm(u: str) -> str:
+    """Normalize social media URL"""
+    u = u.strip()
+    if u.startswith("//"):
+        return "https:" + u
+    if not u.startswith("http"):
+        return "https://" + u.lstrip("/")
+    return u
+
+
+def _collect(page):
+    """
+    مرور واحد على الـ DOM
+
+    Returns:
+        tuple: (النصوص المرئية, قيم attributes المرشحة للهواتف, روابط href, نصوص قوائم Elementor)
+    """
+    strings, phone_attrs, hrefs, list_texts = [], [], [], []
+    for node in page.soup.descendants:
+        if isinstance(node, Tag):
+            for name, v in node.attrs.items():
+                for x in (v if isinstance(v, list) else (v,)):
+                    x = str(x)
+                    if name == "href":
+                        hrefs.append(x)
+                    if "5" in x:
+                        phone_attrs.append(x)
+            if node.name == "span" and "elementor-icon-list-text" in (node.get("class") or ()):
+                list_texts.append(node.get_text(" ", strip=True))
+        elif type(node) in TEXT_TYPES:
+            s = node.strip()
+            if s:
+                strings.append(s)
+    return strings, phone_attrs, hrefs, list_texts
+
+
+def scan_contacts(html) -> tuple:
+    """
+    الهواتف والإيميلات وحسابات التواصل من صفحة (نص HTML أو ParsedPage) في مرور واحد
+
+    القنوات: روابط tel:/mailto:/واتساب، النص المرئي (بفواصل وبدونها لالتقاط الإيميلات
+    المقسمة بين عناصر)، الـ HTML الخام بعد فك الـ entities (يشمل كل الـ attributes)،
+    ونصوص قوائم Elementor.
+
+    Returns:
+        tuple: (phones, emails, socials) كقوائم مرتبة
+    """
+    page = as_page(html)
+    strings, phone_attrs, hrefs, list_texts = _collect(page)
+    text_spaced = strip_invisible(" ".join(strings))
+    text_tight = strip_invisible("".join(strings))
+    raw = page.raw_text
+
+    # ---- Phones ----
+    phones = set()
+    for h in hrefs:
+        if h.startswith("tel:"):
+            phones.add(h[4:].strip())
+        elif "wa.me/" in h or "api.whatsapp.com/send" in h:
+            m = PHONE.search(h)
+            if m:
+                phones.add(m.group(0))
+    phones.update(PHONE.findall(text_spaced))
+    if phone_attrs:
+        phones.update(PHONE.findall(strip_invisible("\n".join(phone_attrs))))
+
+    normalized = set()
+    for p in phones:
+        n = normalize_sa_phone(p)
+        if "966" in n and len(n) >= 13:  # +9665xxxxxxxx
+            normalized.add(n)
+
+    # ---- Emails ----
+    emails = set()
+    for h in hrefs:
+        if h.startswith("mailto:"):
+            emails.add(h[7:].split("?", 1)[0].strip())
+    for blob in (text_spaced, text_tight, raw):
+        if "@" in blob:
+            emails |= scan_emails(blob)
+    for txt in list_texts:
+        n = normalize_email_candidate(txt)
+        if EMAIL_RE.fullmatch(n):
+            emails.add(n)
+    emails = {e.lower() for e in emails if EMAIL_RE.fullmatch(e)}
+
+    # ---- Socials ----
+    socials = set()
+    for blob in (text_spaced, raw):
+        if ".com/" in blob.lower():
+            socials.update(_social_norm(m.group(0)) for m in SOCIAL_RE.finditer(blob))
+
+    return sorted(normalized), sorted(emails), sorted(socials)
@@ -0,0 +1,223 @@
+"""
+Evidence Index Module
+فهرس متجهات محلي لحقائق بروفايل الشركة: كل عنصر قائمة (أو فقرة من حقل نصي)
+في company_profile.json مدخل مستقل، وكل معيار RFP يسترجع أقرب k أدلة فقط
+بدلاً من إرسال البروفايل كاملاً مع كل متطلب
+
+- التضمين عبر OpenAI embeddings (EVIDENCE_EMBEDDING_MODEL)
+- بديل محلي بدون شبكة: متجهات char n-gram مجزأة (hashing trick)
+- كل دليل يحتفظ بمصدره (اسم الحقل) لإسناد الدليل في تقرير الفجوات
+"""
+
+import os
+import re
+import time
+import math
+import zlib
+
+from openai import OpenAI
+
+from modules.llm_metrics import METER
+from utils.text_utils import normalize_arabic
+
+
+EMBEDDING_MODEL = os.getenv("EVIDENCE_EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = 512
+# openai | local (local = hashed n-grams فقط، بدون أي طلب)
+EMBEDDING_BACKEND = os.getenv("EVIDENCE_EMBEDDINGS", "openai").strip().lower()
+EMBEDDING_BATCH = 256
+
+EVIDENCE_TOP_K = int(os.getenv("EVIDENCE_TOP_K", "5"))
+MIN_FACT_CHARS = 3
+MAX_FACT_CHARS = 600
+
+NGRAM_SIZES = (3, 4)
+HASH_DIMENSIONS = 2048
+
+# قيم placeholder في البروفايل
+MISSING_VALUES = {"غير متوفر", "غير متوفرة", "n/a", "none", "null", "-"}
+# حقول لا تصلح كأدلة على قدرات الشركة
+SKIP_FIELDS = {"التواصل", "contacts", "crawl_report", "source_pages", "meta"}
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!؟?])\s+|\n+")
+
+
+# ============================================
+# Profile facts
+# ============================================
+def _field_label(path: list) -> str:
+    return " / ".join(str(p).replace("_", " ") for p in path)
+
+
+def _split_long(text: str) -> list:
+    """فقرات الحقول النصية؛ الفقرة الطويلة تُقسم إلى جمل مجمعة حتى MAX_FACT_CHARS"""
+    out = []
+    for block in re.split(r"\n\s*\n", text):
+        block = " ".join(block.split())
+        if len(block) <= MAX_FACT_CHARS:
+            out.append(block)
+            continue
+        current = ""
+        for sentence in SENTENCE_SPLIT.split(block):
+            if current and len(current) + len(sentence) + 1 > MAX_FACT_CHARS:
+                out.append(current)
+                current = ""
+            current = f"{current} {sentence}".strip()
+        if current:
+            out.append(current)
+    return out
+
+
+def profile_facts(profile: dict) -> list:
+    """
+    حقائق البروفايل كمدخلات مستقلة
+
+    يعمل مع مفاتيح البروفايل الفعلية (العربية من company_extractor) أو القديمة
+    (الإنجليزية)، ويتجاهل القيم الفارغة و "غير متوفر" والمكرر.
+
+    Returns:
+        list: [{"id": "E1", "field": "الخدمات", "text": "..."}]
+    """
+    facts = []
+    seen = set()
+
+    def add(path, text):
+        text = " ".join(str(text).split())
+        if len(text) < MIN_FACT_CHARS or text.lower() in MISSING_VALUES:
+            return
+        key = normalize_arabic(text)
+        if key in seen:
+            return
+        seen.add(key)
+        facts.append({"id": f"E{len(facts) + 1}", "field": _field_label(path), "text": text})
+
+    def walk(path, value):
+        if value is None or (path and path[0] in SKIP_FIELDS):
+            return
+        if isinstance(value, dict):
+            for k, v in value.items():
+                walk(path + [k], v)
+        elif isinstance(value, (list, tuple, set)):
+            for v in value:
+                walk(path, v)
+        elif isinstance(value, str):
+            for part in _split_long(value):
+                add(path, part)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            add(path, value)
+
+    walk([], profile)
+    return facts
+
+
+def facts_text(facts: list) -> str:
+    """البروفايل كنص (حقل: قيمة) لمن يحتاج النص الكامل"""
+    return "\n".join(f"{f['field']}: {f['text']}" for f in facts)
+
+
+# ============================================
+# Embeddings
+# ============================================
+def _normalize(vec: list) -> list:
+    norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+    return [x / norm for x in vec]
+
+
+def hashed_ngram_vector(text: str, dimensions: int = HASH_DIMENSIONS) -> dict:
+    """متجه char n-gram متفرق {index: weight} (مطبّع)، بدون نموذج أو شبكة"""
+    text = f" {' '.join(normalize_arabic(text).split())} "
+    counts = {}
+    for n in NGRAM_SIZES:
+        for i in range(len(text) - n + 1):
+            idx = zlib.crc32(text[i:i + n].encode("utf-8")) % dimensions
+            counts[idx] = counts.get(idx, 0) + 1
+    # تخفيف أثر التكرار (sublinear tf)
+    weights = {k: 1 + math.log(v) for k, v in counts.items()}
+    norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+    return {k: w / norm for k, w in weights.items()}
+
+
+class Embedder:
+    """تضمين النصوص عبر OpenAI مع الرجوع للمتجهات المحلية عند أي فشل"""
+
+    def __init__(self, api_key: str = None, model: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND):
+        self.api_key = api_key
+        self.model = model
+        self.backend = backend
+
+    def embed(self, texts: list) -> list:
+        if self.backend == "openai":
+            try:
+                return self._openai(texts)
+            except Exception as e:
+                print(f"⚠️ Embeddings unavailable ({type(e).__name__}), using local n-gram vectors")
+                self.backend = "local"  # نفس النوع لكل متجهات الفهرس والاستعلامات
+        return [hashed_ngram_vector(t) for t in texts]
+
+    def _openai(self, texts: list) -> list:
+        client = OpenAI(api_key=self.api_key) if self.api_key else OpenAI()
+        vectors = []
+        for i in range(0, len(texts), EMBEDDING_BATCH):
+            chunk = texts[i:i + EMBEDDING_BATCH]
+            started = time.perf_counter()
+            response = client.embeddings.create(model=self.model, input=chunk, dimensions=EMBEDDING_DIMENSIONS)
+            usage = getattr(response, "usage", None)
+            METER.record("evidence_embeddings", model=self.model, latency=time.perf_counter() - started,
+                         prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0)
+            vectors.extend(_normalize(list(d.embedding)) for d in response.data)
+        return vectors
+
+
+def _similarity(a, b) -> float:
+    if isinstance(a, dict):  # متجهات n-gram متفرقة
+        if len(a) > len(b):
+            a, b = b, a
+        return sum(w * b.get(k, 0.0) for k, w in a.items())
+    return sum(x * y for x, y in zip(a, b))
+
+
+# ============================================
+# Index
+# ============================================
+class EvidenceIndex:
+    """فهرس حقائق البروفايل؛ الاسترجاع بتشابه جيب التمام (المتجهات مطبّعة)"""
+
+    def __init__(self, facts: list, embedder: Embedder = None):
+        self.facts = facts
+        self.embedder = embedder or Embedder()
+        self.vectors = self.embedder.embed(self._fact_texts()) if facts else []
+        self.backend = self.embedder.backend
+
+    def _fact_texts(self) -> list:
+        return [f"{f['field']}: {f['text']}" for f in self.facts]
+
+    @classmethod
+    def from_profile(cls, profile: dict, api_key: str = None) -> "EvidenceIndex":
+        return cls(profile_facts(profile), Embedder(api_key=api_key))
+
+    def search_many(self, queries: list, k: int = EVIDENCE_TOP_K) -> list:
+        """
+        أقرب k أدلة لكل استعلام
+
+        Returns:
+            list: لكل استعلام قائمة [{"id", "field", "text", "score"}] مرتبة تنازلياً
+        """
+        if not self.facts or not queries:
+            return [[] for _ in queries]
+        query_vectors = self.embedder.embed(list(queries))
+        if self.embedder.backend != self.backend:
+            # فشل التضمين بعد بناء الفهرس: إعادة الفهرس بنفس نوع متجهات الاستعلام
+            self.vectors = self.embedder.embed(self._fact_texts())
+            self.backend = self.embedder.backend
+        results = []
+        for qv in query_vectors:
+            scored = [(_similarity(qv, fv), i) for i, fv in enumerate(self.vectors)]
+            scored.sort(key=lambda s: (-s[0], s[1]))
+            results.append([
+                {**self.facts[i], "score": round(score, 4)}
+                for score, i in scored[:k] if score > 0
+            ])
+        return results
+
+    def search(self, query: str, k: int = EVIDENCE_TOP_K) -> list:
+        return self.search_many([query], k)[0]
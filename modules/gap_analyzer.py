@@ -3,36 +3,128 @@ Gap Analyzer Module
 تحليل الفجوات بين متطلبات RFP وقدرات الشركة
 """
 
+import os
 import json
+import contextvars
+from datetime import date
+from typing import List, Literal
+from concurrent.futures import ThreadPoolExecutor
+
 from openai import OpenAI
+from pydantic import BaseModel, Field, ValidationError, field_validator
 
+from modules.llm_client import chat_completion
+from modules.llm_metrics import METER
+from modules.gap_cache import GAP_CACHE, fingerprint
+from modules.prompt_budget import trim_to_budget, count_tokens
+from modules.evidence_index import (
+    EvidenceIndex, Embedder, profile_facts, facts_text,
+    EVIDENCE_TOP_K, EMBEDDING_BACKEND, EMBEDDING_MODEL,
+)
+from modules.gap_prematcher import prematch_requirements, PREMATCH_MIN_CONFIDENCE
 
-def analyze_gaps(
-    requirements_text: str, 
-    company_text: str,
-    api_key: str = None,
-    model: str = "gpt-4o-mini"
-):
+COMPANY_TEXT_TOKENS = 6000
+
+# ---- Sharding config ----
+GAP_BATCH_SIZE = int(os.getenv("GAP_BATCH_SIZE", "8"))        # معايير لكل طلب
+GAP_MAX_WORKERS = int(os.getenv("GAP_MAX_WORKERS", "6"))      # دفعات متزامنة (الجدولة تحد الباقي)
+GAP_USE_PREMATCH = os.getenv("GAP_PREMATCH", "1").strip().lower() in {"1", "true", "yes", "on"}
+GAP_USE_RETRIEVAL = os.getenv("GAP_EVIDENCE_RETRIEVAL", "1").strip().lower() in {"1", "true", "yes", "on"}
+GAP_BATCH_RETRIES = 2                                           # إعادة الدفعة الفاشلة فقط
+TOKENS_PER_CRITERION = 160                                      # ميزانية مخرجات كل معيار
+MAX_BATCH_TOKENS = 4000
+# يدخل في مفاتيح الكاش: ارفعه عند تغيير البرومبتات أو منطق التصنيف
+GAP_PROMPT_VERSION = "2"
+
+STATUS_COVERED = "مغطى ✅"
+STATUS_NOT_COVERED = "غير مغطى ❌"
+STATUS_UNCLEAR = "غير واضح ⚠"
+
+
+# ============================================
+# Structured output
+# ============================================
+class GapItem(BaseModel):
+    id: str = Field(description="معرف المتطلب كما ورد في المدخلات (R1, R2, ...)")
+    requirement: str = Field(description="نص المتطلب")
+    status: Literal["مغطى ✅", "غير مغطى ❌", "غير واضح ⚠"]
+    evidence: str = Field(default="", description="الدليل من نص الشركة (إن وُجد)")
+    evidence_ids: List[str] = Field(default_factory=list, description="معرفات الأدلة المستخدمة (E1, E2, ...)")
+
+    @field_validator("status", mode="before")
+    @classmethod
+    def normalize_status(cls, v):
+        # النموذج قد يحذف الرمز أو يضيف مسافات
+        s = str(v or "")
+        if "غير مغطى" in s:
+            return STATUS_NOT_COVERED
+        if "غير واضح" in s:
+            return STATUS_UNCLEAR
+        if "مغطى" in s:
+            return STATUS_COVERED
+        raise ValueError(f"unknown status: {s!r}")
+
+    @field_validator("evidence", mode="before")
+    @classmethod
+    def none_to_empty(cls, v):
+        return v or ""
+
+    @field_validator("evidence_ids", mode="before")
+    @classmethod
+    def ids_to_list(cls, v):
+        if not v:
+            return []
+        return [v] if isinstance(v, str) else [str(x) for x in v]
+
+
+class GapBatch(BaseModel):
+    items: List[GapItem]
+
+
+class GapBatchError(ValueError):
+    """رد دفعة غير صالح (JSON مقطوع، مخطط خاطئ، أو معايير ناقصة)"""
+
+
+def split_requirements(requirements) -> list:
+    """قائمة المتطلبات من list أو من نص (سطر لكل متطلب، مع أو بدون '- ')"""
+    if isinstance(requirements, str):
+        requirements = requirements.splitlines()
+    out = []
+    for r in requirements:
+        r = str(r).strip().lstrip("-•").strip()
+        if r:
+            out.append(r)
+    return out
+
+
+def _batch_prompt(batch: list, company_text: str = None, evidence: dict = None) -> str:
     """
-    مقارنة متطلبات RFP مع قدرات الشركة باستخدام GPT
-    
-    Args:
-        requirements_text: نص متطلبات RFP
-        company_text: نص قدرات الشركة
-        api_key: مفتاح OpenAI API (اختياري)
-        model: اسم النموذج
-        
-    Returns:
-        list: قائمة بالمتطلبات مع حالتها (مغطى/غير مغطى/غير واضح)
+    برومبت دفعة واحدة: إما نص الشركة كاملاً (مقصوصاً)، أو أدلة مسترجعة لكل متطلب
+
+    evidence: {rid: [{"id", "field", "text"}]} من EvidenceIndex؛ الأدلة المشتركة بين
+    متطلبات الدفعة تُكتب مرة واحدة
     """
-    
-    # Initialize OpenAI client
-    if api_key:
-        client = OpenAI(api_key=api_key)
+    if evidence is None:
+        lines = "\n".join(f"{rid}: {text}" for rid, text in batch)
+        company_block = f"[قدرات الشركة]\n{company_text}"
+        evidence_rule = '- "evidence": انسخ السطر أو الفكرة من نص الشركة الذي يثبت ذلك (باختصار).'
     else:
-        client = OpenAI()  # من البيئة
-    
-    prompt = f"""
+        pool = {}
+        for rid, _ in batch:
+            for fact in evidence.get(rid, []):
+                pool.setdefault(fact["id"], fact)
+        lines = "\n".join(
+            f"{rid}: {text} — الأدلة المرشحة: {', '.join(f['id'] for f in evidence.get(rid, [])) or 'لا يوجد'}"
+            for rid, text in batch
+        )
+        facts = "\n".join(f"{f['id']} ({f['field']}): {f['text']}" for f in pool.values()) or "لا توجد أدلة"
+        company_block = f"[أدلة من بروفايل الشركة] (كل سطر: المعرف (الحقل): النص)\n{facts}"
+        evidence_rule = (
+            '- "evidence": انسخ الفكرة من الأدلة التي تثبت ذلك (باختصار).\n'
+            '- "evidence_ids": معرفات الأدلة المستخدمة (مثل ["E3"]) أو [] إذا لم يوجد دليل.\n'
+            '- اعتمد على الأدلة المذكورة فقط؛ إذا لم تثبت الأدلة المتطلب فهو "غير مغطى ❌" أو "غير واضح ⚠".'
+        )
+    return f"""
 أنت تعمل كمراجع عطاءات (Procurement Compliance Checker).
 
 مهمتك:
@@ -44,62 +136,214 @@ def analyze_gaps(
    - "مغطى ✅"  = الشركة قادرة عليه بوضوح
    - "غير مغطى ❌" = الشركة لا تذكر أنها تقوم بهذا
    - "غير واضح ⚠" = مذكور بشكل غير مؤكد
-- "evidence": انسخ السطر أو الفكرة من نص الشركة الذي يثبت ذلك.
+{evidence_rule}
 
 المدخلات:
-[متطلبات المناقصة]
-{requirements_text}
-
-[قدرات الشركة]
-{company_text}
-
-أعد النتيجة في صيغة JSON كقائمة عناصر مثل:
-[
-  {{
-    "requirement": "نص المتطلب",
-    "status": "مغطى ✅ / غير مغطى ❌ / غير واضح ⚠",
-    "evidence": "الدليل من نص الشركة (إن وُجد)"
-  }}
-]
+[متطلبات المناقصة] (كل سطر: المعرف: المتطلب)
+{lines}
+
+{company_block}
+
+أعد كائن JSON واحداً فيه عنصر لكل متطلب ({len(batch)} عناصر) بنفس المعرفات:
+{{
+  "items": [
+    {{
+      "id": "R1",
+      "requirement": "نص المتطلب",
+      "status": "مغطى ✅ / غير مغطى ❌ / غير واضح ⚠",
+      "evidence": "الدليل من نص الشركة (إن وُجد)"{', "evidence_ids": ["E1"]' if evidence is not None else ''}
+    }}
+  ]
+}}
 """
-    
+
+
+def _parse_batch(raw_out: str, batch: list) -> dict:
+    """التحقق من رد دفعة وإرجاع {id: item}؛ يرفع GapBatchError إذا نقص أي معيار"""
+    cleaned = raw_out.replace("```json", "").replace("```", "").strip()
     try:
-        response = client.chat.completions.create(
+        parsed = GapBatch.model_validate_json(cleaned)
+    except ValidationError as e:
+        raise GapBatchError(f"invalid batch output: {e.errors()[0].get('msg', e)}") from e
+
+    by_id = {item.id.strip(): item for item in parsed.items}
+    missing = [rid for rid, _ in batch if rid not in by_id]
+    if missing:
+        raise GapBatchError(f"missing requirements {missing}")
+    return by_id
+
+
+def _analyze_batch(batch: list, company_text: str, client, model: str, evidence: dict = None,
+                   stage: str = "gap_analysis") -> list:
+    """
+    تحليل دفعة معايير واحدة مع إعادة المحاولة لهذه الدفعة فقط
+
+    Args:
+        evidence: {rid: أدلة مسترجعة} — إن وُجدت يُبنى البرومبت منها بدل نص الشركة
+
+    Returns:
+        list: عناصر الدفعة بترتيب المدخلات
+    """
+    if evidence is not None:
+        prompt = _batch_prompt(batch, evidence=evidence)
+    else:
+        # قص نص الشركة حسب صلته بمعايير هذه الدفعة
+        query = "\n".join(text for _, text in batch)
+        trimmed = trim_to_budget(company_text, COMPANY_TEXT_TOKENS, query=query, model=model)
+        prompt = _batch_prompt(batch, trimmed)
+    max_tokens = min(MAX_BATCH_TOKENS, TOKENS_PER_CRITERION * len(batch) + 100)
+
+    for attempt in range(GAP_BATCH_RETRIES + 1):
+        response = chat_completion(
+            stage,
+            client=client,
             model=model,
+            retry=attempt,
+            tags={"batch": batch[0][0]},
             messages=[
                 {"role": "system", "content": "أنت خبير تدقيق عطاءات صارم."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0,
-            max_tokens=1500,
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"},
         )
-        
-        raw_out = response.choices[0].message.content.strip()
-        print("✓ تم استلام الرد من LLM")
-        
-        # تنظيف الرد
-        cleaned = raw_out.replace("```json", "").replace("```", "").strip()
-        
+        choice = response.choices[0]
         try:
-            result = json.loads(cleaned)
-            print(f"✓ تم تحليل {len(result)} متطلب")
-            return result
-        except json.JSONDecodeError:
-            print("⚠ فشل تحليل JSON، إرجاع الرد الخام")
-            return [{"raw_output": raw_out}]
-            
-    except Exception as e:
-        print(f"❌ خطأ في analyze_gaps: {e}")
-        raise
+            by_id = _parse_batch(choice.message.content or "", batch)
+        except GapBatchError as e:
+            truncated = getattr(choice, "finish_reason", None) == "length"
+            print(f"⚠ دفعة {batch[0][0]}-{batch[-1][0]}: {'رد مقطوع' if truncated else e} "
+                  f"(محاولة {attempt + 1}/{GAP_BATCH_RETRIES + 1})")
+            if truncated:
+                max_tokens = min(MAX_BATCH_TOKENS, max_tokens * 2)
+            continue
 
+        # نص المتطلب من المدخلات لا من النموذج (قد يعيد صياغته)
+        results = []
+        for rid, text in batch:
+            item = by_id[rid]
+            result = {"requirement": text, "status": item.status, "evidence": item.evidence}
+            if evidence is not None:
+                # إسناد الدليل: فقط المعرفات التي أُرسلت فعلاً لهذا المتطلب
+                retrieved = {f["id"]: f for f in evidence.get(rid, [])}
+                result["sources"] = [
+                    {"id": fid, "field": retrieved[fid]["field"], "text": retrieved[fid]["text"]}
+                    for fid in dict.fromkeys(item.evidence_ids) if fid in retrieved
+                ]
+            results.append(result)
+        return results
 
-def generate_questions_based_gap(
+    print(f"❌ فشل تحليل الدفعة {batch[0][0]}-{batch[-1][0]} بعد {GAP_BATCH_RETRIES + 1} محاولات")
+    return [
+        {"requirement": text, "status": STATUS_UNCLEAR, "evidence": "", "error": "analysis_failed"}
+        for _, text in batch
+    ]
+
+
+def analyze_gaps(
+    requirements,
+    company_text: str,
+    api_key: str = None,
+    model: str = "gpt-4o-mini",
+    batch_size: int = GAP_BATCH_SIZE,
+    evidence: list = None,
+    stage: str = "gap_analysis",
+):
+    """
+    مقارنة متطلبات RFP مع قدرات الشركة باستخدام GPT
+    
+    المتطلبات تُقسم إلى دفعات (batch_size) تُرسل بالتوازي، كل دفعة ترجع JSON
+    يُتحقق منه بـ pydantic، والنتائج تُدمج بترتيب المتطلبات الأصلي. الدفعة المقطوعة
+    أو غير الصالحة فقط هي التي تُعاد.
+    
+    Args:
+        requirements: قائمة المتطلبات، أو نص بسطر لكل متطلب
+        company_text: نص قدرات الشركة
+        api_key: مفتاح OpenAI API (اختياري)
+        model: اسم النموذج
+        batch_size: عدد المعايير في كل طلب
+        evidence: أدلة مسترجعة لكل متطلب (بنفس ترتيب requirements، من EvidenceIndex)؛
+            إن وُجدت يُبنى كل برومبت منها فقط ويُضاف "sources" لكل نتيجة
+        stage: اسم المرحلة في سجل الاستهلاك
+        
+    Returns:
+        list: قائمة بالمتطلبات مع حالتها (مغطى/غير مغطى/غير واضح) بنفس ترتيب المدخلات
+    """
+    
+    # Initialize OpenAI client
+    if api_key:
+        client = OpenAI(api_key=api_key)
+    else:
+        client = OpenAI()  # من البيئة
+    
+    items = [(f"R{i}", text) for i, text in enumerate(split_requirements(requirements), 1)]
+    if not items:
+        return []
+    evidence_by_id = None
+    if evidence is not None:
+        if len(evidence) != len(items):
+            raise ValueError(f"evidence has {len(evidence)} entries for {len(items)} requirements")
+        evidence_by_id = {rid: facts for (rid, _), facts in zip(items, evidence)}
+    batch_size = max(1, batch_size)
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    print(f"⚙️ {len(items)} متطلب في {len(batches)} دفعة")
+    
+    if len(batches) == 1:
+        result = _analyze_batch(batches[0], company_text, client, model, evidence_by_id, stage)
+    else:
+        # كل دفعة في نسخة من السياق الحالي (المهلة ووسوم القياس في contextvars)
+        with ThreadPoolExecutor(max_workers=min(GAP_MAX_WORKERS, len(batches)), thread_name_prefix="gap") as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, _analyze_batch,
+                            batch, company_text, client, model, evidence_by_id, stage)
+                for batch in batches
+            ]
+            result = [item for fut in futures for item in fut.result()]
+    
+    failed = sum(1 for item in result if item.get("error"))
+    print(f"✓ تم تحليل {len(result) - failed} متطلب" + (f" (⚠ {failed} بدون نتيجة)" if failed else ""))
+    return result
+
+
+class GapQuestion(BaseModel):
+    question: str
+    requirements: List[int] = Field(default_factory=list, description="أرقام البنود التي يغطيها السؤال")
+
+
+class GapQuestions(BaseModel):
+    questions: List[GapQuestion]
+
+
+def _parse_questions(raw: str, count: int) -> tuple:
+    """
+    (questions, sources, validated) من JSON؛ وإلا سطر لكل سؤال والبند بنفس الترتيب
+    (validated=False: ربط تقريبي لا يُخزن في الكاش)
+    """
+    cleaned = raw.replace("```json", "").replace("```", "").strip()
+    try:
+        parsed = GapQuestions.model_validate_json(cleaned)
+        questions, sources = [], []
+        for q in parsed.questions:
+            if q.question.strip():
+                questions.append(q.question.strip())
+                sources.append(sorted({n - 1 for n in q.requirements if 1 <= n <= count}))
+        if questions:
+            return questions, sources, True
+    except ValidationError:
+        pass
+    # تنظيف الأسئلة
+    questions = [q.strip("1234567890).:-– ") for q in raw.split("\n") if q.strip()]
+    return questions, [[i] if i < count else [] for i in range(len(questions))], False
+
+
+def generate_questions_with_sources(
     missing_points: list,
     api_key: str = None,
     model: str = "gpt-4o-mini"
 ):
     """
-    توليد أسئلة توضيحية بناءً على المتطلبات غير المغطاة
+    توليد أسئلة توضيحية مع البنود التي جاء منها كل سؤال
     
     Args:
         missing_points: قائمة بالمتطلبات غير المغطاة
@@ -107,11 +351,21 @@ def generate_questions_based_gap(
         model: اسم النموذج
         
     Returns:
-        list: قائمة بالأسئلة التوضيحية
+        tuple: (الأسئلة، لكل سؤال قائمة مؤشرات البنود في missing_points)
     """
     
     if not missing_points:
-        return ["لا توجد فجوات واضحة تستدعي استفسارات إضافية."]
+        return ["لا توجد فجوات واضحة تستدعي استفسارات إضافية."], [[]]
+    
+    # نفس مجموعة البنود (بأي ترتيب) = نفس الأسئلة؛ البنود تُحفظ كنصوص وتُعاد لمؤشرات
+    cache_key = fingerprint(sorted(set(missing_points)), model, GAP_PROMPT_VERSION)
+    cached = GAP_CACHE.get("questions", cache_key)
+    if cached:
+        METER.record_cache_hit("gap_questions", model=model)
+        position = {m: i for i, m in enumerate(missing_points)}
+        sources = [[position[r] for r in reqs if r in position] for reqs in cached["requirements"]]
+        print(f"✓ {len(cached['questions'])} سؤال من الكاش")
+        return cached["questions"], sources
     
     # Initialize OpenAI client
     if api_key:
@@ -119,7 +373,7 @@ def generate_questions_based_gap(
     else:
         client = OpenAI()
     
-    joined_points = "\n".join(f"- {m}" for m in missing_points)
+    joined_points = "\n".join(f"{i}. {m}" for i, m in enumerate(missing_points, 1))
 
     prompt = f"""
 أنت خبير في المناقصات وتوليد الاستفسارات الرسمية.
@@ -134,45 +388,74 @@ def generate_questions_based_gap(
 - لا تكرر نفس الفكرة بصياغات مختلفة.
 - لا تضف مقدمة أو شرح.
 - أخرج {len(missing_points)} أسئلة فقط.
+- لكل سؤال اذكر أرقام البنود التي يغطيها.
+
+أعد JSON فقط بالشكل:
+{{"questions": [{{"question": "يرجى توضيح...", "requirements": [1]}}]}}
 """
     
     try:
-        response = client.chat.completions.create(
+        response = chat_completion(
+            "gap_questions",
+            client=client,
             model=model,
             messages=[
                 {"role": "system", "content": "خبير مناقصات"},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.3,
-            max_tokens=600
+            max_tokens=200 + 120 * len(missing_points),
+            response_format={"type": "json_object"},
         )
         
         raw = response.choices[0].message.content.strip()
-        print(f"✓ تم توليد {len(missing_points)} سؤال")
-        
-        # تنظيف الأسئلة
-        questions = [q.strip("1234567890).:-– ") for q in raw.split("\n") if q.strip()]
-        return questions
+        questions, sources, validated = _parse_questions(raw, len(missing_points))
+        print(f"✓ تم توليد {len(questions)} سؤال")
+        if validated:
+            GAP_CACHE.put("questions", cache_key, {
+                "questions": questions,
+                "requirements": [[missing_points[i] for i in src] for src in sources],
+            })
+        return questions, sources
         
     except Exception as e:
         print(f"❌ خطأ في generate_questions: {e}")
         raise
 
 
+def generate_questions_based_gap(
+    missing_points: list,
+    api_key: str = None,
+    model: str = "gpt-4o-mini"
+):
+    """
+    توليد أسئلة توضيحية بناءً على المتطلبات غير المغطاة
+    
+    Returns:
+        list: قائمة بالأسئلة التوضيحية
+    """
+    return generate_questions_with_sources(missing_points, api_key=api_key, model=model)[0]
+
+
 def perform_full_gap_analysis(
     rfp_criteria_file: str,
     company_profile_file: str,
     output_file: str = "gap_analysis.json",
-    api_key: str = None
+    api_key: str = None,
+    model: str = "gpt-4o-mini"
 ):
     """
     تحليل شامل للفجوات بين RFP والشركة
     
+    نتائج التحليل والأسئلة مخزنة في GAP_CACHE حسب محتوى المدخلات، فإعادة
+    التشغيل بنفس المعايير والبروفايل لا تستدعي النموذج
+    
     Args:
         rfp_criteria_file: ملف معايير RFP (JSON)
         company_profile_file: ملف بروفايل الشركة (JSON)
         output_file: ملف حفظ النتيجة
         api_key: مفتاح OpenAI API
+        model: اسم النموذج
         
     Returns:
         dict: تقرير شامل بالفجوات والأسئلة
@@ -187,10 +470,8 @@ def perform_full_gap_analysis(
     with open(rfp_criteria_file, 'r', encoding='utf-8') as f:
         rfp_data = json.load(f)
     
-    # تحويل المعايير إلى نص
-    rfp_text = ""
-    for criteria in rfp_data.get('criteria', []):
-        rfp_text += f"- {criteria['name']}: {criteria['description']}\n"
+    # معيار لكل متطلب
+    requirements = split_requirements(f"{c['name']}: {c['description']}" for c in rfp_data.get('criteria', []))
     
     print(f"✓ تم تحميل {len(rfp_data.get('criteria', []))} معيار")
     
@@ -199,35 +480,76 @@ def perform_full_gap_analysis(
     with open(company_profile_file, 'r', encoding='utf-8') as f:
         company_data = json.load(f)
     
-    # تحويل البروفايل إلى نص
-    company_text = f"""
-اسم الشركة: {company_data.get('company_names', {}).get('ar', [''])[0]}
-نبذة: {company_data.get('about_us', '')}
-الخدمات: {', '.join(company_data.get('services', []))}
-المجالات: {', '.join(company_data.get('industries_or_focus', []))}
-التراخيص: {', '.join(company_data.get('licenses_or_certifications', []))}
-سنوات الخبرة: {company_data.get('experience_years', '')}
-الأعمال السابقة: {', '.join(company_data.get('previous_work', []))}
-"""
+    # حقائق البروفايل (كل عنصر قائمة مدخل مستقل) بمفاتيح البروفايل الفعلية
+    facts = profile_facts(company_data)
+    company_text = facts_text(facts)
     
-    print(f"✓ تم تحميل بروفايل الشركة")
+    print(f"✓ تم تحميل بروفايل الشركة ({len(facts)} معلومة)")
     
-    # 3. تحليل الفجوات
-    print(f"\n⚙️ بدء المقارنة...")
-    gap_results = analyze_gaps(rfp_text, company_text, api_key=api_key)
+    # الكاش: نفس المعايير + نفس البروفايل + نفس النموذج والبرومبت = نفس النتيجة
+    settings = {
+        "prematch": GAP_USE_PREMATCH,
+        "prematch_min_confidence": PREMATCH_MIN_CONFIDENCE,
+        "retrieval": GAP_USE_RETRIEVAL,
+        "top_k": EVIDENCE_TOP_K,
+        "embeddings": [EMBEDDING_BACKEND, EMBEDDING_MODEL],
+        "year": date.today().year,  # سنوات الخبرة من سنة التأسيس
+    }
+    cache_key = fingerprint(rfp_data.get('criteria', []), company_data, model, GAP_PROMPT_VERSION, settings)
+    cached = GAP_CACHE.get("analysis", cache_key)
+    
+    if cached:
+        gap_results, avoided = cached["gap_results"], cached["llm_evaluations_avoided"]
+        METER.record_cache_hit("gap_analysis", model=model)
+        print(f"\n♻️ نتائج التحليل من الكاش ({cache_key[:12]})")
+    else:
+        # 3. حسم الحالات الواضحة محلياً (شهادات، سنوات خبرة، تطابق معجمي كامل)
+        decisions = [None] * len(requirements)
+        if GAP_USE_PREMATCH:
+            decisions = prematch_requirements(requirements, facts)
+        pending = [r for r, d in zip(requirements, decisions) if d is None]
+        avoided = len(requirements) - len(pending)
+        print(f"\n🧮 حُسم {avoided} من {len(requirements)} متطلب محلياً (تم تجنب {avoided} تقييم LLM)")
+        
+        # 4. تحليل الفجوات للمتطلبات الغامضة فقط
+        evidence = None
+        cacheable = True
+        if pending and GAP_USE_RETRIEVAL and facts:
+            print(f"\n🔎 استرجاع أفضل {EVIDENCE_TOP_K} أدلة لكل متطلب...")
+            index = EvidenceIndex(facts, Embedder(api_key=api_key))
+            evidence = index.search_many(pending)
+            full_tokens = count_tokens(company_text)
+            per_requirement = [count_tokens(facts_text(e)) for e in evidence] or [0]
+            print(f"✓ أدلة لكل متطلب: ~{sum(per_requirement) // len(per_requirement)} توكن "
+                  f"بدلاً من {full_tokens} للبروفايل كاملاً ({index.backend})")
+            # فشل مؤقت للتضمين (رجوع لمتجهات n-gram) لا يُخزن تحت مفتاح الـ backend المطلوب
+            cacheable = index.backend == EMBEDDING_BACKEND
+        
+        llm_results = []
+        if pending:
+            print(f"\n⚙️ بدء المقارنة...")
+            llm_results = analyze_gaps(pending, company_text, api_key=api_key, model=model, evidence=evidence)
+        
+        # دمج بالترتيب الأصلي
+        llm_iter = iter(llm_results)
+        gap_results = [d if d is not None else next(llm_iter) for d in decisions]
+        
+        # دفعة فشلت نهائياً أو أدلة بغير الـ backend المطلوب لا تُخزن (تُعاد في التشغيل التالي)
+        if cacheable and not any(item.get("error") for item in gap_results):
+            GAP_CACHE.put("analysis", cache_key, {"gap_results": gap_results, "llm_evaluations_avoided": avoided})
     
-    # 4. تصنيف النتائج
+    # 5. تصنيف النتائج
     covered = []
     not_covered = []
     unclear = []
     
     for item in gap_results:
         status = item.get('status', '')
-        if 'مغطى ✅' in status:
+        if status == STATUS_COVERED:
             covered.append(item)
-        elif 'غير مغطى ❌' in status:
+        elif status == STATUS_NOT_COVERED:
             not_covered.append(item)
-        elif 'غير واضح ⚠' in status:
+        elif status == STATUS_UNCLEAR:
             unclear.append(item)
     
     print(f"\n📊 النتائج:")
@@ -235,26 +557,29 @@ def perform_full_gap_analysis(
     print(f"   ❌ غير مغطى: {len(not_covered)}")
     print(f"   ⚠ غير واضح: {len(unclear)}")
     
-    # 5. توليد الأسئلة
+    # 6. توليد الأسئلة
     print(f"\n❓ توليد الأسئلة التوضيحية...")
     missing_requirements = [item['requirement'] for item in not_covered + unclear]
-    questions = generate_questions_based_gap(missing_requirements, api_key=api_key)
+    questions, question_sources = generate_questions_with_sources(missing_requirements, api_key=api_key, model=model)
     
-    # 6. إنشاء التقرير
+    # 7. إنشاء التقرير
     report = {
         "summary": {
             "total_requirements": len(gap_results),
             "covered": len(covered),
             "not_covered": len(not_covered),
-            "unclear": len(unclear)
+            "unclear": len(unclear),
+            "llm_evaluations_avoided": avoided
         },
         "covered_requirements": covered,
         "not_covered_requirements": not_covered,
         "unclear_requirements": unclear,
-        "clarification_questions": questions
+        "clarification_questions": questions,
+        # لكل سؤال: المتطلبات التي جاء منها (لإعادة تقييمها عند الإجابة، انظر gap_incremental)
+        "question_requirements": [[missing_requirements[i] for i in src] for src in question_sources]
     }
     
-    # 7. حفظ التقرير
+    # 8. حفظ التقرير
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(report, f, ensure_ascii=False, indent=2)
     
@@ -282,6 +607,8 @@ def print_gap_analysis(report: dict):
     print(f"   ✅ مغطى: {summary['covered']}")
     print(f"   ❌ غير مغطى: {summary['not_covered']}")
     print(f"   ⚠ غير واضح: {summary['unclear']}")
+    if summary.get('llm_evaluations_avoided'):
+        print(f"   🧮 حُسمت محلياً بدون LLM: {summary['llm_evaluations_avoided']}")
     
     # المتطلبات المغطاة
     if report['covered_requirements']:
@@ -290,6 +617,8 @@ def print_gap_analysis(report: dict):
             print(f"\n{i}. {item['requirement']}")
             if item.get('evidence'):
                 print(f"   الدليل: {item['evidence']}")
+            if item.get('sources'):
+                print(f"   المصدر: {', '.join(dict.fromkeys(src['field'] for src in item['sources']))}")
     
     # المتطلبات غير المغطاة
     if report['not_covered_requirements']:
@@ -304,6 +633,8 @@ def print_gap_analysis(report: dict):
             print(f"\n{i}. {item['requirement']}")
             if item.get('evidence'):
                 print(f"   الدليل: {item['evidence']}")
+            if item.get('sources'):
+                print(f"   المصدر: {', '.join(dict.fromkeys(src['field'] for src in item['sources']))}")
     
     # الأسئلة التوضيحية
     if report['clarification_questions']:
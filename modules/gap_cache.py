@@ -0,0 +1,67 @@
+"""
+Gap Cache Module
+كاش دائم بعنوان المحتوى (content-addressed) لنتائج تحليل الفجوات والأسئلة التوضيحية
+
+- التحليل: مفتاحه بصمة (محتوى المعايير، بروفايل الشركة، النموذج، إصدار البرومبت)
+- الأسئلة: مفتاحها مجموعة المتطلبات الناقصة (بدون ترتيب) + النموذج + إصدار البرومبت
+
+أي تغيير في المدخلات يغير المفتاح، فلا حاجة لمدة صلاحية أو إبطال يدوي؛ تغيير
+البرومبت أو منطق التحليل يكون برفع GAP_PROMPT_VERSION في gap_analyzer
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+
+GAP_CACHE_DIR = os.getenv("GAP_CACHE_DIR", "data/cache/gap_analysis")
+GAP_CACHE_ENABLED = os.getenv("GAP_CACHE", "1").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def fingerprint(*parts) -> str:
+    """بصمة sha256 لقيم JSON (المفاتيح مرتبة، فترتيب مفاتيح الملف لا يغير البصمة)"""
+    canonical = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class GapCache:
+    """
+    ملف JSON لكل مفتاح داخل <GAP_CACHE_DIR>/<namespace>/
+
+    Entry: {"key", "created_at", "value"}
+    """
+
+    def __init__(self, cache_dir: str = GAP_CACHE_DIR, enabled: bool = GAP_CACHE_ENABLED):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self._lock = threading.Lock()
+
+    def _path(self, namespace: str, key: str) -> str:
+        return os.path.join(self.cache_dir, namespace, f"{key}.json")
+
+    def get(self, namespace: str, key: str):
+        if not self.enabled:
+            return None
+        try:
+            with open(self._path(namespace, key), "r", encoding="utf-8") as f:
+                return json.load(f)["value"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, namespace: str, key: str, value):
+        if not self.enabled:
+            return value
+        path = self._path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "created_at": time.time(), "value": value}, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        return value
+
+
+# كاش واحد لكل العملية
+GAP_CACHE = GapCache()
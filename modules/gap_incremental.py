@@ -0,0 +1,220 @@
+"""
+Gap Incremental Module
+إعادة تقييم الفجوات تدريجياً مع وصول إجابات الشات بوت: كل سؤال توضيحي مرتبط
+بالمتطلبات التي جاء منها (question_requirements في gap_analysis.json)، وعند تسجيل
+إجابة يُعاد تقييم هذه المتطلبات فقط بطلب LLM واحد صغير ويُحدّث التقرير وملخصه
+في مكانه. أدلة كل إعادة تقييم: كل إجابات المتطلب حتى الآن + أدلة البروفايل
+الأصلية (profile_sources) التي لا تُستبدل بما استشهد به النموذج
+"""
+
+import os
+import json
+import threading
+import contextvars
+
+from modules.gap_analyzer import (
+    analyze_gaps,
+    STATUS_COVERED,
+    STATUS_NOT_COVERED,
+    STATUS_UNCLEAR,
+)
+from modules.gap_prematcher import BM25
+from utils.text_utils import tokenize
+
+
+REEVALUATION_WAIT_SECONDS = 60
+
+# مفاتيح قوائم التقرير لكل حالة
+STATUS_LISTS = {
+    STATUS_COVERED: "covered_requirements",
+    STATUS_NOT_COVERED: "not_covered_requirements",
+    STATUS_UNCLEAR: "unclear_requirements",
+}
+SUMMARY_KEYS = {
+    "covered_requirements": "covered",
+    "not_covered_requirements": "not_covered",
+    "unclear_requirements": "unclear",
+}
+
+_report_lock = threading.Lock()  # قراءة-تعديل-كتابة التقرير
+_pending_lock = threading.Lock()
+_pending = []
+
+
+# ============================================
+# Report I/O
+# ============================================
+def load_report(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_report(path: str, report: dict):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _all_items(report: dict) -> list:
+    return [item for key in STATUS_LISTS.values() for item in report.get(key, [])]
+
+
+# ============================================
+# Question -> requirements
+# ============================================
+def requirements_for_question(report: dict, question_index: int, question: str = None) -> list:
+    """
+    المتطلبات التي جاء منها السؤال
+
+    من question_requirements إن وُجدت؛ للتقارير الأقدم: أقرب متطلب غير مغطى/غير
+    واضح للسؤال معجمياً (BM25)
+    """
+    mapping = report.get("question_requirements")
+    if mapping and 0 <= question_index < len(mapping):
+        return list(mapping[question_index])
+
+    questions = report.get("clarification_questions", [])
+    question = question or (questions[question_index] if 0 <= question_index < len(questions) else "")
+    missing = [item["requirement"] for item in
+               report.get("not_covered_requirements", []) + report.get("unclear_requirements", [])]
+    if not missing or not question:
+        return []
+    top = BM25(missing).best(tokenize(question), k=1)
+    return [missing[top[0][1]]] if top else []
+
+
+# ============================================
+# Re-evaluation
+# ============================================
+def _profile_sources(item: dict) -> list:
+    """أدلة البروفايل الأصلية للمتطلب (لا تُستبدل بما استشهد به النموذج عند إعادة التقييم)"""
+    if "profile_sources" in item:
+        return item["profile_sources"]
+    return [src for src in item.get("sources", []) if not src.get("id", "").startswith("A")]
+
+
+def _answers(item: dict, answer_fact: dict) -> list:
+    """كل إجابات المتطلب السابقة + الجديدة (إعادة إجابة نفس السؤال تستبدل القديمة)"""
+    previous = [a for a in item.get("answers", []) if a["id"] != answer_fact["id"]]
+    return previous + [answer_fact]
+
+
+def _answer_evidence(item: dict, answer_fact: dict) -> list:
+    """أدلة إعادة التقييم: كل إجابات العميل على المتطلب ثم أدلة البروفايل الأصلية"""
+    return _answers(item, answer_fact) + _profile_sources(item)
+
+
+def _apply(report: dict, updated: list, question_index: int, answer_fact: dict) -> list:
+    """نقل العناصر المحدّثة بين القوائم وتحديث الملخص؛ يرجع تغييرات الحالة فقط"""
+    by_requirement = {item["requirement"]: item for item in updated}
+    changes = []
+    for key in STATUS_LISTS.values():
+        kept = []
+        for item in report.get(key, []):
+            new = by_requirement.get(item["requirement"])
+            if new is None:
+                kept.append(item)
+                continue
+            new = {
+                **new,
+                "profile_sources": _profile_sources(item),
+                "answers": _answers(item, answer_fact),
+                "answered_by": sorted(set(item.get("answered_by", [])) | {question_index}),
+            }
+            if new["status"] != item.get("status"):
+                changes.append({"requirement": item["requirement"], "from": item.get("status"), "to": new["status"]})
+            if STATUS_LISTS.get(new["status"]) == key:
+                kept.append(new)
+            else:
+                report.setdefault(STATUS_LISTS[new["status"]], []).append(new)
+        report[key] = kept
+
+    summary = report.setdefault("summary", {})
+    for key, summary_key in SUMMARY_KEYS.items():
+        summary[summary_key] = len(report.get(key, []))
+    summary["total_requirements"] = sum(len(report.get(key, [])) for key in STATUS_LISTS.values())
+    summary["reevaluated_from_answers"] = len({i["requirement"] for i in _all_items(report) if i.get("answered_by")})
+    return changes
+
+
+def reevaluate_answer(
+    report_file: str,
+    question_index: int,
+    question: str,
+    answer: str,
+    api_key: str = None,
+    model: str = "gpt-4o-mini",
+) -> dict:
+    """
+    إعادة تقييم المتطلبات المرتبطة بسؤال واحد بعد إجابته وتحديث التقرير في مكانه
+
+    Args:
+        report_file: ملف gap_analysis.json
+        question_index: رقم السؤال في clarification_questions
+        question: نص السؤال
+        answer: إجابة العميل
+        api_key: مفتاح OpenAI API (اختياري)
+        model: اسم النموذج
+
+    Returns:
+        dict: {"changes": [{"requirement", "from", "to"}], "summary": ملخص التقرير بعد التحديث}
+    """
+    report = load_report(report_file)
+    requirements = requirements_for_question(report, question_index, question)
+    items = {item["requirement"]: item for item in _all_items(report)}
+    targets = [items[r] for r in requirements if r in items]
+    if not targets or not (answer or "").strip():
+        return {"changes": [], "summary": report.get("summary", {})}
+
+    # طلب واحد: كل متطلبات السؤال في دفعة واحدة، الأدلة = كل الإجابات + أدلة البروفايل
+    answer_fact = {"id": f"A{question_index + 1}", "field": f"إجابة العميل على: {question}", "text": answer}
+    updated = analyze_gaps(
+        [item["requirement"] for item in targets],
+        "",
+        api_key=api_key,
+        model=model,
+        batch_size=len(targets),
+        evidence=[_answer_evidence(item, answer_fact) for item in targets],
+        stage="gap_reevaluation",
+    )
+    # فشل التحليل لا يُسقط حالة سابقة
+    updated = [u for u in updated if not u.get("error")]
+
+    with _report_lock:
+        # قراءة جديدة: قد يكون تحديث آخر كُتب أثناء طلب النموذج
+        report = load_report(report_file)
+        changes = _apply(report, updated, question_index, answer_fact)
+        save_report(report_file, report)
+
+    for c in changes:
+        print(f"🔁 {c['requirement'][:60]}: {c['from']} -> {c['to']}")
+    return {"changes": changes, "summary": report["summary"]}
+
+
+def reevaluate_in_background(report_file: str, question_index: int, question: str, answer: str,
+                             api_key: str = None, model: str = "gpt-4o-mini") -> threading.Thread:
+    """reevaluate_answer في daemon thread (بنفس سياق المهلة ووسوم القياس) دون حجب الشات"""
+    ctx = contextvars.copy_context()
+
+    def run():
+        try:
+            ctx.run(reevaluate_answer, report_file, question_index, question, answer, api_key, model)
+        except Exception as e:
+            print(f"⚠️ Gap re-evaluation failed for question {question_index + 1}: {e}")
+
+    thread = threading.Thread(target=run, name=f"gap-reeval-{question_index}", daemon=True)
+    with _pending_lock:
+        _pending[:] = [t for t in _pending if t.is_alive()]
+        _pending.append(thread)
+    thread.start()
+    return thread
+
+
+def wait_for_reevaluations(timeout: float = REEVALUATION_WAIT_SECONDS) -> bool:
+    """انتظار إعادة التقييمات الجارية (قبل قراءة التقرير لتوليد العرض)؛ False عند انتهاء المهلة"""
+    with _pending_lock:
+        threads = list(_pending)
+    for t in threads:
+        t.join(timeout)
+    return not any(t.is_alive() for t in threads)
@@ -0,0 +1,276 @@
+"""
+Gap Pre-matcher Module
+مطابقة معجمية محلية (توحيد عربي + BM25) تحسم الحالات الواضحة قبل analyze_gaps:
+
+- شهادات/تراخيص بمعرف معروف (ISO 9001، OHSAS، PMP، ...) مذكورة في البروفايل: مغطى
+- سنوات خبرة بحد أدنى: من سنة التأسيس أو خبرة الشركة (لا خبرة الفريق)
+- متطلب كل كلماته المميزة موجودة في حقيقة واحدة من البروفايل (BM25)
+
+لا يُحسم "غير مغطى" إلا من مصدر صريح (سنوات خبرة الشركة أقل من المطلوب)؛ غياب
+المعرف أو وجود نفي أو تعارض بين المصادر = "غامض" ويُرسل للنموذج. الحقائق من evidence_index.profile_facts
+فالمعرفات (E1, E2, ...) ومصادر الأدلة نفسها في المسارين.
+"""
+
+import os
+import re
+import math
+from datetime import date
+
+from utils.text_utils import normalize_arabic, tokenize, TOKEN_RE
+
+
+PREMATCH_MIN_CONFIDENCE = float(os.getenv("GAP_PREMATCH_MIN_CONFIDENCE", "0.85"))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+MIN_DISTINCT_TERMS = 2  # متطلب بكلمة مميزة واحدة لا يُحسم معجمياً
+
+STATUS_COVERED = "مغطى ✅"
+STATUS_NOT_COVERED = "غير مغطى ❌"
+
+# كلمات صياغة المعايير (لا تميز متطلباً عن آخر) — بعد normalize_arabic و light_stem
+CRITERIA_STOPWORDS = {
+    "تقييم", "مدي", "وجود", "تحديد", "عدد", "قدره", "كيفيه", "اليه", "اليات", "خلال", "عمليه",
+    "متقدم", "متقدمين", "جهه", "مقدم", "مقدمه", "توفر", "متوفره", "متوفر", "لازمه", "لازم",
+    "يجب", "اخذ", "بعين", "اعتبار", "اي", "شكل", "كامل", "مشروع", "عمل", "تنفيذ", "اطلاع",
+    "evaluation", "assessment", "bidder", "provide", "project",
+}
+
+CERT_HINT_RE = re.compile(r"(شهاد|ترخيص|رخص|اعتماد|تصنيف|عضوي|certif|licen|accredit|iso)", re.I)
+# معرفات شهادات/معايير: ISO 9001، OHSAS 18001، SASO 2902، أو اختصار شهادة معروف (PMP، LEED)
+CERT_ID_RE = re.compile(r"\b([A-Z]{2,6})[\s\-:]*(\d{3,5}(?::\d{4})?)\b|\b([A-Z]{3,6})\b")
+# جهات معايير تسبق الرقم (ISO 9001) — غيرها (SAP 2023) ليس شهادة
+STANDARD_BODIES = {"ISO", "IEC", "OHSAS", "SASO", "BS", "EN", "ASTM", "NFPA", "ANSI", "ASME", "IEEE", "SBC"}
+# اختصارات شهادات بدون رقم؛ أي اختصار آخر (SAP، ERP، CST) لا يُعد شهادة
+KNOWN_CERT_ACRONYMS = {
+    "PMP", "CAPM", "PMI", "LEED", "CMMI", "ITIL", "CISSP", "CISA", "CISM", "CCNA", "CCNP",
+    "COBIT", "TOGAF", "HACCP", "GMP", "NEBOSH", "IOSH", "OSHA", "FSSC", "BREEAM", "HSE",
+}
+# كتابة عربية لجهات المعايير (بعد normalize_arabic)
+CERT_ALIASES = {"iso": ("iso", "ايزو"), "saso": ("saso", "ساسو")}
+
+# أدوات نفي (بعد normalize_arabic، مع الواو الملتصقة)
+NEGATION_TOKENS = {
+    "لا", "ولا", "غير", "وغير", "ليس", "ليست", "وليس", "لسنا", "بدون", "وبدون", "عدم", "وعدم",
+    "لم", "ولم", "لن", "not", "no", "without",
+}
+
+YEARS_UNIT = r"(?:سنه|سنوات|سنين|عام|عاما|اعوام|years?)"
+YEARS_RE = re.compile(r"(\d{1,3})\s*\+?\s*" + YEARS_UNIT)
+# حد أدنى صريح فقط ("لا تقل عن 10 سنوات"، "خبرة 5 سنوات") لا "خلال آخر 5 سنوات"
+REQUIRED_YEARS_RE = re.compile(
+    r"(?:لا\s*(?:تقل|يقل)\s*عن|اكثر\s*من|علي\s*الاقل|at\s+least|minimum(?:\s+of)?|خبره)\s*(\d{1,3})\s*\+?\s*" + YEARS_UNIT
+    + r"|(\d{1,3})\s*\+?\s*" + YEARS_UNIT + r"\s*(?:من\s*)?(?:ال)?(?:خبره|experience)"
+)
+EXPERIENCE_RE = re.compile(r"(خبر|experience)")
+FOUNDED_RE = re.compile(r"\b(19\d{2}|20\d{2})\b")
+FOUNDED_FIELD_RE = re.compile(r"(تاسيس|founded|established)")
+# خبرة الأفراد/الفريق لا خبرة الشركة ("فريق بخبرة تراكمية 30 سنة")
+TEAM_RE = re.compile(r"(فريق|خبراء|مهندس|كوادر|موظف|اعضاء|استشاريين|تراكمي|team|staff|engineers)")
+
+
+# ============================================
+# BM25
+# ============================================
+class BM25:
+    """BM25 (Okapi) على حقائق البروفايل بعد tokenize"""
+
+    def __init__(self, docs: list, k1: float = BM25_K1, b: float = BM25_B):
+        self.docs = [tokenize(d) for d in docs]
+        self.sets = [set(d) for d in self.docs]
+        self.k1, self.b = k1, b
+        self.n = len(self.docs)
+        self.avgdl = sum(len(d) for d in self.docs) / self.n if self.n else 0.0
+        df = {}
+        for terms in self.sets:
+            for t in terms:
+                df[t] = df.get(t, 0) + 1
+        self.df = df
+
+    def idf(self, term: str) -> float:
+        df = self.df.get(term, 0)
+        return math.log(1 + (self.n - df + 0.5) / (df + 0.5))
+
+    def score(self, query_terms: list, i: int) -> float:
+        doc = self.docs[i]
+        if not doc:
+            return 0.0
+        tf = {}
+        for t in doc:
+            tf[t] = tf.get(t, 0) + 1
+        norm = self.k1 * (1 - self.b + self.b * len(doc) / (self.avgdl or 1.0))
+        return sum(
+            self.idf(t) * tf[t] * (self.k1 + 1) / (tf[t] + norm)
+            for t in set(query_terms) if t in tf
+        )
+
+    def best(self, query_terms: list, k: int = 3) -> list:
+        """[(score, index)] لأعلى k حقائق (score > 0)"""
+        scored = [(self.score(query_terms, i), i) for i in range(self.n)]
+        scored = [s for s in scored if s[0] > 0]
+        scored.sort(key=lambda s: (-s[0], s[1]))
+        return scored[:k]
+
+    def coverage(self, query_terms: list, i: int) -> float:
+        """نسبة وزن idf لكلمات المتطلب الموجودة في الحقيقة i"""
+        terms = set(query_terms)
+        total = sum(self.idf(t) for t in terms)
+        if not total:
+            return 0.0
+        return sum(self.idf(t) for t in terms if t in self.sets[i]) / total
+
+
+# ============================================
+# Rules
+# ============================================
+def _source(fact: dict) -> dict:
+    return {"id": fact["id"], "field": fact["field"], "text": fact["text"]}
+
+
+def _decision(requirement: str, status: str, confidence: float, rule: str, facts: list, evidence: str = "") -> dict:
+    return {
+        "requirement": requirement,
+        "status": status,
+        "evidence": evidence or (facts[0]["text"] if facts else ""),
+        "sources": [_source(f) for f in facts],
+        "decided_by": f"lexical:{rule}",
+        "confidence": round(confidence, 3),
+    }
+
+
+def has_negation(text: str) -> bool:
+    return any(w in NEGATION_TOKENS for w in TOKEN_RE.findall(normalize_arabic(text)))
+
+
+def cert_identifiers(text: str) -> list:
+    """معرفات الشهادات/المعايير المعروفة المذكورة في النص (مثل "ISO 9001"، "PMP")"""
+    ids = []
+    for m in CERT_ID_RE.finditer(text or ""):
+        if m.group(1) and m.group(1) in STANDARD_BODIES:
+            ids.append(f"{m.group(1)} {m.group(2).split(':')[0]}")
+        elif m.group(3) in KNOWN_CERT_ACRONYMS:
+            ids.append(m.group(3))
+    return list(dict.fromkeys(ids))
+
+
+def _id_pattern(identifier: str):
+    """المعرف بالحروف اللاتينية أو العربية (ISO 9001 / الأيزو 9001)"""
+    body, _, number = identifier.lower().partition(" ")
+    names = "|".join(re.escape(a) for a in CERT_ALIASES.get(body, (body,)))
+    pattern = rf"(?<![\w])(?:[وبفكل]{{0,2}}ال)?(?:{names})"
+    if number:
+        pattern += rf"[\s\-:]*{re.escape(number)}"
+    return re.compile(pattern + r"(?![\w])")
+
+
+def _match_certifications(requirement: str, facts: list, folded: list):
+    """مغطى فقط إذا ذُكرت كل المعرفات بدون نفي؛ غيابها لا يعني عدم وجودها (يحسمه النموذج)"""
+    if not CERT_HINT_RE.search(requirement):
+        return None
+    identifiers = cert_identifiers(requirement)
+    if not identifiers:
+        return None
+    hits = []
+    for ident in identifiers:
+        pattern = _id_pattern(ident)
+        hit = next((f for f, text in zip(facts, folded) if pattern.search(text)), None)
+        if hit is None or has_negation(hit["text"]):
+            return None
+        hits.append(hit)
+    hits = list({id(f): f for f in hits}.values())
+    return _decision(requirement, STATUS_COVERED, 0.95, "certification", hits)
+
+
+def _profile_years(facts: list, folded: list) -> list:
+    """
+    مصادر سنوات الخبرة في البروفايل: [(tier, years, fact)]
+
+    tier 0 = سنة التأسيس، 1 = حقل خبرة الشركة، 2 = نص حر؛ خبرة الفريق مستبعدة
+    """
+    found = []
+    for fact, text in zip(facts, folded):
+        field = normalize_arabic(fact["field"])
+        if FOUNDED_FIELD_RE.search(field) or FOUNDED_FIELD_RE.search(text):
+            m = FOUNDED_RE.search(text)
+            if m:
+                years = date.today().year - int(m.group(1))
+                if 0 <= years < 150:
+                    found.append((0 if FOUNDED_FIELD_RE.search(field) else 2, years, fact))
+                continue
+        if (EXPERIENCE_RE.search(field) or EXPERIENCE_RE.search(text)) and not TEAM_RE.search(text):
+            tier = 1 if EXPERIENCE_RE.search(field) else 2
+            for m in YEARS_RE.finditer(text):
+                years = int(m.group(1))
+                if 0 < years < 150:
+                    found.append((tier, years, fact))
+    return found
+
+
+def _match_experience_years(requirement: str, facts: list, folded: list):
+    text = normalize_arabic(requirement)
+    if not EXPERIENCE_RE.search(text):
+        return None
+    m = REQUIRED_YEARS_RE.search(text)
+    if not m:
+        return None
+    required = int(m.group(1) or m.group(2))
+    found = _profile_years(facts, folded)
+    if not found:
+        return None  # البروفايل لا يذكر المدة: غامض لا "غير مغطى"
+    if len({years >= required for _, years, _ in found}) > 1:
+        return None  # مصادر متعارضة: يحسمها النموذج
+    # المصدر الأوثق (سنة التأسيس، ثم حقل الخبرة، ثم النص الحر)
+    _, years, fact = min(found, key=lambda f: (f[0], -f[1]))
+    if years >= required:
+        return _decision(requirement, STATUS_COVERED, 0.9, "experience_years", [fact])
+    return _decision(requirement, STATUS_NOT_COVERED, 0.85, "experience_years", [fact],
+                     evidence=f"{fact['text']} (أقل من {required} سنوات)")
+
+
+def _match_terms(requirement: str, facts: list, bm25: BM25):
+    terms = [t for t in tokenize(requirement) if t not in CRITERIA_STOPWORDS]
+    if len(set(terms)) < MIN_DISTINCT_TERMS:
+        return None
+    top = bm25.best(terms, k=1)
+    if not top:
+        return None
+    _, i = top[0]
+    if has_negation(facts[i]["text"]):
+        return None  # "لا نقدم ..." تطابق معجمي لكنه نفي
+    confidence = bm25.coverage(terms, i)
+    if confidence < PREMATCH_MIN_CONFIDENCE:
+        return None
+    return _decision(requirement, STATUS_COVERED, confidence, "bm25", [facts[i]])
+
+
+# ============================================
+# Entry point
+# ============================================
+def prematch_requirements(requirements: list, facts: list, min_confidence: float = PREMATCH_MIN_CONFIDENCE) -> list:
+    """
+    حسم المتطلبات الواضحة محلياً
+
+    Args:
+        requirements: نصوص المتطلبات
+        facts: حقائق البروفايل (evidence_index.profile_facts)
+        min_confidence: أقل ثقة لقبول القرار المحلي
+
+    Returns:
+        list: لكل متطلب قرار بصيغة نتائج analyze_gaps (+ decided_by و confidence)،
+              أو None إذا كان غامضاً ويحتاج النموذج
+    """
+    folded = [normalize_arabic(f["text"]) for f in facts]
+    bm25 = BM25([f"{f['field']} {f['text']}" for f in facts])
+    decisions = []
+    for requirement in requirements:
+        decision = None
+        for rule in (_match_certifications, _match_experience_years):
+            decision = rule(requirement, facts, folded)
+            if decision:
+                break
+        if decision is None and facts:
+            decision = _match_terms(requirement, facts, bm25)
+        if decision is not None and decision["confidence"] < min_confidence:
+            decision = None
+        decisions.append(decision)
+    return decisions
@@ -0,0 +1,223 @@
+"""
+HTTP Cassette Module
+تسجيل وإعادة تشغيل طلبات الزاحف (record / replay) لتشغيل استخراج الشركات كاملاً
+بدون شبكة وبنتائج ثابتة (CI، قياس الأداء، اختبارات الحمل)
+
+الأوضاع (HTTP_CASSETTE):
+- live:   الشبكة مباشرة (الافتراضي)
+- record: طلب حقيقي ثم حفظ الرد في ملف cassette
+- replay: الرد من القرص فقط؛ أي طلب غير مسجل يفشل بـ CassetteMiss
+
+كل تفاعل ملف JSON في <HTTP_CASSETTE_DIR>/<host>/<sha256>.json، المفتاح من
+(method, url, KEY_HEADERS). ما لا يمر عبر جلسة requests (عرض JavaScript،
+advertools) يُسجل عبر CASSETTE.wrap بنوع خاص به.
+"""
+
+import io
+import os
+import json
+import time
+import base64
+import hashlib
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.response import HTTPResponse
+
+
+CASSETTE_MODE = os.getenv("HTTP_CASSETTE", "live").strip().lower()
+CASSETTE_DIR = os.getenv("HTTP_CASSETTE_DIR", "data/cassettes")
+# تأخير محاكى في replay: "" / "0" بدون، "recorded" زمن الرد المسجل، أو عدد ثوانٍ ثابت
+REPLAY_LATENCY = os.getenv("HTTP_CASSETTE_LATENCY", "").strip().lower()
+
+MODES = {"live", "record", "replay"}
+# رؤوس تغير الرد فتدخل في المفتاح (User-Agent ثابت للجلسة، والباقي يضيفه requests)
+KEY_HEADERS = ("Accept", "Accept-Language", "If-None-Match", "If-Modified-Since", "Range")
+# الجسم يُحفظ بعد فك الضغط، فلا تُعاد رؤوس الترميز كما هي
+DROP_HEADERS = {"content-encoding", "transfer-encoding", "content-length", "connection"}
+TEXT_TYPES = ("text/", "xml", "json", "javascript")
+
+
+class CassetteMiss(requests.ConnectionError):
+    """طلب غير مسجل في وضع replay"""
+
+
+class Cassette:
+    """
+    مخزن التفاعلات المسجلة على القرص
+
+    Entry: {"kind", "method", "url", "headers", "status", "reason",
+            "response_headers", "body" | "body_b64", "elapsed", "recorded_at"}
+    """
+
+    def __init__(self, cassette_dir: str = CASSETTE_DIR, mode: str = CASSETTE_MODE,
+                 latency: str = REPLAY_LATENCY):
+        if mode not in MODES:
+            raise ValueError(f"HTTP_CASSETTE must be one of {sorted(MODES)}, got {mode!r}")
+        self.cassette_dir = cassette_dir
+        self.mode = mode
+        self.latency = latency
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+
+    @property
+    def active(self) -> bool:
+        return self.mode != "live"
+
+    # ---------- storage ----------
+    @staticmethod
+    def key(kind: str, method: str, url: str, headers: dict = None) -> str:
+        headers = headers or {}
+        parts = [kind, method.upper(), url] + [f"{h}:{headers.get(h, '')}" for h in KEY_HEADERS]
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, url: str, key: str) -> str:
+        host = urlparse(url).netloc.lower().replace(":", "_") or "_"
+        return os.path.join(self.cassette_dir, host, key + ".json")
+
+    def load(self, url: str, key: str):
+        try:
+            with open(self._path(url, key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.count("misses")
+            return None
+        self.count("hits")
+        self._simulate_latency(entry)
+        return entry
+
+    def save(self, url: str, key: str, entry: dict):
+        path = self._path(url, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**entry, "url": url, "recorded_at": time.time()}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+        self.count("recorded")
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def reset_stats(self) -> dict:
+        with self._lock:
+            stats, self.stats = self.stats, {k: 0 for k in self.stats}
+        return stats
+
+    def _simulate_latency(self, entry: dict):
+        if not self.latency or self.latency == "0":
+            return
+        if self.latency == "recorded":
+            delay = entry.get("elapsed") or 0.0
+        else:
+            try:
+                delay = float(self.latency)
+            except ValueError:
+                return
+        if delay > 0:
+            time.sleep(delay)
+
+    # ---------- non-HTTP calls ----------
+    def wrap(self, kind: str, url: str, fn):
+        """
+        تسجيل/إعادة نتيجة نصية لعملية لا تمر عبر الجلسة (مثل عرض JavaScript)
+
+        Args:
+            kind: نوع العملية (جزء من المفتاح)، مثل "render" أو "sitemap_df"
+            url: الرابط
+            fn: دالة بدون معاملات تُرجع str (تُستدعى في live و record فقط)
+        """
+        if not self.active:
+            return fn()
+        key = self.key(kind, "GET", url)
+        if self.mode == "replay":
+            entry = self.load(url, key)
+            if entry is None:
+                raise CassetteMiss(f"No {kind} cassette for {url}")
+            return entry["body"]
+
+        t = time.perf_counter()
+        body = fn()
+        self.save(url, key, {"kind": kind, "method": "GET", "body": body,
+                             "elapsed": time.perf_counter() - t})
+        return body
+
+
+# ============================================
+# Transport
+# ============================================
+def _encode_body(content: bytes, content_type: str) -> dict:
+    if any(t in content_type.lower() for t in TEXT_TYPES):
+        try:
+            return {"body": content.decode("utf-8")}
+        except UnicodeDecodeError:
+            pass
+    return {"body_b64": base64.b64encode(content).decode("ascii")}
+
+
+def _decode_body(entry: dict) -> bytes:
+    if "body_b64" in entry:
+        return base64.b64decode(entry["body_b64"])
+    return (entry.get("body") or "").encode("utf-8")
+
+
+class CassetteAdapter(HTTPAdapter):
+    """
+    HTTPAdapter يمرر الطلبات للشبكة أو للـ cassette حسب الوضع
+
+    الرد المعاد مبني من الجسم المحفوظ، فيعمل مع الاستهلاك المتدفق (stream=True
+    و r.raw في iter_sitemap) كما يعمل مع r.content / r.text.
+    """
+
+    def __init__(self, cassette: Cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        key = self.cassette.key("http", request.method, request.url, request.headers)
+
+        if self.cassette.mode == "replay":
+            entry = self.cassette.load(request.url, key)
+            if entry is None:
+                raise CassetteMiss(f"No cassette for {request.method} {request.url}", request=request)
+            return self._replay(request, entry)
+
+        t = time.perf_counter()
+        live = super().send(request, **kwargs)
+        content = live.content  # يقرأ الجسم كاملاً (مفكوك الضغط) قبل الحفظ
+        elapsed = time.perf_counter() - t
+        live.close()
+
+        headers = {k: v for k, v in live.headers.items() if k.lower() not in DROP_HEADERS}
+        entry = {
+            "kind": "http",
+            "method": request.method,
+            "headers": {h: request.headers[h] for h in KEY_HEADERS if h in request.headers},
+            "status": live.status_code,
+            "reason": live.reason,
+            "response_headers": headers,
+            "elapsed": elapsed,
+            **_encode_body(content, headers.get("Content-Type", "")),
+        }
+        if self.cassette.mode == "record":
+            self.cassette.save(request.url, key, entry)
+        return self._replay(request, entry)
+
+    def _replay(self, request, entry: dict) -> requests.Response:
+        body = _decode_body(entry)
+        headers = {**entry.get("response_headers", {}), "Content-Length": str(len(body))}
+        raw = HTTPResponse(
+            body=io.BytesIO(body),
+            headers=headers,
+            status=entry["status"],
+            reason=entry.get("reason"),
+            preload_content=False,
+            decode_content=False,
+        )
+        return self.build_response(request, raw)
+
+
+# cassette واحد لكل العملية (يُفعّل عبر HTTP_CASSETTE)
+CASSETTE = Cassette()
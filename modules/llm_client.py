@@ -0,0 +1,326 @@
+"""
+LLM Client Module
+طبقة موحّدة لاستدعاء النماذج اللغوية (OpenAI و LangChain) مع تسجيل الاستهلاك
+والمهل الزمنية (deadlines) والطلبات المكررة (hedging) لتقليل زمن الذيل،
+وكل طلب يمر عبر جدولة الأولويات في llm_scheduler
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from openai import OpenAI
+
+from modules.llm_metrics import METER, LATENCY_WINDOW, current_tags, usage_from_openai, usage_from_langchain
+from modules.prompt_budget import ensure_within_budget
+from modules.llm_scheduler import SCHEDULER, SchedulerTimeout
+
+
+# ---- Hedging config ----
+HEDGE_ENABLED = os.getenv("LLM_HEDGE", "1").strip().lower() in {"1", "true", "yes", "on"}
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 5        # لا تكرار قبل توفر عينات كافية لحساب p95
+HEDGE_WINDOW = LATENCY_WINDOW  # آخر N زمن استجابة لكل مرحلة (نافذة METER)
+HEDGE_MAX_FRACTION = float(os.getenv("LLM_HEDGE_MAX_FRACTION", "0.1"))  # سقف الإنفاق الإضافي
+HEDGE_MAX_BUSY_FRACTION = 0.5  # لا تكرار إذا كان نصف عمال _executor مشغولاً
+
+# تقدير توكنز المخرجات لدلو الجدولة إذا لم يُحدد max_tokens
+DEFAULT_COMPLETION_ESTIMATE = 500
+
+EXECUTOR_WORKERS = 32
+_executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix="llm-call")
+_hedge_lock = threading.Lock()
+_hedge_counts = {}  # stage -> {"calls": n, "hedges": n}
+_busy = 0  # محاولات قيد التنفيذ أو الانتظار في _executor
+
+# المهلة المطلقة (epoch seconds) للسياق الحالي
+_current_deadline = ContextVar("llm_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """انتهت المهلة المخصصة قبل وصول رد النموذج"""
+
+
+class CallAbandoned(RuntimeError):
+    """محاولة خاسرة (سبقها رد آخر أو انتهت المهلة) لم تُرسل بعد فأُلغيت"""
+
+
+# ============================================
+# Deadlines
+# ============================================
+@contextmanager
+def deadline_scope(seconds: float = None, deadline: float = None):
+    """
+    تحديد مهلة لكل الاستدعاءات داخل هذا السياق (تُحترم المهلة الأقرب إن وُجدت مهلة خارجية)
+
+    Example:
+        with deadline_scope(120):
+            generate_proposal(...)
+    """
+    if deadline is None and seconds is not None:
+        deadline = time.time() + seconds
+    outer = _current_deadline.get()
+    if outer is not None and (deadline is None or outer < deadline):
+        deadline = outer
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def current_deadline():
+    return _current_deadline.get()
+
+
+def remaining_time(deadline: float = None):
+    """الثواني المتبقية حتى المهلة (None = بدون مهلة)"""
+    deadline = deadline if deadline is not None else _current_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.time()
+
+
+# ============================================
+# Hedging
+# ============================================
+def _latency_percentile(stage: str, percentile: float = HEDGE_PERCENTILE):
+    samples = METER.latencies(stage)[-HEDGE_WINDOW:]
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    samples = sorted(samples)
+    return samples[int(percentile * (len(samples) - 1))]
+
+
+def _count_call(stage: str):
+    with _hedge_lock:
+        counts = _hedge_counts.setdefault(stage, {"calls": 0, "hedges": 0})
+        counts["calls"] += 1
+
+
+def _try_reserve_hedge(stage: str) -> bool:
+    """السماح بطلب مكرر فقط ضمن سقف نسبة HEDGE_MAX_FRACTION من الاستدعاءات"""
+    with _hedge_lock:
+        counts = _hedge_counts.setdefault(stage, {"calls": 0, "hedges": 0})
+        if counts["hedges"] + 1 > HEDGE_MAX_FRACTION * counts["calls"]:
+            return False
+        counts["hedges"] += 1
+        return True
+
+
+def _executor_saturated() -> bool:
+    """طلب مكرر لن يجد عاملاً أو مقعداً فوراً: يؤخر الطلبات الجديدة بدل أن يسرّع هذا الطلب"""
+    with _hedge_lock:
+        busy = _busy
+    return busy >= HEDGE_MAX_BUSY_FRACTION * EXECUTOR_WORKERS or SCHEDULER.queue_length() > 0
+
+
+def _tracked(attempt, hedged: bool, cancelled: threading.Event):
+    global _busy
+    try:
+        return attempt(hedged, cancelled)
+    finally:
+        with _hedge_lock:
+            _busy -= 1
+
+
+def _submit(attempt, hedged: bool, cancelled: threading.Event):
+    global _busy
+    with _hedge_lock:
+        _busy += 1
+    try:
+        return _executor.submit(_tracked, attempt, hedged, cancelled)
+    except BaseException:
+        with _hedge_lock:
+            _busy -= 1
+        raise
+
+
+def _run_with_deadline(stage: str, attempt, deadline: float = None, hedge: bool = True):
+    """
+    تنفيذ attempt(hedged, cancelled) مع احترام المهلة، وإطلاق نسخة مكررة إذا تجاوز
+    الطلب زمن p95 للمرحلة — أول رد ناجح يفوز
+
+    عند الانتهاء (رد أو مهلة) تُلغى المحاولات الخاسرة التي لم تبدأ، وما زال ينتظر
+    مقعداً في الجدولة يخرج بدون إرسال (cancelled). الطلب المرسل فعلاً لا يمكن قطعه
+    عبر عميل OpenAI المشترك فيكتمل بمهلة العميل. لا تكرار عند تشبع _executor.
+    """
+    _count_call(stage)
+    hedge_after = _latency_percentile(stage) if (hedge and HEDGE_ENABLED) else None
+
+    if deadline is None and hedge_after is None:
+        return attempt(False, None)
+
+    cancelled = threading.Event()
+    futures = {_submit(attempt, False, cancelled)}
+    hedged = False
+    last_error = None
+
+    try:
+        while futures:
+            remaining = remaining_time(deadline)
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded(f"{stage}: deadline exceeded")
+
+            timeout = remaining
+            if not hedged and hedge_after is not None:
+                timeout = hedge_after if timeout is None else min(timeout, hedge_after)
+
+            done, futures = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for fut in done:
+                try:
+                    return fut.result()
+                except Exception as e:
+                    last_error = e
+
+            if not done and not hedged and hedge_after is not None:
+                hedged = True
+                if _executor_saturated():
+                    print(f"⏱️ {stage}: no reply after p95 ({hedge_after:.1f}s), executor busy — not hedging")
+                elif _try_reserve_hedge(stage):
+                    print(f"⏱️ {stage}: no reply after p95 ({hedge_after:.1f}s), firing hedged request")
+                    futures.add(_submit(attempt, True, cancelled))
+
+        raise last_error
+    finally:
+        cancelled.set()
+        for fut in futures:
+            fut.cancel()
+
+
+# ============================================
+# Calls
+# ============================================
+def _make_client(api_key=None):
+    return OpenAI(api_key=api_key) if api_key else OpenAI()
+
+
+@contextmanager
+def _scheduled(stage: str, priority: int, tokens: int, deadline: float = None,
+               cancelled: threading.Event = None):
+    """
+    مقعد في جدولة الأولويات؛ يحوّل انتهاء المهلة في الطابور إلى DeadlineExceeded
+
+    محاولة أُلغيت أثناء انتظارها المقعد ترفع CallAbandoned بدون إرسال وتُعاد توكنزها
+    """
+    if cancelled is not None and cancelled.is_set():
+        raise CallAbandoned(f"{stage}: superseded before scheduling")
+    try:
+        with SCHEDULER.slot(priority, tokens=tokens, deadline=deadline) as queued:
+            if cancelled is not None and cancelled.is_set():
+                SCHEDULER.buckets[priority].refund(tokens)
+                raise CallAbandoned(f"{stage}: superseded while queued")
+            yield round(queued, 4)
+    except SchedulerTimeout as e:
+        raise DeadlineExceeded(f"{stage}: {e}") from e
+
+
+def chat_completion(
+    stage: str,
+    client=None,
+    api_key=None,
+    retry: int = 0,
+    tags: dict = None,
+    deadline: float = None,
+    hedge: bool = True,
+    **kwargs
+):
+    """
+    استدعاء client.chat.completions.create مع تسجيل التوكنز والزمن
+
+    Args:
+        stage: اسم المرحلة (مثل "gap_analysis" أو "rfp_summary")
+        client: عميل OpenAI جاهز (اختياري)
+        api_key: مفتاح OpenAI API (اختياري، يُستخدم إذا لم يُمرَّر client)
+        retry: رقم المحاولة (0 = المحاولة الأولى)
+        tags: وسوم إضافية لهذا الاستدعاء (مثل document)
+        deadline: مهلة مطلقة (epoch seconds)؛ الافتراضي مهلة deadline_scope الحالية
+        hedge: السماح بطلب مكرر عند تجاوز p95 للمرحلة
+        **kwargs: بارامترات chat.completions.create
+
+    Returns:
+        ChatCompletion: الرد كما هو من OpenAI
+
+    Raises:
+        PromptBudgetExceeded: إذا كان البرومبت أكبر من نافذة السياق
+        DeadlineExceeded: إذا انتهت المهلة قبل وصول الرد
+    """
+    model = kwargs.get("model", "")
+    # فحص الميزانية محلياً قبل رحلة الشبكة (يرفع PromptBudgetExceeded)
+    prompt_tokens = ensure_within_budget(kwargs.get("messages", []), model, kwargs.get("max_tokens"))
+    estimated_tokens = prompt_tokens + (kwargs.get("max_tokens") or DEFAULT_COMPLETION_ESTIMATE)
+
+    client = client or _make_client(api_key)
+    deadline = deadline if deadline is not None else current_deadline()
+    call_tags = {**current_tags(), **(tags or {})}  # contextvars لا تنتقل لـ threads
+    priority = SCHEDULER.priority_for(stage)
+
+    def attempt(hedged: bool, cancelled: threading.Event = None):
+        with _scheduled(stage, priority, estimated_tokens, deadline, cancelled) as queued:
+            remaining = remaining_time(deadline)
+            api = client.with_options(timeout=max(1.0, remaining)) if remaining and hasattr(client, "with_options") else client
+            started = time.perf_counter()
+            try:
+                response = api.chat.completions.create(**kwargs)
+            except Exception as e:
+                METER.record(stage, model=model, latency=time.perf_counter() - started,
+                             retry=retry, error=type(e).__name__, hedged=hedged or None,
+                             queued=queued, **call_tags)
+                raise
+
+        METER.record(stage, model=getattr(response, "model", None) or model,
+                     latency=time.perf_counter() - started, retry=retry, hedged=hedged or None,
+                     queued=queued, **usage_from_openai(response), **call_tags)
+        return response
+
+    return _run_with_deadline(stage, attempt, deadline=deadline, hedge=hedge)
+
+
+def invoke_chat_model(
+    stage: str,
+    model,
+    messages,
+    retry: int = 0,
+    tags: dict = None,
+    model_name: str = None,
+    deadline: float = None,
+    hedge: bool = True
+):
+    """
+    استدعاء model.invoke لنموذج LangChain (ChatOpenAI) مع تسجيل التوكنز والزمن
+
+    إذا كان النموذج مهيأً بـ with_structured_output(..., include_raw=True)
+    تُقرأ الـ usage من الرسالة الخام.
+    """
+    model_name = model_name or getattr(model, "model_name", None) or ""
+    max_tokens = getattr(model, "max_tokens", None)
+    prompt_tokens = ensure_within_budget(messages, model_name or "gpt-4o-mini", max_tokens)
+    estimated_tokens = prompt_tokens + (max_tokens or DEFAULT_COMPLETION_ESTIMATE)
+
+    deadline = deadline if deadline is not None else current_deadline()
+    call_tags = {**current_tags(), **(tags or {})}  # contextvars لا تنتقل لـ threads
+    priority = SCHEDULER.priority_for(stage)
+
+    def attempt(hedged: bool, cancelled: threading.Event = None):
+        with _scheduled(stage, priority, estimated_tokens, deadline, cancelled) as queued:
+            remaining = remaining_time(deadline)
+            extra = {"timeout": max(1.0, remaining)} if remaining and hasattr(model, "model_name") else {}
+            started = time.perf_counter()
+            try:
+                response = model.invoke(messages, **extra)
+            except Exception as e:
+                METER.record(stage, model=model_name, latency=time.perf_counter() - started,
+                             retry=retry, error=type(e).__name__, hedged=hedged or None,
+                             queued=queued, **call_tags)
+                raise
+
+        raw = response.get("raw") if isinstance(response, dict) else response
+        METER.record(stage, model=model_name, latency=time.perf_counter() - started,
+                     retry=retry, hedged=hedged or None, queued=queued,
+                     **usage_from_langchain(raw), **call_tags)
+        return response
+
+    return _run_with_deadline(stage, attempt, deadline=deadline, hedge=hedge)
@@ -0,0 +1,229 @@
+"""
+LLM Metrics Module
+عدّاد استهلاك التوكنز والتكلفة وزمن الاستجابة لكل استدعاءات النماذج اللغوية
+"""
+
+import os
+import json
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+
+# سعر كل مليون توكن بالدولار (input, cached input, output)
+MODEL_PRICING = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "text-embedding-3-small": (0.02, 0.02, 0.0),
+}
+
+DEFAULT_REPORT_FILE = "data/outputs/llm_usage_report.json"
+
+# العدّاد يعيش طوال عمر خادم Streamlit: سجل الاستدعاءات حلقي (الأقدم يُسقط)،
+# وأزمنة الاستجابة لكل مرحلة نافذة منفصلة بآخر LATENCY_WINDOW استدعاء ناجح
+METER_MAX_RECORDS = int(os.getenv("LLM_METER_MAX_RECORDS", "20000"))
+LATENCY_WINDOW = 200
+
+# وسوم السياق الحالي (الجلسة / المستند) — تنتقل تلقائياً مع contextvars
+_current_tags = ContextVar("llm_metric_tags", default={})
+
+
+@contextmanager
+def metering_context(**tags):
+    """
+    إضافة وسوم (مثل session و document) لكل استدعاء داخل هذا السياق
+
+    Example:
+        with metering_context(session="abc", document="rfp.pdf"):
+            analyze_gaps(...)
+    """
+    merged = {**_current_tags.get(), **{k: v for k, v in tags.items() if v is not None}}
+    token = _current_tags.set(merged)
+    try:
+        yield merged
+    finally:
+        _current_tags.reset(token)
+
+
+def current_tags() -> dict:
+    return dict(_current_tags.get())
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """تقدير التكلفة بالدولار حسب جدول الأسعار"""
+    key = next((k for k in sorted(MODEL_PRICING, key=len, reverse=True) if (model or "").startswith(k)), None)
+    if key is None:
+        return 0.0
+    price_in, price_cached, price_out = MODEL_PRICING[key]
+    fresh = max(0, prompt_tokens - cached_tokens)
+    return (fresh * price_in + cached_tokens * price_cached + completion_tokens * price_out) / 1_000_000
+
+
+def usage_from_openai(response) -> dict:
+    """قراءة usage من رد openai.chat.completions"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", 0) or 0) if details else 0,
+    }
+
+
+def usage_from_langchain(message) -> dict:
+    """قراءة usage من رسالة AIMessage الخاصة بـ langchain"""
+    meta = getattr(message, "usage_metadata", None) or {}
+    if meta:
+        details = meta.get("input_token_details") or {}
+        return {
+            "prompt_tokens": meta.get("input_tokens", 0) or 0,
+            "completion_tokens": meta.get("output_tokens", 0) or 0,
+            "cached_tokens": details.get("cache_read", 0) or 0,
+        }
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    return {
+        "prompt_tokens": token_usage.get("prompt_tokens", 0) or 0,
+        "completion_tokens": token_usage.get("completion_tokens", 0) or 0,
+        "cached_tokens": (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0,
+    }
+
+
+# ============================================
+# Meter
+# ============================================
+class LLMMeter:
+    """سجل متزامن (thread-safe) ومحدود الحجم لاستدعاءات النماذج في التشغيل الحالي"""
+
+    def __init__(self, max_records: int = METER_MAX_RECORDS, latency_window: int = LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self.started_at = datetime.now().isoformat()
+        self.records = deque(maxlen=max_records)
+        self.latency_window = latency_window
+        self._latencies = {}  # stage -> deque بآخر أزمنة الاستدعاءات الناجحة
+
+    def record(
+        self,
+        stage: str,
+        model: str = "",
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cached_tokens: int = 0,
+        latency: float = 0.0,
+        retry: int = 0,
+        cache_hit: bool = False,
+        error: str = None,
+        **tags
+    ) -> dict:
+        entry = {
+            "timestamp": datetime.now().isoformat(),
+            "stage": stage,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "latency": round(latency, 4),
+            "retry": retry,
+            "cache_hit": cache_hit,
+            "error": error,
+            "cost_usd": 0.0 if cache_hit else estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens),
+            **current_tags(),
+            **{k: v for k, v in tags.items() if v is not None},
+        }
+        with self._lock:
+            self.records.append(entry)
+            if not cache_hit and not error:
+                window = self._latencies.setdefault(stage, deque(maxlen=self.latency_window))
+                window.append(entry["latency"])
+        return entry
+
+    def record_cache_hit(self, stage: str, **tags) -> dict:
+        """تسجيل نتيجة خُدمت من الكاش بدون استدعاء النموذج"""
+        return self.record(stage, cache_hit=True, **tags)
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return list(self.records)
+
+    def latencies(self, stage: str) -> list:
+        """أزمنة آخر LATENCY_WINDOW استدعاء ناجح لمرحلة معينة (الأقدم أولاً)"""
+        with self._lock:
+            return list(self._latencies.get(stage, ()))
+
+    def summary(self, records: list = None) -> dict:
+        """تجميع حسب المرحلة: عدد الاستدعاءات، التوكنز، التكلفة، الزمن"""
+        records = self.snapshot() if records is None else records
+        stages = {}
+
+        for r in records:
+            s = stages.setdefault(r["stage"], {
+                "calls": 0, "retries": 0, "errors": 0, "cache_hits": 0,
+                "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+                "cost_usd": 0.0, "total_latency": 0.0, "max_latency": 0.0,
+            })
+            if r["cache_hit"]:
+                s["cache_hits"] += 1
+                continue
+            s["calls"] += 1
+            s["retries"] += 1 if r["retry"] else 0
+            s["errors"] += 1 if r["error"] else 0
+            s["prompt_tokens"] += r["prompt_tokens"]
+            s["completion_tokens"] += r["completion_tokens"]
+            s["cached_tokens"] += r["cached_tokens"]
+            s["cost_usd"] += r["cost_usd"]
+            s["total_latency"] += r["latency"]
+            s["max_latency"] = max(s["max_latency"], r["latency"])
+
+        for s in stages.values():
+            s["avg_latency"] = round(s["total_latency"] / s["calls"], 4) if s["calls"] else 0.0
+            s["total_latency"] = round(s["total_latency"], 4)
+            s["cost_usd"] = round(s["cost_usd"], 6)
+
+        totals = {
+            "calls": sum(s["calls"] for s in stages.values()),
+            "cache_hits": sum(s["cache_hits"] for s in stages.values()),
+            "prompt_tokens": sum(s["prompt_tokens"] for s in stages.values()),
+            "completion_tokens": sum(s["completion_tokens"] for s in stages.values()),
+            "cost_usd": round(sum(s["cost_usd"] for s in stages.values()), 6),
+            "total_latency": round(sum(s["total_latency"] for s in stages.values()), 4),
+        }
+        return {"totals": totals, "stages": stages}
+
+    def write_report(self, output_file: str = DEFAULT_REPORT_FILE, **filters) -> dict:
+        """
+        حفظ تقرير التشغيل بجانب ملفات data/outputs
+
+        Args:
+            output_file: مسار ملف التقرير
+            **filters: تصفية السجلات حسب الوسوم (مثل session="...")
+        """
+        records = [r for r in self.snapshot()
+                   if all(r.get(k) == v for k, v in filters.items())]
+        report = {
+            "started_at": self.started_at,
+            "generated_at": datetime.now().isoformat(),
+            "filters": filters,
+            "summary": self.summary(records),
+            "calls": records,
+        }
+        os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return report
+
+    def reset(self):
+        with self._lock:
+            self.records.clear()
+            self._latencies = {}
+            self.started_at = datetime.now().isoformat()
+
+
+# عدّاد واحد لكل العملية (process-wide)
+METER = LLMMeter()
+
+
+def get_meter() -> LLMMeter:
+    return METER
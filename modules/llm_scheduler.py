@@ -0,0 +1,257 @@
+"""
+LLM Scheduler Module
+جدولة طلبات النماذج اللغوية على مستوى العملية: أولوية للمحادثة التفاعلية على التوليد والمعالجة الخلفية
+
+Priority classes:
+    chat        محادثة المستخدم في page_chatbot (أعلى أولوية + مقاعد محجوزة)
+    generation  توليد تفاعلي (تحليل الفجوات، أقسام العرض، بروفايل الشركة)
+    batch       معالجة خلفية (تلخيص الأجزاء، main.py)
+
+Set LLM_SCHEDULER_STATE=/path/to/state.json to share the token buckets across
+processes (e.g. several Streamlit workers) through a file lock.
+"""
+
+import os
+import json
+import time
+import threading
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+PRIORITY_CHAT = 0
+PRIORITY_GENERATION = 1
+PRIORITY_BATCH = 2
+
+PRIORITY_NAMES = {PRIORITY_CHAT: "chat", PRIORITY_GENERATION: "generation", PRIORITY_BATCH: "batch"}
+
+# المرحلة → فئة الأولوية
+STAGE_PRIORITY = {
+    "chat": PRIORITY_CHAT,
+    "proposal_section": PRIORITY_GENERATION,
+    "gap_analysis": PRIORITY_GENERATION,
+    "gap_questions": PRIORITY_GENERATION,
+    "company_profile": PRIORITY_GENERATION,
+    "rfp_criteria": PRIORITY_GENERATION,
+    "rfp_summary": PRIORITY_BATCH,
+}
+
+# ميزانية التوكنز في الدقيقة لكل فئة
+CLASS_TOKENS_PER_MINUTE = {
+    PRIORITY_CHAT: int(os.getenv("LLM_TPM_CHAT", "200000")),
+    PRIORITY_GENERATION: int(os.getenv("LLM_TPM_GENERATION", "1000000")),
+    PRIORITY_BATCH: int(os.getenv("LLM_TPM_BATCH", "300000")),
+}
+
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+CHAT_RESERVED_SLOTS = int(os.getenv("LLM_CHAT_RESERVED_SLOTS", "2"))
+SHARED_STATE_FILE = os.getenv("LLM_SCHEDULER_STATE")
+
+_priority_override = ContextVar("llm_priority", default=None)
+
+
+class SchedulerTimeout(TimeoutError):
+    """لم يتوفر مقعد أو ميزانية توكنز قبل انتهاء المهلة"""
+
+
+# ============================================
+# Token Buckets
+# ============================================
+class TokenBucket:
+    """دلو توكنز داخل العملية: سعة = ميزانية دقيقة، ويُعاد ملؤه تدريجياً"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_take(self, amount: float) -> float:
+        """أخذ التوكنز إن توفرت؛ وإلا إرجاع ثواني الانتظار المطلوبة"""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+    def refund(self, amount: float):
+        """إعادة توكنز أُخذت لطلب لم يُرسل"""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class FileTokenBucket:
+    """نفس واجهة TokenBucket لكن الحالة في ملف مشترك بين العمليات (fcntl lock)"""
+
+    def __init__(self, name: str, tokens_per_minute: int, state_file: str):
+        self.name = name
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.state_file = state_file
+        os.makedirs(os.path.dirname(state_file) or ".", exist_ok=True)
+
+    def try_take(self, amount: float) -> float:
+        import fcntl
+
+        amount = min(amount, self.capacity)
+        with open(self.state_file, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                state = json.loads(raw) if raw.strip() else {}
+                entry = state.get(self.name) or {"tokens": self.capacity, "updated": time.time()}
+
+                now = time.time()
+                tokens = min(self.capacity, entry["tokens"] + (now - entry["updated"]) * self.rate)
+                wait_for = 0.0
+                if tokens >= amount:
+                    tokens -= amount
+                else:
+                    wait_for = (amount - tokens) / self.rate
+
+                state[self.name] = {"tokens": tokens, "updated": now}
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+                return wait_for
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def refund(self, amount: float):
+        """إعادة توكنز أُخذت لطلب لم يُرسل"""
+        import fcntl
+
+        amount = min(amount, self.capacity)
+        with open(self.state_file, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                state = json.loads(raw) if raw.strip() else {}
+                entry = state.get(self.name)
+                if entry is None:
+                    return  # دلو ممتلئ
+                entry["tokens"] = min(self.capacity, entry["tokens"] + amount)
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# ============================================
+# Scheduler
+# ============================================
+class LLMScheduler:
+    """بوابة أولويات للطلبات المتزامنة + دلو توكنز لكل فئة"""
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, chat_reserved=CHAT_RESERVED_SLOTS, state_file=SHARED_STATE_FILE):
+        self.max_concurrency = max_concurrency
+        self.chat_reserved = min(chat_reserved, max_concurrency - 1)
+        self.process_floor = PRIORITY_CHAT
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = []
+        self._seq = itertools.count()
+
+        if state_file:
+            self.buckets = {p: FileTokenBucket(PRIORITY_NAMES[p], tpm, state_file)
+                            for p, tpm in CLASS_TOKENS_PER_MINUTE.items()}
+        else:
+            self.buckets = {p: TokenBucket(tpm) for p, tpm in CLASS_TOKENS_PER_MINUTE.items()}
+
+    def priority_for(self, stage: str) -> int:
+        override = _priority_override.get()
+        if override is not None:
+            return override
+        return max(STAGE_PRIORITY.get(stage, PRIORITY_GENERATION), self.process_floor)
+
+    def _wait_for_tokens(self, priority: int, tokens: int, deadline: float = None):
+        bucket = self.buckets[priority]
+        while True:
+            wait_for = bucket.try_take(tokens)
+            if wait_for <= 0:
+                return
+            if deadline is not None and time.time() + wait_for > deadline:
+                raise SchedulerTimeout(f"{PRIORITY_NAMES[priority]} token budget exhausted")
+            time.sleep(min(wait_for, 0.5))
+
+    def _acquire_slot(self, priority: int, deadline: float = None):
+        limit = self.max_concurrency if priority == PRIORITY_CHAT else self.max_concurrency - self.chat_reserved
+        entry = (priority, next(self._seq))
+
+        with self._cond:
+            self._waiting.append(entry)
+            try:
+                while not (self._in_flight < limit and entry == min(self._waiting)):
+                    timeout = None if deadline is None else deadline - time.time()
+                    if timeout is not None and timeout <= 0:
+                        raise SchedulerTimeout(f"No {PRIORITY_NAMES[priority]} slot available")
+                    self._cond.wait(timeout=timeout)
+                self._in_flight += 1
+            finally:
+                self._waiting.remove(entry)
+                self._cond.notify_all()
+
+    def queue_length(self) -> int:
+        """طلبات تنتظر مقعداً الآن"""
+        with self._cond:
+            return len(self._waiting)
+
+    def _release_slot(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: int, tokens: int = 0, deadline: float = None):
+        """
+        حجز مقعد لطلب واحد
+
+        Args:
+            priority: فئة الأولوية (من priority_for في thread المستدعي)
+            tokens: تقدير توكنز الطلب (البرومبت + المخرجات)
+            deadline: مهلة مطلقة (epoch seconds)
+
+        Yields:
+            float: زمن الانتظار في الطابور بالثواني
+        """
+        started = time.perf_counter()
+        self._wait_for_tokens(priority, tokens, deadline)
+        try:
+            self._acquire_slot(priority, deadline)
+        except BaseException:
+            # الطلب لن يُرسل: التوكنز المحجوزة تعود لنفس الفئة
+            self.buckets[priority].refund(tokens)
+            raise
+        try:
+            yield time.perf_counter() - started
+        finally:
+            self._release_slot()
+
+
+# جدولة واحدة لكل العملية
+SCHEDULER = LLMScheduler()
+
+
+@contextmanager
+def priority_scope(priority: int):
+    """فرض فئة أولوية على كل الطلبات داخل هذا السياق"""
+    token = _priority_override.set(priority)
+    try:
+        yield
+    finally:
+        _priority_override.reset(token)
+
+
+def set_process_priority(priority: int):
+    """أدنى أولوية لكل طلبات العملية (مثلاً PRIORITY_BATCH في main.py)"""
+    SCHEDULER.process_floor = priority
@@ -0,0 +1,245 @@
+"""
+Logo OCR Module
+قراءة أسماء الشركاء من صور الشعارات (easyocr) مع:
+- قارئ واحد لكل العملية (تحميل النموذج مرة واحدة)
+- تنزيل الصور بالتوازي عبر الجلسة المشتركة
+- كاش على القرص بالبصمة الإدراكية للصورة (dHash) فلا يُقرأ الشعار نفسه مرتين
+- ميزانية زمنية لكل زحف
+"""
+
+import io
+import os
+import re
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+
+from modules.web_fetcher import fetch_bytes, get_session
+
+
+LOGO_CACHE_FILE = os.getenv("LOGO_OCR_CACHE", "data/cache/logo_ocr.json")
+OCR_BUDGET_SECONDS = float(os.getenv("LOGO_OCR_BUDGET", "20"))
+MAX_LOGOS = 30
+DOWNLOAD_WORKERS = 8
+HASH_MAX_DISTANCE = 1  # أقصى فرق بتات بين بصمتين لاعتبارهما نفس الشعار
+MIN_HASH_DETAIL = 8    # بصمة شعار مسطح/أبيض غالباً (بتات قليلة مختلفة): تطابق تام فقط
+ASPECT_TOLERANCE = 0.1  # فرق نسبة العرض/الارتفاع المسموح بين صورتين لنفس الشعار
+
+ARABIC = re.compile(r"[\u0600-\u06FF]")
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def get_reader():
+    """قارئ easyocr واحد (عربي + إنجليزي)، يُحمّل عند أول استخدام"""
+    global _reader
+    with _reader_lock:
+        if _reader is None:
+            import easyocr
+            print("🔤 Loading easyocr model (once per process)...")
+            _reader = easyocr.Reader(["ar", "en"], gpu=False)
+        return _reader
+
+
+def dhash(image, size: int = 8) -> str:
+    """بصمة dHash (64 بت) لصورة PIL — ثابتة مع تغيير الحجم والضغط"""
+    gray = image.convert("L").resize((size + 1, size))
+    pixels = list(gray.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{size * size // 4}x}"
+
+
+def _distance(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def _hash_detail(h: str) -> int:
+    """عدد البتات الأقل تكراراً؛ قليل = صورة مسطحة تتشابه بصمتها مع شعارات أخرى"""
+    ones = bin(int(h, 16)).count("1")
+    return min(ones, len(h) * 4 - ones)
+
+
+def _same_aspect(a, b) -> bool:
+    if not a or not b or not a[1] or not b[1]:
+        return False
+    ra, rb = a[0] / a[1], b[0] / b[1]
+    return abs(ra - rb) <= ASPECT_TOLERANCE * max(ra, rb)
+
+
+def _keep_text(s: str) -> bool:
+    return bool(ARABIC.search(s) or re.search(r"[A-Za-z]{3,}", s)) and 2 <= len(s) <= 80
+
+
+# ============================================
+# Cache
+# ============================================
+class LogoOcrCache:
+    """
+    {"hashes": {dhash: {"texts": [...], "size": [w, h]}}, "urls": {url: dhash}}
+
+    الروابط المعروفة لا تُنزّل مرة أخرى، والشعارات المتطابقة (حتى من روابط مختلفة)
+    لا تُقرأ مرة أخرى. التطابق التقريبي (HASH_MAX_DISTANCE) يشترط نفس نسبة الأبعاد
+    وبصمة فيها تفاصيل كافية، فلا يرث شعار مسطح نصوص شعار شركة أخرى.
+    المدخلات القديمة ([texts] بدون أبعاد) تُستخدم بالتطابق التام فقط.
+    """
+
+    def __init__(self, path: str = LOGO_CACHE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                self._data = {}
+            self._data.setdefault("hashes", {})
+            self._data.setdefault("urls", {})
+        return self._data
+
+    def texts_for_url(self, url: str):
+        with self._lock:
+            data = self._load()
+            h = data["urls"].get(url)
+            entry = data["hashes"].get(h) if h else None
+            return _texts(entry)
+
+    def lookup(self, h: str, size=None):
+        """
+        Args:
+            h: dHash الصورة
+            size: (العرض، الارتفاع)
+        """
+        with self._lock:
+            hashes = self._load()["hashes"]
+            entry = hashes.get(h)
+            if entry is not None and (isinstance(entry, list) or _same_aspect(size, entry.get("size"))):
+                return _texts(entry)
+            if _hash_detail(h) < MIN_HASH_DETAIL:
+                return None
+            for known, entry in hashes.items():
+                if (isinstance(entry, dict) and _distance(h, known) <= HASH_MAX_DISTANCE
+                        and _same_aspect(size, entry.get("size"))):
+                    return entry["texts"]
+            return None
+
+    def put(self, url: str, h: str, texts: list = None, size=None):
+        with self._lock:
+            data = self._load()
+            data["urls"][url] = h
+            if texts is not None:
+                data["hashes"][h] = {"texts": texts, "size": list(size) if size else None}
+
+    def save(self):
+        with self._lock:
+            if self._data is None:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+
+
+def _texts(entry):
+    return entry if entry is None or isinstance(entry, list) else entry["texts"]
+
+
+LOGO_CACHE = LogoOcrCache()
+
+
+# ============================================
+# OCR
+# ============================================
+def ocr_logo_texts(urls: list, budget_seconds: float = OCR_BUDGET_SECONDS, max_logos: int = MAX_LOGOS) -> list:
+    """
+    أسماء مقروءة من صور الشعارات ضمن ميزانية زمنية
+
+    Args:
+        urls: روابط صور الشعارات (تُزال المكررة)
+        budget_seconds: أقصى زمن للتنزيل + القراءة في هذا الزحف
+        max_logos: أقصى عدد شعارات جديدة تُعالج
+
+    Returns:
+        list: النصوص المقروءة بترتيب الروابط
+    """
+    started = time.monotonic()
+    deadline = started + budget_seconds
+    urls = list(dict.fromkeys(u for u in urls if u))
+    results = {}
+
+    # 1) روابط سبق قراءتها: بدون تنزيل
+    todo = []
+    for u in urls:
+        texts = LOGO_CACHE.texts_for_url(u)
+        if texts is not None:
+            results[u] = texts
+        else:
+            todo.append(u)
+    todo = todo[:max_logos]
+    cached_urls = len(results)
+
+    # 2) تنزيل الباقي بالتوازي
+    images = {}
+    if todo:
+        from PIL import Image
+
+        session = get_session()
+        pool = ThreadPoolExecutor(max_workers=min(DOWNLOAD_WORKERS, len(todo)), thread_name_prefix="logo")
+        futures = {pool.submit(fetch_bytes, u, session, 10): u for u in todo}
+        try:
+            for fut in as_completed(futures, timeout=max(0.0, deadline - time.monotonic())):
+                u = futures[fut]
+                try:
+                    images[u] = Image.open(io.BytesIO(fut.result())).convert("RGB")
+                except Exception:
+                    continue  # svg / صورة تالفة
+        except FuturesTimeout:
+            print("⏱️ Logo OCR: download budget exhausted")
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    # 3) بصمة كل صورة: الشعارات المعروفة من الكاش، والجديدة بالـ OCR ضمن الميزانية
+    ocr_count, hash_hits = 0, 0
+    for u in todo:
+        im = images.get(u)
+        if im is None:
+            continue
+        h = dhash(im)
+        texts = LOGO_CACHE.lookup(h, im.size)
+        if texts is not None:
+            hash_hits += 1
+            LOGO_CACHE.put(u, h, texts, im.size)
+            results[u] = texts
+            continue
+        if time.monotonic() >= deadline:
+            continue
+        try:
+            import numpy as np
+            raw = get_reader().readtext(np.array(im), detail=0, paragraph=True)
+        except Exception as e:
+            print(f"⚠️ Logo OCR failed: {e}")
+            break
+        texts = [s.strip() for s in raw if _keep_text(s.strip())]
+        LOGO_CACHE.put(u, h, texts, im.size)
+        results[u] = texts
+        ocr_count += 1
+
+    LOGO_CACHE.save()
+    print(f"🔤 Logo OCR: {cached_urls} known URLs, {hash_hits} known logos, {ocr_count} new OCR "
+          f"in {time.monotonic() - started:.1f}s")
+
+    out = []
+    for u in urls:
+        for t in results.get(u, []):
+            if t not in out:
+                out.append(t)
+    return out
@@ -0,0 +1,169 @@
+"""
+Page Dedup Module
+إزالة الصفحات المكررة في زحف موقع الشركة
+
+- قبل الجلب: توحيد الروابط (canonical) وتخطي صفحات الأرشيف في ووردبريس
+  (ترقيم الصفحات، الكتّاب، التصنيفات، الوسوم، ?lang=، utm_*)
+- بعد الجلب: بصمة المحتوى (hash) للنسخ المتطابقة و simhash للصفحات شبه المتطابقة،
+  قبل التحليل وقبل أن تتضخم النصوص المرسلة للنموذج
+"""
+
+import re
+import hashlib
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+
+# معاملات لا تغير محتوى الصفحة
+DROP_PARAMS = {"lang", "fbclid", "gclid", "ref", "replytocom", "amp"}
+DROP_PARAM_PREFIXES = ("utm_",)
+
+# صفحات أرشيف تكرر محتوى صفحات أخرى
+ARCHIVE_PATH_RE = re.compile(
+    r"/(?:page/\d+|author/[^/]+|category/.+|tag/.+|feed|comments/feed|wp-json/.*|attachment/.*)/?$",
+    re.I
+)
+ARCHIVE_PARAMS = {"paged", "author", "cat", "tag", "s", "attachment_id"}
+
+# sitemaps لا تحتوي صفحات الشركة (الكتّاب / التصنيفات)
+SKIP_SITEMAP_RE = re.compile(r"(?:wp-sitemap-(?:users|taxonomies)|author-sitemap|category-sitemap|post_tag-sitemap)", re.I)
+
+SIMHASH_BITS = 64
+NEAR_DUPLICATE_DISTANCE = 3   # أقصى فرق بتات (simhash) للمرشحين
+NEAR_DUPLICATE_MAX_DIFF = 12  # أقصى عدد shingles مختلفة فعلياً (تاريخ، عداد زيارات...)
+
+_SCRIPT_RE = re.compile(r"<(script|style|noscript)\b.*?</\1\s*>", re.I | re.S)
+_TAG_RE = re.compile(r"<[^>]+>")
+_WORD_RE = re.compile(r"\w+", re.U)
+_HREF_RE = re.compile(r"""href\s*=\s*["']([^"']+)""", re.I)
+
+
+# ============================================
+# Before fetch
+# ============================================
+def canonical_url(url: str) -> str:
+    """
+    مفتاح موحد للرابط: نطاق بحروف صغيرة بدون www، بدون fragment أو شرطة نهائية،
+    وبدون معاملات التتبع واللغة (ترتيب المعاملات الباقية ثابت)
+
+    https://WWW.Site.sa/about/?utm_source=x&lang=ar#team → https://site.sa/about
+    """
+    parts = urlsplit((url or "").strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = re.sub(r"/{2,}", "/", parts.path).rstrip("/")
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in DROP_PARAMS and not k.lower().startswith(DROP_PARAM_PREFIXES)
+    )
+    return urlunsplit(((parts.scheme or "https").lower(), host, path, urlencode(query), ""))
+
+
+def is_archive_url(url: str) -> bool:
+    """ترقيم الصفحات / الكتّاب / التصنيفات / الوسوم / الخلاصات"""
+    parts = urlsplit(url)
+    if ARCHIVE_PATH_RE.search(parts.path):
+        return True
+    return any(k.lower() in ARCHIVE_PARAMS for k, _ in parse_qsl(parts.query))
+
+
+def is_skipped_sitemap(url: str) -> bool:
+    return bool(SKIP_SITEMAP_RE.search(url))
+
+
+def dedupe_urls(urls) -> tuple:
+    """
+    إزالة الروابط المكررة (بعد التوحيد) وروابط الأرشيف مع الحفاظ على الترتيب
+
+    Returns:
+        tuple: (الروابط الباقية بصيغتها الأصلية, عدد الروابط المحذوفة)
+    """
+    kept, seen, dropped = [], set(), 0
+    for u in urls:
+        key = canonical_url(u)
+        if key in seen or is_archive_url(u):
+            dropped += 1
+            continue
+        seen.add(key)
+        kept.append(u)
+    return kept, dropped
+
+
+# ============================================
+# After fetch
+# ============================================
+def page_text_fingerprint(html: str) -> str:
+    """
+    نص الصفحة بدون tags/scripts مع روابطها (tel:/mailto:/...) — تقريبي وسريع، بدون تحليل DOM
+
+    الروابط جزء من البصمة لأن صفحات مثل "تواصل معنا" قد تختلف عن غيرها بروابطها فقط.
+    """
+    html = html or ""
+    text = _TAG_RE.sub(" ", _SCRIPT_RE.sub(" ", html))
+    links = " ".join(_HREF_RE.findall(html))
+    return " ".join(_WORD_RE.findall((text + " " + links).lower()))
+
+
+def shingles(text: str) -> set:
+    """ثلاثيات الكلمات"""
+    words = text.split()
+    return {" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+
+
+def simhash(features, bits: int = SIMHASH_BITS) -> int:
+    """simhash لمجموعة shingles (أو لنص يُقسم إلى shingles)"""
+    if isinstance(features, str):
+        features = shingles(features)
+    hashes = [
+        format(int.from_bytes(hashlib.blake2b(sh.encode("utf-8"), digest_size=bits // 8).digest(), "big"), f"0{bits}b")
+        for sh in features
+    ]
+    # بت = 1 إذا كان أغلب الـ shingles يحمل 1 في نفس الموضع (الأعمدة من اليسار = البت الأعلى)
+    half = len(hashes) / 2
+    return int("".join("1" if col.count("1") > half else "0" for col in zip(*hashes)) or "0", 2)
+
+
+def _distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class PageDeduper:
+    """
+    يتذكر صفحات الزحف الحالي؛ check() يرجع رابط الصفحة المطابقة إن وُجدت
+
+    الصفحات تصل بترتيب الجلب (من عدة threads)، لذلك الوصول محمي بقفل.
+    """
+
+    def __init__(self, max_distance: int = NEAR_DUPLICATE_DISTANCE, max_diff: int = NEAR_DUPLICATE_MAX_DIFF):
+        self.max_distance = max_distance
+        self.max_diff = max_diff
+        self._exact = {}   # content hash -> url
+        self._near = []    # (simhash, shingles, url)
+        self._lock = threading.Lock()
+
+    def check(self, url: str, html: str, digest: str = None):
+        """
+        Args:
+            digest: بصمة المحتوى إن كانت محسوبة مسبقاً
+
+        Returns:
+            tuple: (الرابط المطابق أو None, "exact" | "near" | None)
+        """
+        digest = digest or hashlib.sha256((html or "").encode("utf-8")).hexdigest()
+        with self._lock:
+            if digest in self._exact:
+                return self._exact[digest], "exact"
+        feats = shingles(page_text_fingerprint(html))
+        fp = simhash(feats)
+        with self._lock:
+            if digest in self._exact:
+                return self._exact[digest], "exact"
+            for other, other_feats, other_url in self._near:
+                # simhash فلتر سريع، والتأكيد بعدد الـ shingles المختلفة فعلياً: صفحتان تتشاركان
+                # قائمة وفوتر كبيرين قد تتقاربان في simhash رغم اختلاف محتواهما الأساسي
+                if _distance(fp, other) <= self.max_distance and len(feats ^ other_feats) <= self.max_diff:
+                    return other_url, "near"
+            self._exact[digest] = url
+            self._near.append((fp, feats, url))
+        return None, None
@@ -0,0 +1,132 @@
+"""
+Parsed Page Module
+تحليل صفحة HTML مرة واحدة ومشاركة الـ DOM والمشتقات المحسوبة (النص المرئي،
+النص الخام بعد فك الـ entities، فهرس العناوين) بين كل دوال الاستخراج
+"""
+
+import re
+import html as ihtml
+import unicodedata
+from functools import cached_property
+
+from bs4 import BeautifulSoup, Tag
+from bs4.element import PreformattedString
+
+
+def _pick_parser() -> str:
+    try:
+        import lxml  # noqa: F401
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+
+
+HTML_PARSER = _pick_parser()
+
+# عناصر لا تظهر للمستخدم
+HIDDEN_TAGS = {"script", "style", "noscript", "svg", "canvas", "iframe"}
+# العناوين وما يُستخدم كعناوين في قوالب Elementor
+HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6", "strong", "b")
+
+INVIS_RE = re.compile(r"[\u200e\u200f\u202A-\u202E\u2066-\u2069\u00A0]")  # bidi/nbsp
+
+
+class ParsedPage:
+    """
+    صفحة محللة مرة واحدة؛ كل خاصية تُحسب عند أول طلب ثم تُخزن
+
+    الـ soup مشترك بين الدوال ولا يجوز تعديله (decompose / extract)؛
+    النص المرئي يُحسب بالمرور على الشجرة مع تجاوز العناصر المخفية بدل حذفها.
+    """
+
+    def __init__(self, html: str, url: str = "", soup: BeautifulSoup = None):
+        self.html = html or ""
+        self.url = url
+        if soup is not None:
+            self.__dict__["soup"] = soup
+        self._texts = {}
+        self._headings = {}
+
+    @cached_property
+    def soup(self) -> BeautifulSoup:
+        return BeautifulSoup(self.html, HTML_PARSER)
+
+    def get_text(self, separator: str = " ") -> str:
+        """soup.get_text(separator, strip=True) مع تخزين النتيجة لكل فاصل"""
+        text = self._texts.get(separator)
+        if text is None:
+            text = self._texts[separator] = self.soup.get_text(separator, strip=True)
+        return text
+
+    @cached_property
+    def visible_text(self) -> str:
+        """النص المرئي داخل body بدون scripts/styles/comments (سطر لكل عقدة نصية)"""
+        root = self.soup.body or self.soup
+        out = []
+        stack = [iter(root.children)]
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                stack.pop()
+            elif isinstance(node, Tag):
+                if node.name not in HIDDEN_TAGS:
+                    stack.append(iter(node.children))
+            elif not isinstance(node, PreformattedString):
+                s = str(node).strip()
+                if s:
+                    out.append(s)
+
+        text = "\n".join(out)
+        text = re.sub(r"[ \t]+", " ", text)
+        text = re.sub(r"\n{2,}", "\n\n", text)
+        return unicodedata.normalize("NFC", text.strip())
+
+    @cached_property
+    def unescaped(self) -> str:
+        """HTML الخام بعد فك الـ entities"""
+        return ihtml.unescape(self.html)
+
+    @cached_property
+    def raw_text(self) -> str:
+        """HTML الخام بعد فك الـ entities وحذف المحارف غير المرئية"""
+        return INVIS_RE.sub("", self.unescaped)
+
+    @cached_property
+    def attr_values(self) -> list:
+        """كل قيم الـ attributes في الصفحة (بعد فك الـ entities وحذف المحارف غير المرئية)"""
+        values = []
+        for el in self.soup.find_all(True):
+            for v in el.attrs.values():
+                for x in (v if isinstance(v, list) else [v]):
+                    values.append(INVIS_RE.sub("", ihtml.unescape(str(x))))
+        return values
+
+    @cached_property
+    def heading_index(self) -> list:
+        """(tag, text) لكل عنوان في الصفحة بترتيب ظهوره"""
+        return [(h, h.get_text(" ", strip=True)) for h in self.soup.find_all(HEADING_TAGS)]
+
+    def headings(self, names) -> list:
+        """(tag, text) للعناوين من الأنواع المطلوبة فقط، بترتيب الصفحة"""
+        key = tuple(names)
+        hits = self._headings.get(key)
+        if hits is None:
+            wanted = set(key)
+            hits = self._headings[key] = [(h, t) for h, t in self.heading_index if h.name in wanted]
+        return hits
+
+    @cached_property
+    def title(self) -> str:
+        t = self.soup.title
+        return str(t.string) if t and t.string else ""
+
+    def meta_content(self, key: str) -> str:
+        meta = self.soup.find("meta", attrs={"property": key}) or self.soup.find("meta", attrs={"name": key})
+        return meta.get("content") if meta and meta.get("content") else ""
+
+
+def as_page(html, url: str = "", soup: BeautifulSoup = None) -> ParsedPage:
+    """قبول نص HTML أو ParsedPage (للتوافق مع الاستدعاءات القديمة)"""
+    if isinstance(html, ParsedPage):
+        return html
+    return ParsedPage(html, url=url, soup=soup)
@@ -0,0 +1,310 @@
+"""
+Prompt Budget Module
+حساب التوكنز محلياً وتوزيع ميزانية البرومبت على أجزائه وقصّها حسب الصلة بدلاً من القص الأعمى
+"""
+
+import re
+import math
+from functools import lru_cache
+
+
+# نافذة السياق لكل نموذج (input + output)
+MODEL_CONTEXT_WINDOW = {
+    "gpt-4o-mini": 128_000,
+    "gpt-4o": 128_000,
+}
+DEFAULT_CONTEXT_WINDOW = 128_000
+
+# هامش لرسائل النظام والتنسيق لكل رسالة في chat.completions
+TOKENS_PER_MESSAGE = 4
+
+WORD_RE = re.compile(r"[\w\u0600-\u06FF]{2,}", re.UNICODE)
+ARABIC_DIACRITICS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+
+
+class PromptBudgetExceeded(ValueError):
+    """البرومبت أكبر من نافذة السياق المتاحة للنموذج"""
+
+
+# ============================================
+# Token Counting
+# ============================================
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # ملفات الـ BPE تُحمّل من الشبكة أول مرة؛ بدونها نرجع للتقدير المحلي
+        print(f"⚠️ tiktoken unavailable ({type(e).__name__}), using estimated token counts")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """عدد التوكنز (tiktoken إن توفر، وإلا تقدير متحفظ يراعي العربية)"""
+    if not text:
+        return 0
+    enc = _get_encoding(model)
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    # تقدير: ~4 أحرف لاتينية لكل توكن، وحرفين عربيين لكل توكن
+    non_ascii = len(text) - len(text.encode("ascii", "ignore"))
+    return math.ceil((len(text) - non_ascii) / 4 + non_ascii / 2)
+
+
+def _message_text(message) -> str:
+    if isinstance(message, str):
+        return message
+    if isinstance(message, dict):
+        content = message.get("content")
+    else:
+        content = getattr(message, "content", "")
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+def count_message_tokens(messages, model: str = "gpt-4o-mini") -> int:
+    """عدد توكنز قائمة رسائل chat (أو نص برومبت واحد)"""
+    if isinstance(messages, str):
+        return count_tokens(messages, model) + TOKENS_PER_MESSAGE
+    return sum(count_tokens(_message_text(m), model) + TOKENS_PER_MESSAGE for m in messages) + 3
+
+
+def context_window(model: str) -> int:
+    for key in sorted(MODEL_CONTEXT_WINDOW, key=len, reverse=True):
+        if (model or "").startswith(key):
+            return MODEL_CONTEXT_WINDOW[key]
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def ensure_within_budget(messages, model: str = "gpt-4o-mini", max_output_tokens: int = None, limit: int = None) -> int:
+    """
+    رفض البرومبت قبل الإرسال إذا تجاوز نافذة السياق
+
+    Returns:
+        int: عدد توكنز البرومبت
+
+    Raises:
+        PromptBudgetExceeded: إذا تجاوز (البرومبت + المخرجات) الحد المسموح
+    """
+    used = count_message_tokens(messages, model)
+    allowed = (limit or context_window(model)) - (max_output_tokens or 0)
+    if used > allowed:
+        raise PromptBudgetExceeded(
+            f"Prompt needs {used} tokens but only {allowed} are available for {model}"
+        )
+    return used
+
+
+# ============================================
+# Relevance Trimming
+# ============================================
+@lru_cache(maxsize=65536)
+def _normalize_word(w: str) -> str:
+    w = ARABIC_DIACRITICS.sub("", w.lower())
+    w = re.sub("[إأآا]", "ا", w)
+    w = w.replace("ة", "ه").replace("ى", "ي")
+    if w.startswith("ال") and len(w) > 4:
+        w = w[2:]
+    return w
+
+
+def _terms(text: str) -> set:
+    return {_normalize_word(w) for w in WORD_RE.findall(text or "")}
+
+
+def _split_counted(text: str, max_tokens: int, model: str) -> tuple:
+    """
+    split_passages مع عدد توكنز كل فقرة
+
+    كل سطر/جملة يُعدّ مرة واحدة ويُجمع طول الفقرة تراكمياً (القطعة + فاصل السطر)
+    بدلاً من إعادة عدّ الفقرة كلها مع كل سطر؛ التقدير التراكمي لا يقل عن العدّ الفعلي
+    """
+    passages, counts = [], []
+    newline = count_tokens("\n", model)
+    for block in re.split(r"\n\s*\n", text or ""):
+        block = block.strip()
+        if not block:
+            continue
+        block_tokens = count_tokens(block, model)
+        if block_tokens <= max_tokens:
+            passages.append(block)
+            counts.append(block_tokens)
+            continue
+        pieces = block.splitlines() if "\n" in block else re.split(r"(?<=[.!؟?])\s+", block)
+        current, used = [], 0
+        for piece in pieces:
+            size = count_tokens(piece, model)
+            if current and used + newline + size > max_tokens:
+                passages.append("\n".join(current))
+                counts.append(used)
+                current, used = [piece], size
+            else:
+                used += (newline if current else 0) + size
+                current.append(piece)
+        if current:
+            passages.append("\n".join(current))
+            counts.append(used)
+    return passages, counts
+
+
+def split_passages(text: str, max_tokens: int = 400, model: str = "gpt-4o-mini") -> list:
+    """تقسيم النص إلى فقرات (وتقسيم الفقرات الطويلة إلى أسطر/جمل)"""
+    return _split_counted(text, max_tokens, model)[0]
+
+
+def _truncate_tokens(text: str, max_tokens: int, model: str) -> str:
+    if max_tokens <= 0:
+        return ""
+    enc = _get_encoding(model)
+    if enc is not None:
+        ids = enc.encode(text, disallowed_special=())
+        return text if len(ids) <= max_tokens else enc.decode(ids[:max_tokens])
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid], model) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo]
+
+
+def trim_to_budget(text: str, max_tokens: int, query: str = None, model: str = "gpt-4o-mini", separator: str = "\n\n") -> str:
+    """
+    قص النص ليتسع في max_tokens مع الاحتفاظ بأكثر الفقرات صلة بالاستعلام
+
+    Args:
+        text: النص الكامل
+        max_tokens: الحد الأقصى للتوكنز
+        query: كلمات/نص يحدد الصلة (بدونه يُحتفظ بأول الفقرات بالترتيب)
+        model: اسم النموذج (لاختيار الـ tokenizer)
+        separator: الفاصل بين الفقرات في الناتج
+
+    Returns:
+        str: النص بعد القص بترتيب الفقرات الأصلي
+    """
+    if not text or count_tokens(text, model) <= max_tokens:
+        return text or ""
+
+    passages, counts = _split_counted(text, max(50, max_tokens // 4), model)
+    sep_tokens = count_tokens(separator, model)
+    sizes = [c + sep_tokens for c in counts]
+
+    query_terms = _terms(query) if query else set()
+    if query_terms:
+        def score(i):
+            terms = _terms(passages[i])
+            overlap = len(terms & query_terms)
+            # تفضيل الفقرات الكثيفة بالمصطلحات، مع أفضلية خفيفة للفقرات الأولى
+            return (overlap / math.sqrt(len(terms) + 1), -i)
+        order = sorted(range(len(passages)), key=score, reverse=True)
+    else:
+        order = list(range(len(passages)))
+
+    chosen, used = set(), 0
+    for i in order:
+        if used + sizes[i] <= max_tokens:
+            chosen.add(i)
+            used += sizes[i]
+
+    if not chosen:
+        return _truncate_tokens(passages[order[0]], max_tokens, model)
+
+    return separator.join(passages[i] for i in sorted(chosen))
+
+
+def trim_by_fields(text: str, max_tokens: int, field_queries: dict, model: str = "gpt-4o-mini", separator: str = "\n\n") -> str:
+    """
+    قص النص مع تغطية كل حقل في القالب بدلاً من ترتيب واحد لكل الحقول
+
+    كل حقل يرتب الفقرات حسب صلتها به، ثم تُختار الفقرات بالتناوب (أفضل فقرة
+    لكل حقل، ثم الثانية...) حتى تمتلئ الميزانية؛ وما يتبقى يُملأ حسب الصلة الإجمالية ثم بالترتيب الأصلي.
+
+    Args:
+        text: النص الكامل
+        max_tokens: الحد الأقصى للتوكنز
+        field_queries: {اسم_الحقل: كلمات الحقل}
+
+    Returns:
+        str: النص بعد القص بترتيب الفقرات الأصلي
+    """
+    if not text or count_tokens(text, model) <= max_tokens:
+        return text or ""
+
+    passages, counts = _split_counted(text, max(50, max_tokens // 4), model)
+    sep_tokens = count_tokens(separator, model)
+    sizes = [c + sep_tokens for c in counts]
+    terms = [_terms(p) for p in passages]
+
+    def ranking(query_terms: set) -> list:
+        scored = [(len(terms[i] & query_terms) / math.sqrt(len(terms[i]) + 1), -i) for i in range(len(passages))]
+        return [-neg_i for score, neg_i in sorted(scored, reverse=True) if score > 0]
+
+    field_terms = [_terms(q) for q in field_queries.values()]
+    rankings = [ranking(q) for q in field_terms]
+    overall = ranking(set().union(*field_terms)) if field_terms else []
+    chosen, used = set(), 0
+
+    def take(i):
+        nonlocal used
+        if i not in chosen and used + sizes[i] <= max_tokens:
+            chosen.add(i)
+            used += sizes[i]
+
+    depth = 0
+    while any(depth < len(r) for r in rankings):
+        for r in rankings:
+            if depth < len(r):
+                take(r[depth])
+        depth += 1
+    for i in overall + list(range(len(passages))):
+        take(i)
+
+    if not chosen:
+        return _truncate_tokens(passages[0], max_tokens, model)
+
+    return separator.join(passages[i] for i in sorted(chosen))
+
+
+def allocate_budget(slots: dict, total_tokens: int, weights: dict = None, queries: dict = None, model: str = "gpt-4o-mini") -> dict:
+    """
+    توزيع ميزانية توكنز على أجزاء البرومبت (مثل rfp / company / answers)
+
+    كل جزء يأخذ حصة حسب الوزن؛ الأجزاء الأصغر من حصتها تتنازل عن الفائض
+    ليُعاد توزيعه على بقية الأجزاء، ثم يُقص كل جزء حسب الصلة.
+
+    Returns:
+        dict: نفس المفاتيح مع النصوص بعد القص
+    """
+    weights = weights or {}
+    queries = queries or {}
+    sizes = {k: count_tokens(v or "", model) for k, v in slots.items()}
+    budgets = {}
+    remaining = dict(sizes)
+    available = total_tokens
+
+    while remaining:
+        total_weight = sum(weights.get(k, 1.0) for k in remaining)
+        shares = {k: available * weights.get(k, 1.0) / total_weight for k in remaining}
+        fits = {k for k in remaining if sizes[k] <= shares[k]}
+        if not fits:
+            for k in remaining:
+                budgets[k] = int(shares[k])
+            break
+        for k in fits:
+            budgets[k] = sizes[k]
+            available -= sizes[k]
+            del remaining[k]
+
+    return {
+        k: trim_to_budget(v or "", budgets[k], query=queries.get(k), model=model)
+        for k, v in slots.items()
+    }
@@ -5,6 +5,7 @@ Generate professional RFP proposal using LangGraph workflow
 
 import json
 import os
+import time
 from typing import TypedDict, Annotated, List
 import operator
 from pydantic import BaseModel, Field
@@ -13,6 +14,13 @@ from langgraph.types import Send
 from langchain_openai import ChatOpenAI
 import pypandoc
 
+from modules.llm_client import invoke_chat_model, current_deadline, DeadlineExceeded
+from modules.prompt_budget import allocate_budget
+
+# ميزانية سياق كل قسم (RFP + الشركة + إجابات المستخدم)
+SECTION_CONTEXT_TOKENS = 12000
+SECTION_CONTEXT_WEIGHTS = {"rfp": 0.5, "company": 0.35, "answers": 0.15}
+
 
 # =========================
 # Fixed Proposal Sections Schema
@@ -141,6 +149,7 @@ class ProposalState(TypedDict):
     company_info: str
     gap_analysis: dict
     user_answers: dict
+    deadline: float  # epoch seconds (None = no deadline)
 
     # Internal orchestration
     sections: list[Section]
@@ -159,6 +168,7 @@ class WorkerState(TypedDict):
     company_info: str
     gap_analysis: dict
     user_answers: dict
+    deadline: float
 
     # Output
     completed_sections: Annotated[list[str], operator.add]
@@ -223,6 +233,16 @@ def writer_node(state: WorkerState):
         if state["user_answers"].get("additional_info"):
             additional_info = state["user_answers"]["additional_info"]
 
+    # توزيع الميزانية على أجزاء السياق حسب صلتها بالقسم
+    section_query = f"{section_name} {section_desc}"
+    context = allocate_budget(
+        {"rfp": state["rfp_summary"], "company": state["company_info"], "answers": additional_info},
+        SECTION_CONTEXT_TOKENS,
+        weights=SECTION_CONTEXT_WEIGHTS,
+        queries={"rfp": section_query, "company": section_query, "answers": section_query},
+    )
+    additional_info = context["answers"]
+
     prompt = f"""
 أنت خبير في كتابة العروض الفنية للمناقصات الحكومية.
 
@@ -245,10 +265,10 @@ def writer_node(state: WorkerState):
 ===== البيانات المتوفرة =====
 
 📋 معلومات المناقصة (RFP):
-{state['rfp_summary']}
+{context['rfp']}
 
 🏢 معلومات الشركة:
-{state['company_info']}
+{context['company']}
 
 📊 نتائج تحليل الفجوات:
 {gap_summary}
@@ -268,8 +288,19 @@ def writer_node(state: WorkerState):
         {"role": "user", "content": prompt}
     ]
 
-    response = model.invoke(messages)
-    section_text = response.content.strip()
+    try:
+        response = invoke_chat_model(
+            "proposal_section",
+            model,
+            messages,
+            tags={"section": section_name},
+            deadline=state.get("deadline"),
+        )
+        section_text = response.content.strip()
+    except DeadlineExceeded:
+        # لا ننتظر القسم البطيء: يكتمل العرض ضمن المهلة ويُعلَّم القسم للمراجعة
+        print(f"⏱️ Section timed out: {section_name}")
+        section_text = "لم يكتمل هذا القسم ضمن المهلة المحددة، يرجى إعادة التوليد."
 
     return {"completed_sections": [f"### {section_name}\n\n{section_text}"]}
 
@@ -307,6 +338,7 @@ def assign_workers(state: ProposalState):
                     "company_info": state["company_info"],
                     "gap_analysis": state["gap_analysis"],
                     "user_answers": state["user_answers"],
+                    "deadline": state.get("deadline"),
                 },
             )
         )
@@ -373,7 +405,8 @@ def generate_proposal(
     gap_analysis_file: str = "data/outputs/gap_analysis.json",
     chat_history_file: str = "data/outputs/chat_history.json",
     output_file: str = "data/outputs/proposal.md",
-    generate_word: bool = True
+    generate_word: bool = True,
+    deadline_seconds: float = None
 ):
     """
     Generate proposal from all collected data
@@ -385,6 +418,8 @@ def generate_proposal(
         chat_history_file: Path to chat history JSON
         output_file: Path to save generated proposal (markdown)
         generate_word: Whether to also generate Word document
+        deadline_seconds: Time budget for all section calls (defaults to the
+            enclosing deadline_scope, if any)
         
     Returns:
         str: Generated proposal in markdown format
@@ -547,6 +582,7 @@ def generate_proposal(
         "company_info": company_info_text,
         "gap_analysis": gap_data,
         "user_answers": chat_data,
+        "deadline": time.time() + deadline_seconds if deadline_seconds else current_deadline(),
         "sections": [],
         "completed_sections": [],
         "final_document": "",
@@ -7,6 +7,9 @@ from collections import Counter
 from typing import List, Literal, Optional
 from itertools import groupby
 
+from modules.llm_client import invoke_chat_model
+from modules.prompt_budget import trim_to_budget
+
 
 
 # ============================================
@@ -37,15 +40,27 @@ class AllCriteria(BaseModel):
     )
 
 
+# ميزانية نص الكراسة داخل برومبت استخراج المعايير (من نافذة 128k)
+RFP_TEXT_TOKENS = 100_000
+RFP_CRITERIA_QUERY = (
+    "معايير التقييم الخبرة الكفاءة المؤهلات الشهادات الكوادر الأدوات السعر الضمانات "
+    "مدة التنفيذ المواعيد الجدول الزمني الجودة التدقيق المراجعة الوزن النسبة الدرجة"
+)
+
 # ============================================
-# الفنكشن الرئيسية
+# أوزان الفئات (مجموعها = 1.0)
 # ============================================
-def extract_and_weight_rfp_criteria(pdf_path='rfp.pdf', output_file="criteria_with_weights.json"):
-    """استخراج وحساب أوزان معايير RFP من ملف PDF"""
+CATEGORY_WEIGHTS = {
+    'financial': 0.30,    # 30%
+    'technical': 0.35,    # 35%
+    'quality': 0.20,      # 20%
+    'timeline': 0.10,     # 10%
+    'other': 0.05         # 5%
+}
 
-    # ============================================
-    # 1. استخراج النص من PDF
-    # ============================================
+
+def extract_pdf_text(pdf_path):
+    """استخراج النص الكامل من ملف PDF"""
     all_text = []
     with pdfplumber.open(pdf_path) as pdf:
         print(f"   📄 عدد الصفحات: {len(pdf.pages)}")
@@ -56,15 +71,13 @@ def extract_and_weight_rfp_criteria(pdf_path='rfp.pdf', output_file="criteria_wi
                 if i <= 2:  # عرض أول صفحتين
                     print(f"   ✓ صفحة {i}: {len(text)} حرف")
 
-    text = "\n".join(all_text)
+    return "\n".join(all_text)
 
-    # ============================================
-    # 2. إعداد النموذج واستخراج المعايير
-    # ============================================
-    llm = ChatOpenAI(model_name="gpt-4o-mini")
 
-    # البرومبت
-    prompt = f"""
+def build_criteria_prompt(text):
+    """بناء برومبت استخراج المعايير من نص كراسة الشروط (بعد القص حسب ميزانية التوكنز)"""
+    text = trim_to_budget(text, RFP_TEXT_TOKENS, query=RFP_CRITERIA_QUERY)
+    return f"""
 أنت محلل خبير متخصص في كراسات الشروط السعودية.
 
 من النص التالي، استخرج جميع معايير التقييم المذكورة أو المستنتجة بشكل منظم ومفصل.
@@ -103,26 +116,9 @@ def extract_and_weight_rfp_criteria(pdf_path='rfp.pdf', output_file="criteria_wi
 اكتب باللغة العربية من اليمين لليسار.
 """
 
-    # استخراج المعايير
-    extractor = llm.with_structured_output(AllCriteria)
-    result = extractor.invoke(prompt)
-
-    # حفظ النتيجة الأولية
-    initial_output = "criteria_extraction_result.json"
-    with open(initial_output, "w", encoding="utf-8") as f:
-        json.dump(result.model_dump(), f, ensure_ascii=False, indent=2)
-
-    print("✅ تم استخراج المعايير")
-
-    # ============================================
-    # 3. حساب الأوزان تلقائياً
-    # ============================================
 
-    # اقرأ النتيجة المحفوظة
-    with open(initial_output, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    # احسب عدد المعايير لكل فئة
+def apply_category_weights(data):
+    """توزيع أوزان الفئات على المعايير بالتساوي داخل كل فئة"""
     categories = [c['category'] for c in data['criteria']]
     category_counts = Counter(categories)
 
@@ -130,17 +126,8 @@ def extract_and_weight_rfp_criteria(pdf_path='rfp.pdf', output_file="criteria_wi
     for cat, count in category_counts.items():
         print(f"   {cat}: {count} معيار")
 
-    # حدد أوزان كل فئة (مجموعها = 1.0)
-    category_weights = {
-        'financial': 0.30,    # 30%
-        'technical': 0.35,    # 35%
-        'quality': 0.20,      # 20%
-        'timeline': 0.10,     # 10%
-        'other': 0.05         # 5%
-    }
-
     print(f"\n أوزان الفئات:")
-    for cat, weight in category_weights.items():
+    for cat, weight in CATEGORY_WEIGHTS.items():
         if cat in category_counts:  # اطبع فقط الفئات الموجودة
             print(f"   {cat}: {weight*100}%")
 
@@ -148,12 +135,58 @@ def extract_and_weight_rfp_criteria(pdf_path='rfp.pdf', output_file="criteria_wi
     for criteria in data['criteria']:
         category = criteria['category']
         # وزّع وزن الفئة على عدد المعايير فيها بالتساوي
-        criteria['weight'] = round(category_weights[category] / category_counts[category], 4)
+        criteria['weight'] = round(CATEGORY_WEIGHTS[category] / category_counts[category], 4)
 
     # تحقق من أن مجموع الأوزان = 1.0
     total_weight = sum(c['weight'] for c in data['criteria'])
     print(f"\n مجموع الأوزان: {round(total_weight, 4)}")
 
+    return data
+
+
+# ============================================
+# الفنكشن الرئيسية
+# ============================================
+def extract_and_weight_rfp_criteria(pdf_path='rfp.pdf', output_file="criteria_with_weights.json"):
+    """استخراج وحساب أوزان معايير RFP من ملف PDF"""
+
+    # ============================================
+    # 1. استخراج النص من PDF
+    # ============================================
+    text = extract_pdf_text(pdf_path)
+
+    # ============================================
+    # 2. إعداد النموذج واستخراج المعايير
+    # ============================================
+    llm = ChatOpenAI(model_name="gpt-4o-mini")
+
+    # البرومبت
+    prompt = build_criteria_prompt(text)
+
+    # استخراج المعايير
+    extractor = llm.with_structured_output(AllCriteria, include_raw=True)
+    response = invoke_chat_model("rfp_criteria", extractor, prompt, model_name="gpt-4o-mini")
+    if response.get("parsing_error") or response.get("parsed") is None:
+        raise ValueError(f"Failed to parse RFP criteria: {response.get('parsing_error')}")
+    result = response["parsed"]
+
+    # حفظ النتيجة الأولية
+    initial_output = "criteria_extraction_result.json"
+    with open(initial_output, "w", encoding="utf-8") as f:
+        json.dump(result.model_dump(), f, ensure_ascii=False, indent=2)
+
+    print("✅ تم استخراج المعايير")
+
+    # ============================================
+    # 3. حساب الأوزان تلقائياً
+    # ============================================
+
+    # اقرأ النتيجة المحفوظة
+    with open(initial_output, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    data = apply_category_weights(data)
+
     # احفظ النتيجة النهائية
     with open(output_file, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
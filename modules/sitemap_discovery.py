@@ -0,0 +1,328 @@
+"""
+Sitemap Discovery Module
+اكتشاف صفحات موقع الشركة من الـ sitemap بشكل متدفق (streaming):
+- تلميحات Sitemap: من robots.txt
+- فحص الروابط المرشحة بالتوازي
+- تحليل XML بـ iterparse (مع دعم sitemap index المتداخل و .xml.gz) بذاكرة ثابتة
+- اختيار أفضل الصفحات أثناء القراءة والتوقف المبكر عند اكتمالها
+"""
+
+import gzip
+import heapq
+import itertools
+import xml.etree.ElementTree as ET
+from urllib.parse import urljoin, urlparse
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+from modules.web_fetcher import get_session, time_left, TIMEOUT
+from modules.page_dedup import canonical_url, is_archive_url, is_skipped_sitemap
+
+
+MAX_SITEMAP_DEPTH = 3
+MAX_SCANNED_URLS = 100_000
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+EARLY_STOP_SCORE = 1  # التوقف عندما تكون كل الصفحات المختارة صفحات كلمات مفتاحية
+
+SITEMAP_CANDIDATES = [
+    "sitemap.xml",
+    "/sitemap.xml",
+    "wp-sitemap.xml",
+    "/wp-sitemap.xml",
+    "wp-sitemap-posts-page-1.xml",
+    "en/wp-sitemap-posts-page-1.xml",
+]
+
+PAGE_KEYWORDS = [
+    "about", "من-نحن", "نبذة", "services", "الخدمات",
+    "contact", "تواصل", "vision", "الرؤية", "mission", "الرسالة",
+    "why-us", "لماذا", "projects", "مشاريع", "portfolio", "أعمال"
+]
+
+
+def _score_path(path: str) -> int:
+    path = path.lower()
+    return sum(1 for kw in PAGE_KEYWORDS if kw in path)
+
+
+def score_url(u: str) -> int:
+    """Score URL based on relevant keywords"""
+    return _score_path(urlparse(u).path)
+
+
+def is_arabic_url(u: str) -> bool:
+    u = u.lower()
+    return "/en/" not in u and "lang=en" not in u
+
+
+def same_host(url: str, root: str) -> bool:
+    return urlparse(url).netloc == urlparse(root).netloc
+
+
+# ============================================
+# Discovery
+# ============================================
+def _fetch_timeout(deadline: float = None):
+    """مهلة طلب واحد: min(TIMEOUT, المتبقي من ميزانية الزحف)؛ None إذا انتهت الميزانية"""
+    left = time_left(deadline)
+    if left is None:
+        return TIMEOUT
+    return min(TIMEOUT, left) if left > 0 else None
+
+
+def robots_sitemaps(root_url: str, session=None, deadline: float = None) -> list:
+    """روابط Sitemap: المذكورة في robots.txt (ضمن ميزانية الزحف)"""
+    session = session or get_session()
+    timeout = _fetch_timeout(deadline)
+    if timeout is None:
+        return []
+    try:
+        r = session.get(urljoin(root_url, "/robots.txt"), timeout=timeout)
+        if r.status_code != 200:
+            return []
+    except Exception:
+        return []
+    hints = []
+    for line in r.text.splitlines():
+        key, _, value = line.partition(":")
+        if key.strip().lower() == "sitemap" and value.strip():
+            hints.append(urljoin(root_url, value.strip()))
+    return hints
+
+
+def candidate_sitemaps(root_url: str, session=None, deadline: float = None) -> list:
+    """تلميحات robots.txt أولاً ثم الأسماء الشائعة (بدون تكرار)"""
+    candidates = robots_sitemaps(root_url, session, deadline=deadline) + [urljoin(root_url, c) for c in SITEMAP_CANDIDATES]
+    return list(dict.fromkeys(candidates))
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _is_sitemap_tag(tag: str) -> bool:
+    """عنصر من نطاق الـ sitemap (أو بدون نطاق) — لا image:loc / video:loc"""
+    return tag.startswith(SITEMAP_NS) or not tag.startswith("{")
+
+
+def parse_sitemap(stream):
+    """
+    تحليل XML متدفق لملف sitemap
+
+    يُقبل loc/lastmod فقط إذا كان أبوه المباشر url أو sitemap وفي نطاق الـ sitemap،
+    وأول loc فقط لكل عنصر. الجذر يُفرغ بعد كل عنصر فتبقى الذاكرة ثابتة.
+
+    Yields:
+        tuple: (kind, loc, lastmod) حيث kind = "url" أو "sitemap"
+    """
+    root = None
+    path = []  # الأسماء المحلية من الجذر حتى العنصر الحالي
+    loc = lastmod = None
+    for event, el in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = el
+            path.append(_local(el.tag))
+            continue
+
+        tag = path.pop()
+        parent = path[-1] if path else None
+        if parent in ("url", "sitemap") and _is_sitemap_tag(el.tag):
+            if tag == "loc" and loc is None:
+                loc = (el.text or "").strip() or None
+            elif tag == "lastmod" and lastmod is None:
+                lastmod = (el.text or "").strip() or None
+        elif tag in ("url", "sitemap") and _is_sitemap_tag(el.tag):
+            if loc:
+                yield tag, loc, lastmod
+            loc = lastmod = None
+            root.clear()  # العناصر المنتهية تبقى معلقة بالجذر ما لم يُفرغ
+
+
+def iter_sitemap(url: str, session=None, depth: int = 0, deadline: float = None):
+    """
+    قراءة sitemap بشكل متدفق
+
+    كل طلب (الملف وملفات الـ index الفرعية) مهلته min(TIMEOUT, المتبقي من الميزانية)،
+    والملفات الفرعية تُتخطى بعد انتهاء ميزانية الزحف.
+
+    Yields:
+        tuple: (loc, lastmod) لكل صفحة؛ الـ sitemap index يُتبع تلقائياً حتى MAX_SITEMAP_DEPTH
+
+    Raises:
+        RuntimeError: إذا انتهت ميزانية الزحف قبل طلب الملف
+    """
+    session = session or get_session()
+    timeout = _fetch_timeout(deadline)
+    if timeout is None:
+        raise RuntimeError("crawl budget exhausted")
+    r = session.get(url, timeout=timeout, stream=True)
+    r.raise_for_status()
+    r.raw.decode_content = True
+    stream = gzip.GzipFile(fileobj=r.raw) if urlparse(url).path.endswith(".gz") else r.raw
+
+    children = []
+    try:
+        for kind, loc, lastmod in parse_sitemap(stream):
+            if kind == "url":
+                yield loc, lastmod
+            elif not is_skipped_sitemap(loc):  # كتّاب / تصنيفات
+                children.append(loc)
+    finally:
+        r.close()
+
+    if depth < MAX_SITEMAP_DEPTH:
+        for i, child in enumerate(children):
+            if _fetch_timeout(deadline) is None:
+                print(f"  ⏱️ Sitemap: crawl budget exhausted, skipping {len(children) - i} child sitemaps")
+                break
+            try:
+                yield from iter_sitemap(child, session, depth + 1, deadline=deadline)
+            except Exception as e:
+                print(f"  ⚠️ Sitemap {child}: {e}")
+
+
+def _probe_sitemap(url: str, root_url: str, session, deadline: float = None, probe: int = 50):
+    """
+    فحص مرشح: أول عناصر الملف فقط (بدون قراءته كاملاً)
+
+    Returns:
+        tuple | None: للمرشح الصالح (العناصر المفحوصة، generator يكمل نفس الاتصال)
+        حتى لا يُحمّل الملف مرة ثانية؛ None إذا لم توجد روابط من نفس الموقع
+    """
+    entries = iter_sitemap(url, session, deadline=deadline)
+    try:
+        head = list(itertools.islice(entries, probe))
+    except BaseException:
+        entries.close()
+        raise
+    if any(same_host(loc, root_url) for loc, _ in head):
+        return head, entries
+    entries.close()
+    return None
+
+
+def _close_probe(fut):
+    """إغلاق اتصال مرشح صالح لم يُستخدم (انتهى فحصه بعد اختيار مرشح أعلى أولوية)"""
+    if not fut.cancelled() and fut.exception() is None and fut.result() is not None:
+        fut.result()[1].close()
+
+
+def _open_sitemap(root_url: str, session, deadline: float = None) -> tuple:
+    """
+    فحص كل المرشحين بالتوازي واختيار أول مرشح صالح حسب ترتيب الأولوية
+
+    Returns:
+        tuple: (url, العناصر المفحوصة, generator يكمل اتصال الفحص نفسه) — على المستدعي إغلاقه
+
+    Raises:
+        RuntimeError: إذا لم يوجد sitemap صالح (أو انتهت ميزانية الزحف قبل إيجاده)
+    """
+    candidates = candidate_sitemaps(root_url, session, deadline=deadline)
+    errors = []
+
+    pool = ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix="sitemap")
+    futures = [(c, pool.submit(_probe_sitemap, c, root_url, session, deadline)) for c in candidates]
+    winner = None
+    try:
+        for c, fut in futures:
+            try:
+                left = time_left(deadline)
+                probed = fut.result(timeout=None if left is None else max(0.0, left))
+                if probed is not None:
+                    winner = fut
+                    return (c, *probed)
+                errors.append(f"{c}: no same-host URLs")
+            except FuturesTimeout:
+                errors.append(f"{c}: crawl budget exhausted")
+                break
+            except Exception as e:
+                errors.append(f"{c}: {e}")
+    finally:
+        # لا ننتظر المرشحين الأبطأ بعد إيجاد الأول حسب الأولوية، وتُغلق اتصالاتهم عند انتهائهم
+        for _, fut in futures:
+            if fut is not winner:
+                fut.add_done_callback(_close_probe)
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    raise RuntimeError("No sitemap found/parsed. Tried:\n" + "\n".join(errors))
+
+
+def find_sitemap(root_url: str, session=None, deadline: float = None) -> str:
+    """
+    فحص كل المرشحين بالتوازي وإرجاع أول مرشح صالح حسب ترتيب الأولوية
+
+    Raises:
+        RuntimeError: إذا لم يوجد sitemap صالح (أو انتهت ميزانية الزحف قبل إيجاده)
+    """
+    url, _, entries = _open_sitemap(root_url, session or get_session(), deadline=deadline)
+    entries.close()
+    return url
+
+
+def discover_pages(root_url: str, max_pages: int = 30, session=None, deadline: float = None):
+    """
+    اختيار أفضل max_pages صفحة من الـ sitemap أثناء قراءته
+
+    نفس ترتيب pick_pages: الصفحات العربية حسب النقاط (ثم ترتيب الـ sitemap)، ثم باقي
+    الصفحات بترتيبها. الذاكرة محدودة بـ max_pages، والقراءة تتوقف عندما تمتلئ
+    القائمة العربية بصفحات كلمات مفتاحية، أو عند انتهاء ميزانية الزحف (deadline).
+
+    Returns:
+        tuple: (urls, {url: lastmod})
+    """
+    session = session or get_session()
+    _, head, entries = _open_sitemap(root_url, session, deadline=deadline)
+
+    root_host = urlparse(root_url).netloc
+    seq = itertools.count()
+    top = []          # min-heap of (score, -seq, url, lastmod) — أفضل الصفحات العربية
+    chosen = set()    # الروابط الموحدة داخل top (لإزالة التكرار بذاكرة محدودة)
+    rest = []         # أول max_pages صفحة غير عربية
+    rest_seen = set()
+    scanned = dropped = 0
+
+    try:
+        for loc, lastmod in itertools.chain(head, entries):
+            scanned += 1
+            if scanned > MAX_SCANNED_URLS:
+                break
+            if deadline is not None and scanned % 500 == 0 and time_left(deadline) <= 0:
+                print(f"  ⏱️ Sitemap: crawl budget exhausted after {scanned} URLs, using pages found so far")
+                break
+            parts = urlparse(loc)
+            if parts.netloc != root_host:
+                continue
+            if is_archive_url(loc):
+                dropped += 1
+                continue
+            key = canonical_url(loc)
+
+            if is_arabic_url(loc):
+                if key in chosen:
+                    dropped += 1
+                    continue
+                item = (_score_path(parts.path), -next(seq), loc, lastmod)
+                if len(top) < max_pages:
+                    heapq.heappush(top, item)
+                    chosen.add(key)
+                elif item > top[0]:
+                    chosen.discard(canonical_url(heapq.heapreplace(top, item)[2]))
+                    chosen.add(key)
+                if len(top) >= max_pages and top[0][0] >= EARLY_STOP_SCORE:
+                    print(f"  ⏹️ Sitemap: {max_pages} keyword pages found after {scanned} URLs, stopping early")
+                    break
+            elif len(rest) < max_pages and key not in rest_seen:
+                rest.append((loc, lastmod))
+                rest_seen.add(key)
+    finally:
+        entries.close()
+
+    if dropped:
+        print(f"  🔁 Sitemap: {dropped} archive/duplicate URLs skipped before fetch")
+
+    ranked = [(loc, lastmod) for _, _, loc, lastmod in sorted(top, reverse=True)]
+    # صفحة غير عربية قد تكون نسخة موحدة من صفحة عربية مختارة (?lang=en مثلاً)
+    rest = [(loc, lastmod) for loc, lastmod in rest if canonical_url(loc) not in chosen]
+    selected = (ranked + rest)[:max_pages]
+    lastmods = {loc: lastmod for loc, lastmod in selected if lastmod}
+    return [loc for loc, _ in selected], lastmods
@@ -0,0 +1,309 @@
+"""
+Web Fetcher Module
+جلب صفحات مواقع الشركات بالتوازي عبر جلسة HTTP مشتركة (connection pooling)
+مع حد أقصى للطلبات المتزامنة لكل نطاق (host)، وكاش على القرص بطلبات شرطية
+(ETag / Last-Modified) وتخطي الصفحات التي لم يتغير lastmod لها في الـ sitemap
+
+مع HTTP_CASSETTE=record|replay تمر طلبات الجلسة عبر modules/http_cassette
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from modules.http_cassette import CASSETTE, CassetteAdapter
+
+
+HEADERS = {"User-Agent": "Mozilla/5.0 (X11; Linux x86_64)"}
+TIMEOUT = 20
+
+MAX_WORKERS = int(os.getenv("CRAWL_MAX_WORKERS", "8"))
+PER_HOST_LIMIT = int(os.getenv("CRAWL_PER_HOST_LIMIT", "4"))
+
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", "data/cache/http")
+# مع الـ cassette يُعطل الكاش افتراضياً: طلب شرطي مسجل (304) لا يُعاد بدون نفس الكاش
+HTTP_CACHE_MAX_AGE_DAYS = float(os.getenv("HTTP_CACHE_MAX_AGE_DAYS", "30"))
+HTTP_CACHE_MAX_MB = float(os.getenv("HTTP_CACHE_MAX_MB", "500"))
+HTTP_CACHE_PRUNE_INTERVAL = 3600  # ثوانٍ بين عمليتي تنظيف للمجلد
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE", "0" if CASSETTE.active else "1").strip().lower() in {"1", "true", "yes", "on"}
+
+
+
+class CrawlBudgetExceeded(TimeoutError):
+    """انتهت ميزانية الزحف قبل جلب الصفحة"""
+
+
+def time_left(deadline: float = None):
+    """الثواني المتبقية حتى deadline (epoch)؛ None = بدون ميزانية"""
+    return None if deadline is None else deadline - time.time()
+
+
+_session = None
+_session_lock = threading.Lock()
+_host_limits = {}
+_host_lock = threading.Lock()
+
+
+# ============================================
+# Session
+# ============================================
+def get_session() -> requests.Session:
+    """جلسة requests واحدة لكل العملية (إعادة استخدام اتصالات TCP/TLS)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.headers.update(HEADERS)
+            pool_args = {"pool_connections": 16, "pool_maxsize": max(MAX_WORKERS, PER_HOST_LIMIT) * 2}
+            if CASSETTE.active:
+                adapter = CassetteAdapter(CASSETTE, **pool_args)
+                print(f"📼 HTTP cassette: {CASSETTE.mode} ({CASSETTE.cassette_dir})")
+            else:
+                adapter = HTTPAdapter(**pool_args)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def _host_semaphore(url: str, limit: int = PER_HOST_LIMIT) -> threading.BoundedSemaphore:
+    host = urlparse(url).netloc.lower()
+    with _host_lock:
+        sem = _host_limits.get(host)
+        if sem is None:
+            sem = _host_limits[host] = threading.BoundedSemaphore(limit)
+        return sem
+
+
+def decode_response(r: requests.Response) -> str:
+    """نص الرد بالترميز الصحيح (apparent_encoding فقط إذا لم يحدد الخادم charset)"""
+    content_type = (r.headers.get("Content-Type") or "").lower()
+    if "charset=" not in content_type:
+        r.encoding = r.apparent_encoding or r.encoding
+    return r.text
+
+
+# ============================================
+# HTTP Cache
+# ============================================
+class HttpCache:
+    """
+    كاش صفحات على القرص: ملف JSON لكل رابط يحوي النص والـ validators
+
+    Entry: {"url", "body", "etag", "last_modified", "lastmod", "fetched_at"}
+
+    المدخلات الأقدم من max_age_days تُهمل وتُحذف، والمجلد لا يتجاوز max_mb (الأقدم
+    يُحذف أولاً). stats إجمالي العملية؛ إحصاءات زحف واحد عبر fetch_many(stats=...)
+    """
+
+    def __init__(self, cache_dir: str = HTTP_CACHE_DIR, max_age_days: float = HTTP_CACHE_MAX_AGE_DAYS,
+                 max_mb: float = HTTP_CACHE_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_age = max_age_days * 86400
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self.stats = new_cache_stats()
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, url: str):
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self.max_age and time.time() - entry.get("fetched_at", 0) > self.max_age:
+            return None
+        return entry
+
+    def put(self, url: str, entry: dict):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(url)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**entry, "url": url}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        self._maybe_prune()
+
+    def _maybe_prune(self):
+        with self._lock:
+            if time.time() - self._last_prune < HTTP_CACHE_PRUNE_INTERVAL:
+                return
+            self._last_prune = time.time()
+        try:
+            self.prune()
+        except OSError as e:
+            print(f"⚠️ HTTP cache prune failed: {e}")
+
+    def prune(self) -> int:
+        """حذف المدخلات المنتهية ثم الأقدم حتى يصبح المجلد ضمن max_bytes؛ يرجع عدد المحذوف"""
+        try:
+            names = [n for n in os.listdir(self.cache_dir) if n.endswith(".json")]
+        except OSError:
+            return 0
+        files = []
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+        files.sort()  # الأقدم أولاً
+
+        now, removed = time.time(), 0
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in files:
+            expired = self.max_age and now - mtime > self.max_age
+            if not expired and (not self.max_bytes or total <= self.max_bytes):
+                break
+            try:
+                os.remove(path)
+                removed += 1
+                total -= size
+            except OSError:
+                pass
+        return removed
+
+    def count(self, key: str, stats: dict = None):
+        with self._lock:
+            self.stats[key] += 1
+            if stats is not None:
+                stats[key] = stats.get(key, 0) + 1
+
+    def reset_stats(self) -> dict:
+        with self._lock:
+            stats, self.stats = self.stats, {k: 0 for k in self.stats}
+        return stats
+
+
+def new_cache_stats() -> dict:
+    return {"lastmod_skips": 0, "not_modified": 0, "downloads": 0}
+
+
+HTTP_CACHE = HttpCache()
+
+
+# ============================================
+# Fetching
+# ============================================
+def fetch_html(url: str, session: requests.Session = None, timeout: float = TIMEOUT,
+               lastmod: str = None, cache: HttpCache = None, stats: dict = None) -> str:
+    """
+    جلب صفحة واحدة مع احترام حد التزامن للنطاق
+
+    مع الكاش: إذا طابق lastmod (من الـ sitemap) آخر زحف تُعاد النسخة المحفوظة بدون أي
+    طلب، وإلا يُرسل طلب شرطي (If-None-Match / If-Modified-Since) ويُقبل رد 304.
+    stats: عدادات المستدعي (new_cache_stats) تُحدّث بجانب إجمالي الكاش
+    """
+    if cache is None and HTTP_CACHE_ENABLED:
+        cache = HTTP_CACHE
+    entry = cache.get(url) if cache is not None else None
+
+    if entry and lastmod and entry.get("lastmod") == lastmod:
+        cache.count("lastmod_skips", stats)
+        return entry["body"]
+
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    session = session or get_session()
+    with _host_semaphore(url):
+        r = session.get(url, timeout=timeout, allow_redirects=True, headers=headers)
+
+    if r.status_code == 304 and entry:
+        cache.count("not_modified", stats)
+        cache.put(url, {**entry, "lastmod": lastmod or entry.get("lastmod"), "fetched_at": time.time()})
+        return entry["body"]
+
+    r.raise_for_status()
+    body = decode_response(r)
+    if cache is not None:
+        cache.count("downloads", stats)
+        cache.put(url, {
+            "body": body,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "lastmod": lastmod,
+            "fetched_at": time.time(),
+        })
+    return body
+
+
+def fetch_bytes(url: str, session: requests.Session = None, timeout: float = 10) -> bytes:
+    """جلب ملف ثنائي (مثل صور الشعارات) عبر نفس الجلسة وحد التزامن"""
+    session = session or get_session()
+    with _host_semaphore(url):
+        r = session.get(url, timeout=timeout, allow_redirects=True)
+    r.raise_for_status()
+    return r.content
+
+
+def _fetch_before(deadline, url, session, timeout, lastmod, stats=None):
+    # المهلة تُحسب عند بدء الطلب فعلياً (قد ينتظر الطلب دوره في الـ pool)
+    left = time_left(deadline)
+    if left is not None:
+        if left <= 0:
+            raise CrawlBudgetExceeded("crawl budget exhausted before fetch")
+        timeout = min(timeout, left)
+    return fetch_html(url, session, timeout, lastmod, stats=stats)
+
+
+def fetch_many(urls: list, max_workers: int = MAX_WORKERS, timeout: float = TIMEOUT, lastmods: dict = None,
+               deadline: float = None, stats: dict = None):
+    """
+    جلب عدة صفحات بالتوازي وإرجاع كل صفحة فور وصولها
+
+    Args:
+        urls: قائمة الروابط
+        max_workers: أقصى عدد طلبات متزامنة إجمالاً
+        timeout: مهلة كل طلب بالثواني
+        lastmods: {url: lastmod} من الـ sitemap (لتخطي الصفحات غير المتغيرة)
+        deadline: نهاية ميزانية الزحف (epoch)؛ الصفحات غير المكتملة عندها تُعاد
+                  بخطأ CrawlBudgetExceeded بدون انتظارها
+        stats: dict اختياري (new_cache_stats()) يُملأ بإحصاءات كاش هذا الاستدعاء فقط
+
+    Yields:
+        tuple: (index, url, html, error) بترتيب الوصول؛ index هو موقع الرابط في urls
+               لتمكين الدمج بترتيب ثابت
+    """
+    if not urls:
+        return
+    session = get_session()
+    lastmods = lastmods or {}
+    workers = max(1, min(max_workers, len(urls)))
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="crawl")
+    futures = {pool.submit(_fetch_before, deadline, u, session, timeout, lastmods.get(u), stats): (i, u)
+               for i, u in enumerate(urls)}
+    done = set()
+    try:
+        left = time_left(deadline)
+        for fut in as_completed(futures, timeout=None if left is None else max(0.0, left)):
+            done.add(fut)
+            i, u = futures[fut]
+            try:
+                yield i, u, fut.result(), None
+            except Exception as e:
+                yield i, u, None, e
+    except FuturesTimeout:
+        for fut, (i, u) in futures.items():
+            if fut not in done:
+                fut.cancel()
+                yield i, u, None, CrawlBudgetExceeded("crawl budget exhausted")
+    finally:
+        # لا ننتظر الطلبات المعلقة بعد انتهاء الميزانية
+        pool.shutdown(wait=deadline is None, cancel_futures=True)
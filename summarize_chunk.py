@@ -1,7 +1,17 @@
 from openai import OpenAI
 from langchain.prompts import ChatPromptTemplate
 import os
+import contextvars
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from modules.llm_client import chat_completion
+from modules.prompt_budget import trim_to_budget
+
+SUMMARY_MODEL = "gpt-4o-mini"
+SUMMARY_SYSTEM_PROMPT = "مساعد متخصص في تلخيص مستندات المناقصات باللغة العربية، دقيق وغير مُهلْهِل."
+SUMMARY_MAX_TOKENS = 6000
+SUMMARY_FOCUS = "نطاق العمل برنامج العمل خطة التنفيذ مكان تنفيذ الأعمال الموقع جدول الكميات الأسعار"
+SUMMARY_MIN_SENTENCES = 8
+SUMMARY_RETRY_REMINDER = "\n\nتذكير: يجب أن يكون الملخص 8–10 جُمَل كاملة. اكتب \"غير مذكور\" للعناصر الغائبة."
 
 
 class SummarizeChunk:
@@ -24,9 +34,52 @@ class SummarizeChunk:
         if not text or len(text.strip()) == 0:
             return None
 
-        max_chars = 15000
-        if len(text) > max_chars:
-            text = text[:max_chars]
+        filled_prompt = self.build_summary_prompt(text)
+
+        try:
+            response = chat_completion(
+                "rfp_summary",
+                client=self.client,
+                model=SUMMARY_MODEL,
+                messages=self.build_summary_messages(filled_prompt),
+                temperature=self.temperature1,
+                max_tokens=self.max_token
+            )
+
+            summary = response.choices[0].message.content.strip()
+
+            if self.is_short_summary(summary):
+                filled_prompt_retry = filled_prompt + SUMMARY_RETRY_REMINDER
+                response2 = chat_completion(
+                    "rfp_summary",
+                    client=self.client,
+                    retry=1,
+                    model=SUMMARY_MODEL,
+                    messages=self.build_summary_messages(filled_prompt_retry),
+                    temperature=self.temperature2,
+                    max_tokens=self.max_token
+                )
+                summary = response2.choices[0].message.content.strip()
+
+            return self.clean_summary(summary)
+
+        except Exception as e:
+            print(f"⚠️ Error during summarization: {e}")
+            return None
+
+    def is_short_summary(self, summary):
+        """الملخص أقل من SUMMARY_MIN_SENTENCES جمل (يُعاد طلبه مرة واحدة بتذكير)"""
+        sentences = [s for s in (summary or "").replace("؟", ".").split(".") if s.strip()]
+        return len(sentences) < SUMMARY_MIN_SENTENCES
+
+    def clean_summary(self, summary):
+        if "الملخص:" in summary:
+            summary = summary.split("الملخص:", 1)[-1].strip()
+        return summary
+
+    def build_summary_prompt(self, text):
+        """بناء برومبت التلخيص لجزء واحد من النص (بعد القص حسب ميزانية التوكنز)"""
+        text = trim_to_budget(text, SUMMARY_MAX_TOKENS, query=SUMMARY_FOCUS, model=SUMMARY_MODEL)
 
         summary_prompt = ChatPromptTemplate.from_template("""
         أنت مساعد متخصص في تلخيص مستندات المناقصات باللغة العربية.
@@ -51,45 +104,29 @@ class SummarizeChunk:
         لا تضف عناوين أو كلمة "الملخص"، فقط الجمل النهائية.
         """)
 
-        filled_prompt = summary_prompt.format(text=text)
-
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system",
-                     "content": "مساعد متخصص في تلخيص مستندات المناقصات باللغة العربية، دقيق وغير مُهلْهِل."},
-                    {"role": "user", "content": filled_prompt}
-                ],
-                temperature=self.temperature1,
-                max_tokens=self.max_token
-            )
+        return summary_prompt.format(text=text)
 
-            summary = response.choices[0].message.content.strip()
+    def build_summary_messages(self, filled_prompt):
+        return [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": filled_prompt}
+        ]
 
-            sentences = [s for s in summary.replace("؟", ".").split(".") if s.strip()]
-            if len(sentences) < 8:
-                filled_prompt_retry = filled_prompt + "\n\nتذكير: يجب أن يكون الملخص 8–10 جُمَل كاملة. اكتب \"غير مذكور\" للعناصر الغائبة."
-                response2 = self.client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system",
-                         "content": "مساعد متخصص في تلخيص مستندات المناقصات باللغة العربية، دقيق وغير مُهلْهِل."},
-                        {"role": "user", "content": filled_prompt_retry}
-                    ],
-                    temperature=self.temperature2,
-                    max_tokens=self.max_token
-                )
-                summary = response2.choices[0].message.content.strip()
-
-            if "الملخص:" in summary:
-                summary = summary.split("الملخص:", 1)[-1].strip()
-
-            return summary
+    def build_summary_request(self, text, retry=False):
+        """
+        بارامترات طلب التلخيص بصيغة chat.completions (للاستخدام في Batch API)
 
-        except Exception as e:
-            print(f"⚠️ Error during summarization: {e}")
-            return None
+        retry=True: نفس إعادة المحاولة في generate_summary_ar (تذكير بعدد الجمل + temperature2)
+        """
+        filled_prompt = self.build_summary_prompt(text)
+        if retry:
+            filled_prompt += SUMMARY_RETRY_REMINDER
+        return {
+            "model": SUMMARY_MODEL,
+            "messages": self.build_summary_messages(filled_prompt),
+            "temperature": self.temperature2 if retry else self.temperature1,
+            "max_tokens": self.max_token,
+        }
 
     def summarize_chunks_ar_parallel(self, chunks, max_workers=6):
         def _work(idx, chunk):
@@ -103,7 +140,8 @@ class SummarizeChunk:
         results = [None] * len(chunks)
 
         with ThreadPoolExecutor(max_workers=max_workers) as ex:
-            futures = {ex.submit(_work, i, ch): i for i, ch in enumerate(chunks)}
+            # نسخة سياق لكل مهمة: وسوم metering_context والمهلة لا تنتقل للـ threads تلقائياً
+            futures = {ex.submit(contextvars.copy_context().run, _work, i, ch): i for i, ch in enumerate(chunks)}
             total = len(futures)
             done_count = 0
 
@@ -0,0 +1,121 @@
+"""
+Batch Processor Tests
+بناء طلبات Batch API وربط نتائجها بالأجزاء عبر الخادم المحلي (modules/batch_stub_server.py)
+
+Run:
+    python -m pytest -q test_batch_processor.py
+"""
+
+import os
+import json
+import tempfile
+
+os.environ.setdefault("OPENAI_API_KEY", "local")
+
+from summarize_chunk import SummarizeChunk, SUMMARY_RETRY_REMINDER
+from modules.batch_stub_server import start_stub_server, stub_content, STUB_SUMMARY
+from modules.batch_processor import build_batch_requests, run_batch_pipeline
+
+
+DOCS = [
+    {"doc_id": "rfp_a", "text": "نطاق العمل: توريد وتركيب", "chunks": ["نطاق العمل: توريد", "", "جدول الكميات"]},
+    {"doc_id": "rfp_b", "text": "", "chunks": ["مكان تنفيذ الأعمال: الرياض"]},
+]
+SHORT_SUMMARY = "ملخص من جملة واحدة."
+
+
+def _run(respond=None):
+    """تشغيل المسار الدفعي على خادم محلي؛ يرجع (النتيجة، الطلبات المستلمة، مجلد العمل)"""
+    received = []
+
+    def recording(custom_id, body):
+        received.append((custom_id, body))
+        return (respond or stub_content)(custom_id, body)
+
+    server, base_url = start_stub_server(respond=recording)
+    work_dir = tempfile.mkdtemp(prefix="batch_test_")
+    try:
+        mapped = run_batch_pipeline(DOCS, SummarizeChunk([]), work_dir=work_dir, base_url=base_url, poll_interval=0)
+    finally:
+        server.shutdown()
+    return mapped, received, work_dir
+
+
+def _user_prompt(body) -> str:
+    return body["messages"][-1]["content"]
+
+
+# ============================================
+# Request build
+# ============================================
+def test_requests_have_one_line_per_chunk_and_criteria():
+    lines = build_batch_requests(DOCS, SummarizeChunk([]))
+    assert [line["custom_id"] for line in lines] == [
+        "rfp_a::summary::0", "rfp_a::summary::2", "rfp_a::criteria", "rfp_b::summary::0",
+    ]
+    assert all(line["method"] == "POST" and line["url"] == "/v1/chat/completions" for line in lines)
+    assert lines[2]["body"]["response_format"] == {"type": "json_object"}
+    assert SUMMARY_RETRY_REMINDER not in _user_prompt(lines[0]["body"])
+
+
+# ============================================
+# Result mapping
+# ============================================
+def test_results_map_back_to_chunks_in_order():
+    mapped, received, work_dir = _run()
+    assert [s for _, s in mapped["rfp_a"]["summaries"]] == [STUB_SUMMARY, None, STUB_SUMMARY]
+    assert mapped["rfp_a"]["summaries"][0][0] == "نطاق العمل: توريد"
+    assert mapped["rfp_a"]["criteria"]["summary"] == "معايير تجريبية من الخادم المحلي."
+    assert mapped["rfp_b"] == {"summaries": [("مكان تنفيذ الأعمال: الرياض", STUB_SUMMARY)], "criteria": None}
+    # كل الملخصات مقبولة: لا دفعة متابعة
+    assert len(received) == 4
+    assert not any(name.endswith("_retry.jsonl") for name in os.listdir(work_dir))
+
+
+# ============================================
+# Follow-up batch
+# ============================================
+def test_failed_short_and_invalid_items_are_retried_once():
+    seen = set()
+
+    def respond(custom_id, body):
+        first = custom_id not in seen
+        seen.add(custom_id)
+        if first and custom_id == "rfp_a::summary::0":
+            return SHORT_SUMMARY
+        if first and custom_id == "rfp_a::summary::2":
+            return None
+        if first and custom_id == "rfp_a::criteria":
+            return json.dumps({"criteria": "not a list"})
+        return stub_content(custom_id, body)
+
+    mapped, received, work_dir = _run(respond)
+    retried = received[4:]
+    assert sorted(cid for cid, _ in retried) == ["rfp_a::criteria", "rfp_a::summary::0", "rfp_a::summary::2"]
+    for cid, body in retried:
+        if "::summary::" in cid:
+            assert _user_prompt(body).endswith(SUMMARY_RETRY_REMINDER)
+            assert body["temperature"] == 0.1
+    assert [s for _, s in mapped["rfp_a"]["summaries"]] == [STUB_SUMMARY, None, STUB_SUMMARY]
+    assert mapped["rfp_a"]["criteria"] is not None
+
+    results_file = next(name for name in os.listdir(work_dir) if name.startswith("results_"))
+    with open(os.path.join(work_dir, results_file), encoding="utf-8") as f:
+        saved = json.load(f)
+    assert saved["retry_batch_id"] and saved["errors"] == {}
+
+
+def test_retry_reply_is_kept_even_if_still_short():
+    def respond(custom_id, body):
+        return SHORT_SUMMARY if "::summary::" in custom_id else stub_content(custom_id, body)
+
+    mapped, received, _ = _run(respond)
+    assert len(received) == 4 + 3  # الملخصات فقط تُعاد، ومرة واحدة
+    assert [s for _, s in mapped["rfp_b"]["summaries"]] == [SHORT_SUMMARY]
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"✓ {name}")
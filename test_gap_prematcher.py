@@ -0,0 +1,103 @@
+"""
+Gap Pre-matcher Tests
+قواعد الحسم المحلي في modules/gap_prematcher.py (بدون شبكة أو نموذج)
+
+Run:
+    python -m pytest -q test_gap_prematcher.py
+"""
+
+from datetime import date
+
+from modules.evidence_index import profile_facts
+from modules.gap_prematcher import (
+    prematch_requirements,
+    cert_identifiers,
+    has_negation,
+    STATUS_COVERED,
+    STATUS_NOT_COVERED,
+)
+
+
+def _decide(requirement: str, profile: dict):
+    return prematch_requirements([requirement], profile_facts(profile))[0]
+
+
+# ============================================
+# Certifications
+# ============================================
+def test_arabic_transliteration_counts_as_certificate():
+    decision = _decide("شهادة ISO 9001", {"الشهادات": ["حاصلون على شهادة الأيزو 9001"]})
+    assert decision["status"] == STATUS_COVERED
+    assert decision["decided_by"] == "lexical:certification"
+
+
+def test_missing_certificate_is_ambiguous_not_uncovered():
+    assert _decide("شهادة ISO 14001", {"الشهادات": ["شهادة ISO 9001"]}) is None
+
+
+def test_partial_certificates_are_ambiguous():
+    assert _decide("شهادات ISO 9001 و ISO 45001", {"الشهادات": ["ISO 9001"]}) is None
+
+
+def test_software_acronyms_are_not_certificates():
+    assert cert_identifiers("اعتماد خبرة في أنظمة SAP و ERP و CST") == []
+    assert cert_identifiers("شهادة SAP 2023") == []
+    assert cert_identifiers("شهادة ISO 9001:2015 و PMP") == ["ISO 9001", "PMP"]
+
+
+def test_negated_certificate_is_ambiguous():
+    assert _decide("شهادة ISO 9001", {"الشهادات": ["لسنا حاصلين على ISO 9001 حالياً"]}) is None
+
+
+# ============================================
+# Experience years
+# ============================================
+def test_founding_year_decides_experience():
+    founded = date.today().year - 15
+    decision = _decide("خبرة لا تقل عن 10 سنوات", {"سنة_التأسيس": str(founded)})
+    assert decision["status"] == STATUS_COVERED
+
+
+def test_short_company_experience_is_not_covered():
+    decision = _decide("خبرة لا تقل عن 10 سنوات", {"خبرة_الشركة": "خبرة 4 سنوات في السوق السعودي"})
+    assert decision["status"] == STATUS_NOT_COVERED
+
+
+def test_team_experience_does_not_count_as_company_experience():
+    profile = {
+        "سنة_التأسيس": str(date.today().year - 5),
+        "الخبرات_المتراكمة": "فريق من الخبراء بخبرة تراكمية 30 سنة",
+    }
+    decision = _decide("خبرة لا تقل عن 10 سنوات", profile)
+    assert decision["status"] == STATUS_NOT_COVERED
+    assert decision["sources"][0]["field"] == "سنة التأسيس"
+
+
+def test_conflicting_year_sources_are_ambiguous():
+    profile = {
+        "سنة_التأسيس": str(date.today().year - 5),
+        "الخبرات": "خبرة الشركة 20 سنة في المشاريع البيئية",
+    }
+    assert _decide("خبرة لا تقل عن 10 سنوات", profile) is None
+
+
+# ============================================
+# Lexical (BM25) match
+# ============================================
+def test_full_term_match_is_covered():
+    decision = _decide("خدمات الأمن السيبراني", {"الخدمات": ["نقدم خدمات الأمن السيبراني للجهات الحكومية"]})
+    assert decision["status"] == STATUS_COVERED
+    assert decision["decided_by"] == "lexical:bm25"
+
+
+def test_negated_fact_is_not_covered_evidence():
+    assert _decide("خدمات الأمن السيبراني", {"الخدمات": ["لا نقدم خدمات الأمن السيبراني حالياً"]}) is None
+    assert has_negation("نعمل بدون مقاولين من الباطن")
+    assert not has_negation("نقدم خدمات الأمن السيبراني")
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"✓ {name}")
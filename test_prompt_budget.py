@@ -0,0 +1,60 @@
+"""
+Prompt Budget Tests
+تقسيم النص وقصّه حسب الميزانية في modules/prompt_budget.py (بدون شبكة أو نموذج)
+
+Run:
+    python -m pytest -q test_prompt_budget.py
+"""
+
+import time
+
+from modules.prompt_budget import count_tokens, split_passages, trim_to_budget
+
+
+def _rfp_text(size: int) -> str:
+    """نص كراسة كما يخرجه pdfplumber: أسطر مفردة بدون فقرات فارغة"""
+    lines, total, i = [], 0, 0
+    while total < size:
+        line = f"البند {i}: يلتزم المتعاقد بتقديم شهادة ISO 9001 وخبرة لا تقل عن {i % 20} سنوات"
+        lines.append(line)
+        total += len(line) + 1
+        i += 1
+    return "\n".join(lines)
+
+
+# ============================================
+# Splitting
+# ============================================
+def test_long_block_is_split_within_budget():
+    passages = split_passages(_rfp_text(20_000), max_tokens=200)
+    assert len(passages) > 1
+    assert all(count_tokens(p) <= 200 for p in passages)
+
+
+def test_split_keeps_all_lines_in_order():
+    text = _rfp_text(20_000)
+    assert "\n".join(split_passages(text, max_tokens=200)) == text
+
+
+# ============================================
+# Trimming
+# ============================================
+def test_trim_respects_budget():
+    trimmed = trim_to_budget(_rfp_text(100_000), 2_000, query="شهادة ISO")
+    assert 0 < count_tokens(trimmed) <= 2_000
+
+
+def test_single_newline_megabyte_trims_quickly():
+    text = _rfp_text(1_000_000)
+    start = time.perf_counter()
+    trimmed = trim_to_budget(text, 100_000, query="شهادة ISO 9001")
+    elapsed = time.perf_counter() - start
+    assert count_tokens(trimmed) <= 100_000
+    assert elapsed < 1.0, elapsed
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"✓ {name}")
@@ -0,0 +1,88 @@
+"""
+Sitemap Discovery Tests
+تحليل ملفات sitemap من data/fixtures/sitemaps بدون شبكة
+
+Run:
+    python -m pytest -q test_sitemap_discovery.py
+"""
+
+import io
+import tracemalloc
+
+from modules.sitemap_discovery import parse_sitemap
+
+
+FIXTURES = "data/fixtures/sitemaps"
+
+
+def _parse(name: str) -> list:
+    with open(f"{FIXTURES}/{name}", "rb") as f:
+        return list(parse_sitemap(f))
+
+
+# ============================================
+# Image / video extensions
+# ============================================
+def test_image_loc_does_not_replace_page_loc():
+    entries = _parse("wp_image_sitemap.xml")
+    assert entries[0] == ("url", "https://ex.sa/about/", "2024-05-01T10:00:00+00:00")
+
+
+def test_image_before_page_loc_is_ignored():
+    entries = _parse("wp_image_sitemap.xml")
+    assert entries[1] == ("url", "https://ex.sa/%d8%ae%d8%af%d9%85%d8%a7%d8%aa/", None)
+
+
+def test_video_extension_keeps_page_lastmod():
+    entries = _parse("wp_image_sitemap.xml")
+    assert entries[2] == ("url", "https://ex.sa/projects/", "2023-12-31")
+
+
+def test_url_with_only_image_loc_is_skipped():
+    locs = [loc for _, loc, _ in _parse("wp_image_sitemap.xml")]
+    assert len(locs) == 3
+    assert not any("wp-content" in loc for loc in locs)
+
+
+def test_sitemap_index_children():
+    assert _parse("sitemap_index.xml") == [
+        ("sitemap", "https://ex.sa/page-sitemap.xml", "2024-05-01"),
+        ("sitemap", "https://ex.sa/author-sitemap.xml", None),
+    ]
+
+
+# ============================================
+# Memory
+# ============================================
+def _generated(n: int) -> io.BytesIO:
+    rows = "".join(
+        f"<url><loc>https://ex.sa/p/{i}/</loc>"
+        f"<image:image><image:loc>https://ex.sa/i/{i}.png</image:loc></image:image></url>"
+        for i in range(n)
+    )
+    return io.BytesIO((
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+        'xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">' + rows + "</urlset>"
+    ).encode("utf-8"))
+
+
+def _peak(n: int) -> int:
+    stream = _generated(n)
+    tracemalloc.start()
+    count = sum(1 for _ in parse_sitemap(stream))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert count == n
+    return peak
+
+
+def test_memory_does_not_grow_with_sitemap_size():
+    small, large = _peak(2_000), _peak(20_000)
+    assert large < small * 2, (small, large)
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"✓ {name}")
@@ -0,0 +1,54 @@
+"""
+Text Utilities
+توحيد النص العربي للمطابقة المعجمية (بحث، BM25، إزالة التكرار)
+"""
+
+import re
+
+
+# تشكيل + تطويل
+ARABIC_DIACRITICS_RE = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+ALEF_RE = re.compile(r"[\u0622\u0623\u0625\u0671]")  # آ أ إ ٱ -> ا
+ARABIC_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+TOKEN_RE = re.compile(r"[a-z0-9]+|[\u0621-\u064A]+")
+
+# حروف الجر/العطف الملتصقة (تُزال فقط قبل "ال")
+PROCLITICS = ("وبال", "وال", "بال", "فال", "كال", "لل", "ال")
+
+ARABIC_STOPWORDS = {
+    "في", "من", "الي", "علي", "عن", "مع", "او", "ثم", "ان", "هذا", "هذه", "ذلك", "تلك",
+    "التي", "الذي", "الذين", "ما", "لا", "لم", "لن", "قد", "كل", "اي", "بين", "عند", "حتي",
+    "تم", "يتم", "كان", "كانت", "هو", "هي", "به", "بها", "له", "لها", "فيه", "فيها", "و",
+    "the", "and", "or", "of", "to", "in", "for", "with", "on", "by", "a", "an", "is", "are",
+}
+
+
+def normalize_arabic(text: str) -> str:
+    """
+    توحيد النص العربي: حذف التشكيل والتطويل، توحيد الألف (أ إ آ ٱ -> ا)،
+    الياء (ى -> ي)، التاء المربوطة (ة -> ه)، الأرقام العربية -> 0-9، وأحرف صغيرة
+    """
+    text = ARABIC_DIACRITICS_RE.sub("", (text or "").lower())
+    text = ALEF_RE.sub("ا", text)
+    text = text.replace("ى", "ي").replace("ة", "ه")
+    return text.translate(ARABIC_DIGITS)
+
+
+def light_stem(word: str) -> str:
+    """إزالة "ال" وما يلتصق بها (و/ب/ف/ك/ل) إذا بقي جذر من 3 أحرف على الأقل"""
+    for prefix in PROCLITICS:
+        if word.startswith(prefix) and len(word) - len(prefix) >= 3:
+            return word[len(prefix):]
+    return word
+
+
+def tokenize(text: str, stopwords: set = ARABIC_STOPWORDS) -> list:
+    """كلمات النص بعد التوحيد والتجذيع الخفيف، بدون كلمات الوقف"""
+    out = []
+    for word in TOKEN_RE.findall(normalize_arabic(text)):
+        if word in stopwords:
+            continue
+        word = light_stem(word)
+        if len(word) >= 2 and word not in stopwords:
+            out.append(word)
+    return out